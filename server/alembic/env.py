@@ -13,7 +13,9 @@ from app.config import settings
 from app.database import Base
 
 # Import all models so Alembic sees them
-from app.models import User, Device, BackupFile, Chunk  # noqa: F401
+from app.models import (  # noqa: F401
+    User, Device, BackupFile, Chunk, ChunkBlob, StorageUsage, ScrubCheckpoint, ScrubFailure,
+)
 
 config = context.config
 
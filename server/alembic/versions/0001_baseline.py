@@ -0,0 +1,83 @@
+"""Baseline schema: users, devices, files, chunks
+
+The tables as the first release created them at startup. On such a database
+the revision does nothing and only marks the starting point of the chain;
+on an empty one it creates them, so `alembic upgrade head` works for both.
+
+Revision ID: 0001_baseline
+Revises:
+Create Date: 2026-10-16
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import UUID
+
+
+# revision identifiers
+revision: str = "0001_baseline"
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    existing = set(sa.inspect(op.get_bind()).get_table_names())
+
+    if "users" not in existing:
+        op.create_table(
+            "users",
+            sa.Column("id", UUID(as_uuid=True), primary_key=True),
+            sa.Column("email", sa.String(255), nullable=False),
+            sa.Column("password_hash", sa.String(255), nullable=False),
+            sa.Column("is_active", sa.Boolean),
+            sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        )
+        op.create_index("ix_users_email", "users", ["email"], unique=True)
+
+    if "devices" not in existing:
+        op.create_table(
+            "devices",
+            sa.Column("id", UUID(as_uuid=True), primary_key=True),
+            sa.Column("user_id", UUID(as_uuid=True), sa.ForeignKey("users.id"), nullable=False),
+            sa.Column("name", sa.String(255), nullable=False),
+            sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+            sa.Column("last_seen", sa.DateTime(timezone=True), nullable=True),
+        )
+        op.create_index("ix_devices_user_id", "devices", ["user_id"])
+
+    if "files" not in existing:
+        op.create_table(
+            "files",
+            sa.Column("id", UUID(as_uuid=True), primary_key=True),
+            sa.Column("user_id", UUID(as_uuid=True), sa.ForeignKey("users.id"), nullable=False),
+            sa.Column("device_id", UUID(as_uuid=True), sa.ForeignKey("devices.id"), nullable=False),
+            sa.Column("file_hash", sa.String(64), nullable=False),
+            sa.Column("encrypted_size", sa.BigInteger, nullable=False),
+            sa.Column("chunk_count", sa.Integer, nullable=False),
+            sa.Column("status", sa.String(20), nullable=False),
+            sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+            sa.Column("completed_at", sa.DateTime(timezone=True), nullable=True),
+        )
+        op.create_index("ix_files_user_id", "files", ["user_id"])
+        op.create_index("ix_files_file_hash", "files", ["file_hash"])
+
+    if "chunks" not in existing:
+        op.create_table(
+            "chunks",
+            sa.Column("id", UUID(as_uuid=True), primary_key=True),
+            sa.Column("file_id", UUID(as_uuid=True), sa.ForeignKey("files.id"), nullable=False),
+            sa.Column("chunk_index", sa.Integer, nullable=False),
+            sa.Column("chunk_hash", sa.String(64), nullable=False),
+            sa.Column("size", sa.BigInteger, nullable=False),
+            sa.Column("storage_path", sa.String(512), nullable=False),
+            sa.Column("uploaded_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        )
+        op.create_index("ix_chunks_file_id", "chunks", ["file_id"])
+
+
+def downgrade() -> None:
+    for table in ("chunks", "files", "devices", "users"):
+        op.drop_table(table)
@@ -0,0 +1,42 @@
+"""Reference-counted blobs for the content-addressed chunk layout
+
+Creates chunk_blobs (CHUNK_LAYOUT=content) if the app hasn't already, and the
+partial index the sweeper uses to find blobs nothing references any more.
+
+Revision ID: 0002_chunk_blobs
+Revises: 0001_baseline
+Create Date: 2026-10-16
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers
+revision: str = "0002_chunk_blobs"
+down_revision: Union[str, None] = "0001_baseline"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS chunk_blobs (
+            user_id UUID NOT NULL REFERENCES users (id),
+            chunk_hash VARCHAR(64) NOT NULL,
+            size BIGINT NOT NULL,
+            storage_path VARCHAR(512) NOT NULL,
+            refcount INTEGER NOT NULL,
+            created_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+            PRIMARY KEY (user_id, chunk_hash)
+        )
+    """)
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_chunk_blobs_unreferenced "
+        "ON chunk_blobs (user_id) WHERE refcount <= 0"
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP TABLE IF EXISTS chunk_blobs")
@@ -0,0 +1,30 @@
+"""Assembled S3 objects: files.blob_path and chunks.blob_offset
+
+S3_ASSEMBLE_FILES stitches a completed file's chunks into one object. The
+file row records that object and each chunk its byte offset inside it.
+
+Revision ID: 0003_assembled_files
+Revises: 0002_chunk_blobs
+Create Date: 2026-10-16
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers
+revision: str = "0003_assembled_files"
+down_revision: Union[str, None] = "0002_chunk_blobs"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("ALTER TABLE files ADD COLUMN IF NOT EXISTS blob_path VARCHAR(512)")
+    op.execute("ALTER TABLE chunks ADD COLUMN IF NOT EXISTS blob_offset BIGINT")
+
+
+def downgrade() -> None:
+    op.execute("ALTER TABLE chunks DROP COLUMN IF EXISTS blob_offset")
+    op.execute("ALTER TABLE files DROP COLUMN IF EXISTS blob_path")
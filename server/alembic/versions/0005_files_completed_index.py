@@ -0,0 +1,30 @@
+"""Partial index for paging through a user's completed files
+
+Serves GET /files, a keyset scan over (completed_at, id).
+
+Revision ID: 0005_files_completed_index
+Revises: 0004_file_counters
+Create Date: 2026-10-16
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers
+revision: str = "0005_files_completed_index"
+down_revision: Union[str, None] = "0004_file_counters"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_files_user_completed "
+        "ON files (user_id, completed_at, id) WHERE status = 'complete'"
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS ix_files_user_completed")
@@ -0,0 +1,55 @@
+"""Per-(user, device) storage usage counters
+
+Creates storage_usage if the app hasn't already and fills it from the files
+and chunks tables, the same sums the reconciler (app/usage.py) computes, so
+quotas and GET /usage are right from the first request instead of after the
+first reconciliation.
+
+Revision ID: 0006_storage_usage
+Revises: 0005_files_completed_index
+Create Date: 2026-10-16
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers
+revision: str = "0006_storage_usage"
+down_revision: Union[str, None] = "0005_files_completed_index"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS storage_usage (
+            user_id UUID NOT NULL REFERENCES users (id),
+            device_id UUID NOT NULL REFERENCES devices (id),
+            bytes BIGINT NOT NULL,
+            files INTEGER NOT NULL,
+            updated_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+            PRIMARY KEY (user_id, device_id)
+        )
+    """)
+    # Only the latest row per (file_id, chunk_index) counts, as in the chunks compaction
+    op.execute("""
+        INSERT INTO storage_usage (user_id, device_id, bytes, files)
+        SELECT f.user_id, f.device_id,
+               COALESCE(sum(c.size), 0),
+               count(DISTINCT f.id) FILTER (WHERE f.status = 'complete')
+        FROM files f
+        LEFT JOIN (
+            SELECT DISTINCT ON (file_id, chunk_index) file_id, size
+            FROM chunks
+            ORDER BY file_id, chunk_index, uploaded_at DESC
+        ) c ON c.file_id = f.id
+        GROUP BY f.user_id, f.device_id
+        ON CONFLICT (user_id, device_id) DO UPDATE
+            SET bytes = EXCLUDED.bytes, files = EXCLUDED.files, updated_at = now()
+    """)
+
+
+def downgrade() -> None:
+    op.execute("DROP TABLE IF EXISTS storage_usage")
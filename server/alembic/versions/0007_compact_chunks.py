@@ -0,0 +1,126 @@
+"""Compact, hash-partitioned chunks table
+
+Drops the surrogate UUID key in favour of (file_id, chunk_index), stores
+chunk_hash as 32 raw bytes, and stops storing blob paths that follow from the
+row (see StorageBackend.blob_path). Rows whose path doesn't match the derived
+one keep it in storage_path.
+
+Databases created by the app at startup already have the new table; upgrade is
+a no-op for them.
+
+Revision ID: 0007_compact_chunks
+Revises: 0006_storage_usage
+Create Date: 2026-10-16
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers
+revision: str = "0007_compact_chunks"
+down_revision: Union[str, None] = "0006_storage_usage"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+PARTITIONS = 16
+
+# Paths as StorageBackend builds them, in SQL (c = chunk row, f = its file)
+_UPLOAD_PATH = (
+    "f.user_id::text || '/' || left(c.file_id::text, 2) || '/' || c.file_id::text"
+    " || '/chunk_' || lpad(c.chunk_index::text, greatest(5, length(c.chunk_index::text)), '0')"
+)
+_CONTENT_PATH = "f.user_id::text || '/cas/' || left(c.chunk_hash, 2) || '/' || c.chunk_hash"
+_FILE_PATH = "f.user_id::text || '/' || left(c.file_id::text, 2) || '/' || c.file_id::text || '/file'"
+
+
+def _has_surrogate_key() -> bool:
+    columns = sa.inspect(op.get_bind()).get_columns("chunks")
+    return any(column["name"] == "id" for column in columns)
+
+
+def upgrade() -> None:
+    if not _has_surrogate_key():
+        return
+
+    op.execute("ALTER TABLE chunks RENAME TO chunks_old")
+    op.execute("ALTER INDEX chunks_pkey RENAME TO chunks_old_pkey")
+    op.execute("""
+        CREATE TABLE chunks (
+            file_id UUID NOT NULL REFERENCES files (id),
+            chunk_index INTEGER NOT NULL,
+            chunk_hash BYTEA NOT NULL,
+            size BIGINT NOT NULL,
+            shared BOOLEAN NOT NULL DEFAULT false,
+            blob_offset BIGINT,
+            storage_path VARCHAR(512),
+            uploaded_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+            PRIMARY KEY (file_id, chunk_index)
+        ) PARTITION BY HASH (file_id)
+    """)
+    for i in range(PARTITIONS):
+        op.execute(
+            f"CREATE TABLE chunks_p{i:02d} PARTITION OF chunks "
+            f"FOR VALUES WITH (MODULUS {PARTITIONS}, REMAINDER {i})"
+        )
+
+    # The old table had no unique (file_id, chunk_index); keep the latest upload
+    op.execute(f"""
+        INSERT INTO chunks (file_id, chunk_index, chunk_hash, size, shared, blob_offset, storage_path, uploaded_at)
+        SELECT DISTINCT ON (c.file_id, c.chunk_index)
+            c.file_id, c.chunk_index, decode(c.chunk_hash, 'hex'), c.size,
+            c.blob_offset IS NULL AND c.storage_path = {_CONTENT_PATH},
+            c.blob_offset,
+            CASE
+                WHEN c.blob_offset IS NOT NULL AND c.storage_path = {_FILE_PATH} THEN NULL
+                WHEN c.blob_offset IS NULL AND c.storage_path IN ({_UPLOAD_PATH}, {_CONTENT_PATH}) THEN NULL
+                ELSE c.storage_path
+            END,
+            c.uploaded_at
+        FROM chunks_old c JOIN files f ON f.id = c.file_id
+        ORDER BY c.file_id, c.chunk_index, c.uploaded_at DESC
+    """)
+    op.execute("DROP TABLE chunks_old")
+
+
+def downgrade() -> None:
+    if _has_surrogate_key():
+        return
+
+    op.execute("ALTER TABLE chunks RENAME TO chunks_new")
+    op.execute("ALTER INDEX chunks_pkey RENAME TO chunks_new_pkey")
+    op.execute("""
+        CREATE TABLE chunks (
+            id UUID PRIMARY KEY,
+            file_id UUID NOT NULL REFERENCES files (id),
+            chunk_index INTEGER NOT NULL,
+            chunk_hash VARCHAR(64) NOT NULL,
+            size BIGINT NOT NULL,
+            storage_path VARCHAR(512) NOT NULL,
+            blob_offset BIGINT,
+            uploaded_at TIMESTAMP WITH TIME ZONE DEFAULT now()
+        )
+    """)
+    op.execute("CREATE INDEX ix_chunks_file_id ON chunks (file_id)")
+    op.execute(f"""
+        INSERT INTO chunks (id, file_id, chunk_index, chunk_hash, size, storage_path, blob_offset, uploaded_at)
+        SELECT
+            gen_random_uuid(), c.file_id, c.chunk_index, c.chunk_hash, c.size,
+            COALESCE(
+                c.storage_path,
+                CASE
+                    WHEN c.blob_offset IS NOT NULL THEN {_FILE_PATH}
+                    WHEN c.shared THEN {_CONTENT_PATH}
+                    ELSE {_UPLOAD_PATH}
+                END
+            ),
+            c.blob_offset, c.uploaded_at
+        FROM (
+            SELECT file_id, chunk_index, encode(chunk_hash, 'hex') AS chunk_hash, size, shared,
+                   blob_offset, storage_path, uploaded_at
+            FROM chunks_new
+        ) c JOIN files f ON f.id = c.file_id
+    """)
+    op.execute("DROP TABLE chunks_new")
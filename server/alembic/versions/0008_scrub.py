@@ -0,0 +1,44 @@
+"""Integrity scrubber checkpoint and failures
+
+Revision ID: 0008_scrub
+Revises: 0007_compact_chunks
+Create Date: 2026-10-16
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers
+revision: str = "0008_scrub"
+down_revision: Union[str, None] = "0007_compact_chunks"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS scrub_checkpoint (
+            id INTEGER PRIMARY KEY,
+            file_id UUID,
+            chunk_index INTEGER,
+            passes INTEGER NOT NULL,
+            pass_started_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+            updated_at TIMESTAMP WITH TIME ZONE DEFAULT now()
+        )
+    """)
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS scrub_failures (
+            file_id UUID NOT NULL REFERENCES files (id) ON DELETE CASCADE,
+            chunk_index INTEGER NOT NULL,
+            reason VARCHAR(20) NOT NULL,
+            found_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+            PRIMARY KEY (file_id, chunk_index)
+        )
+    """)
+
+
+def downgrade() -> None:
+    op.execute("DROP TABLE IF EXISTS scrub_failures")
+    op.execute("DROP TABLE IF EXISTS scrub_checkpoint")
@@ -0,0 +1,31 @@
+"""Partial index on a device's in-progress uploads
+
+Serves GET /upload/pending. Databases created by the app at startup already
+have it.
+
+Revision ID: 0009_files_uploading_index
+Revises: 0008_scrub
+Create Date: 2026-10-16
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers
+revision: str = "0009_files_uploading_index"
+down_revision: Union[str, None] = "0008_scrub"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_files_device_uploading "
+        "ON files (user_id, device_id) WHERE status = 'uploading'"
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS ix_files_device_uploading")
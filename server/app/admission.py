@@ -0,0 +1,269 @@
+"""
+Admission control in front of the routers.
+
+During the nightly backup rush every phone streams 8 MB chunks at once; without
+a gate they all compete for the event loop, the DB pool and storage, and cheap
+calls (/upload/{id}/status, /auth/refresh, ...) time out behind them. Requests
+are split into two lanes:
+
+  priority  no body or a small one (≤ ADMISSION_SMALL_REQUEST_BYTES): admitted
+            straight away, up to ADMISSION_PRIORITY_CONCURRENCY at once
+  bulk      chunk/file uploads and downloads: admitted while they fit in
+            - ADMISSION_INFLIGHT_BYTES, a budget of request bytes in flight
+              (for the host: each worker process gets an equal share)
+            - ADMISSION_USER_CONCURRENCY bulk requests per user (JWT subject)
+            - ADMISSION_DEVICE_CONCURRENCY per device (X-Device-Id header, if sent)
+
+Bulk requests that don't fit wait in a FIFO queue of ADMISSION_MAX_QUEUE entries
+for at most ADMISSION_MAX_WAIT_SECONDS. A full queue or an expired wait answers
+503 with Retry-After immediately, so clients back off instead of piling up
+behind a timeout. Queue depth, bytes in flight and wait times are exported on
+/metrics.
+
+State is per worker process, like the user cache.
+"""
+
+import asyncio
+import re
+import time
+import uuid
+from collections import Counter, deque
+from dataclasses import dataclass, field
+
+import jwt
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.auth.jwt import verify_token
+from app.config import per_worker, settings
+from app.metrics import admission_rejected, admission_wait, registry
+from app.storage.base import STREAM_PIECE_SIZE
+
+# Long-running downloads hold read-ahead buffers rather than a request body
+_DOWNLOAD_RE = re.compile(r"/files/[^/]+/content$")
+
+
+@dataclass(eq=False)
+class _Ticket:
+    weight: int
+    user: uuid.UUID | None
+    device: str | None
+    admitted: asyncio.Future = field(default_factory=lambda: asyncio.get_running_loop().create_future())
+
+
+class AdmissionController:
+    """Byte budget plus per-user / per-device caps, with a bounded FIFO of waiters."""
+
+    def __init__(
+        self,
+        inflight_bytes: int,
+        user_concurrency: int,
+        device_concurrency: int,
+        priority_concurrency: int,
+        max_queue: int,
+        max_wait: float,
+    ):
+        self.inflight_bytes = inflight_bytes
+        self.user_concurrency = user_concurrency
+        self.device_concurrency = device_concurrency
+        self.priority_concurrency = priority_concurrency
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.bytes_in_flight = 0
+        self.bulk_in_flight = 0
+        self.priority_in_flight = 0
+        self._per_user: Counter[uuid.UUID] = Counter()
+        self._per_device: Counter[str] = Counter()
+        self._queue: deque[_Ticket] = deque()
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._queue)
+
+    # ── Priority lane ──────────────────────────────────────────
+
+    def try_priority(self) -> bool:
+        if self.priority_in_flight >= self.priority_concurrency:
+            return False
+        self.priority_in_flight += 1
+        return True
+
+    def release_priority(self) -> None:
+        self.priority_in_flight -= 1
+
+    # ── Bulk lane ──────────────────────────────────────────────
+
+    def _caps_allow(self, ticket: _Ticket) -> bool:
+        if ticket.user is not None and self._per_user[ticket.user] >= self.user_concurrency:
+            return False
+        if ticket.device is not None and self._per_device[ticket.device] >= self.device_concurrency:
+            return False
+        return True
+
+    def _bytes_allow(self, ticket: _Ticket) -> bool:
+        # Something must always be able to run, however large
+        return self.bulk_in_flight == 0 or self.bytes_in_flight + ticket.weight <= self.inflight_bytes
+
+    def _admit(self, ticket: _Ticket) -> None:
+        self.bytes_in_flight += ticket.weight
+        self.bulk_in_flight += 1
+        if ticket.user is not None:
+            self._per_user[ticket.user] += 1
+        if ticket.device is not None:
+            self._per_device[ticket.device] += 1
+
+    async def acquire(self, weight: int, user: uuid.UUID | None, device: str | None) -> _Ticket | None:
+        """
+        Admit a bulk request, waiting in line if needed.
+
+        Returns the ticket to release() later, or None when the request should be
+        turned away (queue full or waited too long).
+        """
+        ticket = _Ticket(min(weight, self.inflight_bytes), user, device)
+        if not self._queue and self._caps_allow(ticket) and self._bytes_allow(ticket):
+            self._admit(ticket)
+            admission_wait.observe(0.0)
+            return ticket
+        if len(self._queue) >= self.max_queue:
+            return None
+
+        self._queue.append(ticket)
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(asyncio.shield(ticket.admitted), self.max_wait)
+        except asyncio.TimeoutError:
+            pass
+        except BaseException:  # client went away while waiting
+            self._abandon(ticket)
+            raise
+        admission_wait.observe(time.perf_counter() - start)
+        if not ticket.admitted.done():
+            self._abandon(ticket)
+            return None
+        return ticket
+
+    def _abandon(self, ticket: _Ticket) -> None:
+        if ticket.admitted.done():
+            self.release(ticket)  # admitted just as the wait ended
+        else:
+            ticket.admitted.cancel()
+            self._queue.remove(ticket)
+            self._wake()  # it may have been what held the queue back
+
+    def release(self, ticket: _Ticket) -> None:
+        self.bytes_in_flight -= ticket.weight
+        self.bulk_in_flight -= 1
+        if ticket.user is not None:
+            self._per_user[ticket.user] -= 1
+            if not self._per_user[ticket.user]:
+                del self._per_user[ticket.user]
+        if ticket.device is not None:
+            self._per_device[ticket.device] -= 1
+            if not self._per_device[ticket.device]:
+                del self._per_device[ticket.device]
+        self._wake()
+
+    def _wake(self) -> None:
+        """
+        Admit waiters in FIFO order. A waiter held back only by its own user or
+        device cap is skipped, so one greedy phone can't block everyone else; one
+        held back by the byte budget stops the scan, so big requests don't starve.
+        """
+        for ticket in list(self._queue):
+            if not self._caps_allow(ticket):
+                continue
+            if not self._bytes_allow(ticket):
+                break
+            self._queue.remove(ticket)
+            self._admit(ticket)
+            ticket.admitted.set_result(None)
+
+
+class AdmissionMiddleware:
+    """ASGI middleware routing each HTTP request through the AdmissionController."""
+
+    def __init__(self, app: ASGIApp, controller: AdmissionController | None = None):
+        self.app = app
+        self.controller = controller or AdmissionController(
+            inflight_bytes=per_worker(settings.ADMISSION_INFLIGHT_BYTES),
+            user_concurrency=settings.ADMISSION_USER_CONCURRENCY,
+            device_concurrency=settings.ADMISSION_DEVICE_CONCURRENCY,
+            priority_concurrency=settings.ADMISSION_PRIORITY_CONCURRENCY,
+            max_queue=settings.ADMISSION_MAX_QUEUE,
+            max_wait=settings.ADMISSION_MAX_WAIT_SECONDS,
+        )
+        controller = self.controller
+        registry.gauge(
+            "zkbackup_admission_queue_depth", "Bulk requests waiting for admission.",
+            lambda: controller.queue_depth,
+        )
+        registry.gauge(
+            "zkbackup_admission_inflight_bytes", "Request bytes admitted and still in flight.",
+            lambda: controller.bytes_in_flight,
+        )
+        registry.gauge(
+            "zkbackup_admission_priority_inflight", "Priority-lane requests in flight.",
+            lambda: controller.priority_in_flight,
+        )
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = {k.decode("latin-1"): v.decode("latin-1") for k, v in scope["headers"]}
+        weight = _bulk_weight(scope, headers)
+
+        if weight is None:
+            if not self.controller.try_priority():
+                admission_rejected.labels(lane="priority").inc()
+                await _busy(scope, receive, send)
+                return
+            try:
+                await self.app(scope, receive, send)
+            finally:
+                self.controller.release_priority()
+            return
+
+        ticket = await self.controller.acquire(weight, _user_id(headers), headers.get("x-device-id"))
+        if ticket is None:
+            admission_rejected.labels(lane="bulk").inc()
+            await _busy(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release(ticket)
+
+
+def _bulk_weight(scope: Scope, headers: dict[str, str]) -> int | None:
+    """Bytes a request is expected to hold in flight, or None for the priority lane."""
+    if scope["method"] == "GET" and _DOWNLOAD_RE.search(scope["path"]):
+        return settings.RESTORE_READ_AHEAD * settings.RESTORE_BUFFER_PIECES * STREAM_PIECE_SIZE
+    content_length = headers.get("content-length")
+    if content_length is not None and content_length.isdigit():
+        size = int(content_length)
+        return size if size > settings.ADMISSION_SMALL_REQUEST_BYTES else None
+    if "chunked" in headers.get("transfer-encoding", ""):
+        return settings.MAX_CHUNK_SIZE  # size unknown until the body has arrived
+    return None
+
+
+def _user_id(headers: dict[str, str]) -> uuid.UUID | None:
+    """The bearer token's user, if it's valid. Invalid tokens are rejected later by auth."""
+    scheme, _, token = headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    try:
+        return uuid.UUID(verify_token(token, expected_type="access")["sub"])
+    except (jwt.PyJWTError, KeyError, ValueError):
+        return None
+
+
+async def _busy(scope: Scope, receive: Receive, send: Send) -> None:
+    response = JSONResponse(
+        {"detail": "Server busy, retry later"},
+        status_code=503,
+        headers={"Retry-After": str(settings.ADMISSION_RETRY_AFTER_SECONDS)},
+    )
+    await response(scope, receive, send)
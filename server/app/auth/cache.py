@@ -0,0 +1,73 @@
+"""
+In-process cache of authenticated users.
+
+get_current_user runs on every request — including every chunk PUT — so the
+`select(User)` behind it is cached here: a size-bounded LRU with a TTL tied to
+the access-token lifetime. The JWT itself is still verified on every request;
+only the "does this user exist and is it active" lookup is skipped.
+
+Call invalidate_user() whenever a user is deactivated or deleted, otherwise
+their access tokens keep working for up to AUTH_CACHE_TTL_SECONDS.
+Each worker process has its own cache; with several workers, invalidations
+reach the others within AUTH_CACHE_SYNC_SECONDS (see app/shared_state.py).
+"""
+
+import time
+import uuid
+from collections import OrderedDict
+
+from app import shared_state
+from app.config import settings
+from app.metrics import auth_cache_evictions, auth_cache_lookups, registry
+
+_hits = auth_cache_lookups.labels(result="hit")
+_misses = auth_cache_lookups.labels(result="miss")
+
+
+class UserCache:
+    """LRU + TTL map of user_id → email for active users."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: OrderedDict[uuid.UUID, tuple[float, str]] = OrderedDict()
+
+    def get(self, user_id: uuid.UUID) -> str | None:
+        entry = self._entries.get(user_id)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._entries[user_id]
+            _misses.inc()
+            return None
+        self._entries.move_to_end(user_id)
+        _hits.inc()
+        return entry[1]
+
+    def put(self, user_id: uuid.UUID, email: str) -> None:
+        if self.maxsize <= 0:
+            return
+        self._entries[user_id] = (time.monotonic() + self.ttl, email)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            auth_cache_evictions.inc()
+
+    def invalidate(self, user_id: uuid.UUID) -> None:
+        self._entries.pop(user_id, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+user_cache = UserCache(settings.AUTH_CACHE_SIZE, settings.AUTH_CACHE_TTL_SECONDS)
+registry.gauge("zkbackup_auth_cache_size", "Users currently in the auth cache.", lambda: len(user_cache))
+
+
+def invalidate_user(user_id: uuid.UUID) -> None:
+    """Forget a cached user — call after deactivating or deleting them."""
+    user_cache.invalidate(user_id)
+    if settings.WORKERS > 1:
+        shared_state.publish_invalidation(user_id)
@@ -10,6 +10,7 @@ from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.auth.cache import user_cache
 from app.auth.jwt import verify_token
 from app.database import get_db
 from app.models.user import User
@@ -24,6 +25,9 @@ async def get_current_user(
     """
     Extract and validate the JWT from the Authorization header.
     Returns the authenticated User or raises 401.
+
+    Active users are cached (see app.auth.cache); a cache hit returns a transient
+    User carrying the id and email without touching the database.
     """
     try:
         payload = verify_token(credentials.credentials, expected_type="access")
@@ -34,6 +38,10 @@ async def get_current_user(
             detail="Invalid or expired token",
         )
 
+    email = user_cache.get(user_id)
+    if email is not None:
+        return User(id=user_id, email=email, is_active=True)
+
     result = await db.execute(select(User).where(User.id == user_id, User.is_active == True))
     user = result.scalar_one_or_none()
     if user is None:
@@ -41,4 +49,5 @@ async def get_current_user(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="User not found or inactive",
         )
+    user_cache.put(user.id, user.email)
     return user
@@ -0,0 +1,225 @@
+"""
+Group commit of chunk metadata across requests (CHUNK_GROUP_COMMIT=true).
+
+A chunk PUT only has one row to record, so with hundreds of uploads in flight
+the database spends its time on commits (one WAL flush each), not on the rows.
+Instead, upload_chunk ends its own transaction (returning its connection to
+the pool the writer draws from), hands a first upload's row to the worker's
+ChunkWriter and waits: the writer collects rows for CHUNK_GROUP_COMMIT_WAIT_MS
+or until CHUNK_GROUP_COMMIT_MAX_ROWS are queued, then in one transaction
+
+  1. locks their files and drops rows whose file is no longer uploading (the
+     sweeper may have expired it, or a re-send raced its completion)
+  2. inserts the rest (ON CONFLICT DO NOTHING)
+  3. folds the inserted ones into their files' chunks_received and manifest
+     digest, one UPDATE for the whole batch
+  4. adds their bytes to the owners' usage counters
+
+and commits. Each caller's wait ends only after that commit — when upload_chunk
+answers 200, the chunk is as durable as with its own transaction.
+
+One batch is in flight per worker; rows arriving meanwhile form the next one,
+so batches grow with load. Rows that already existed (re-sends) are reported
+back and upserted by the caller itself, which needs the old values. If a
+batch fails, its rows are retried in one transaction each, so a bad row only
+fails its own request. The content-addressed layout takes blob references in
+the request's transaction, so it always records chunks there.
+"""
+
+import asyncio
+import logging
+import uuid
+from collections import defaultdict
+from dataclasses import dataclass
+from decimal import Decimal
+
+from sqlalchemy import Integer, Numeric, column, func, select, update, values
+from sqlalchemy.dialects.postgresql import UUID, insert
+
+from app import manifest, usage
+from app.config import settings
+from app.database import async_session
+from app.metrics import chunk_batch_rows, registry
+from app.models.chunk import Chunk
+from app.models.file import BackupFile
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class ChunkRecord:
+    user_id: uuid.UUID
+    device_id: uuid.UUID
+    file_id: uuid.UUID
+    chunk_index: int
+    chunk_hash: str
+    size: int
+
+
+class ChunkWriter:
+    def __init__(self, window: float, max_rows: int):
+        self.window = window
+        self.max_rows = max_rows
+        self._batch: list[tuple[ChunkRecord, asyncio.Future]] = []
+        self._full = asyncio.Event()
+        self._flusher: asyncio.Task | None = None
+        self._lock = asyncio.Lock()
+
+    @property
+    def queued(self) -> int:
+        return len(self._batch)
+
+    async def insert(self, record: ChunkRecord) -> bool | None:
+        """
+        Record a chunk and commit it with the current batch.
+
+        Returns False, without changing anything, if the row already existed,
+        and None if the file is no longer uploading.
+        """
+        done = asyncio.get_running_loop().create_future()
+        self._batch.append((record, done))
+        if self._flusher is None:
+            self._flusher = asyncio.create_task(self._flush_later())
+        elif len(self._batch) >= self.max_rows:
+            self._full.set()
+        return await done
+
+    async def drain(self) -> None:
+        """Wait until every queued row has been written. Called from the app lifespan."""
+        while self._flusher is not None:
+            self._full.set()
+            await asyncio.shield(self._flusher)
+        async with self._lock:
+            pass
+
+    async def _flush_later(self) -> None:
+        try:
+            await asyncio.wait_for(self._full.wait(), self.window)
+        except asyncio.TimeoutError:
+            pass
+        async with self._lock:  # the previous batch's commit; this one keeps filling meanwhile
+            batch, self._batch = self._batch[:self.max_rows], self._batch[self.max_rows:]
+            self._full.clear()
+            self._flusher = asyncio.create_task(self._flush_later()) if self._batch else None
+            await self._flush(batch)
+
+    async def _flush(self, batch: list[tuple[ChunkRecord, asyncio.Future]]) -> None:
+        chunk_batch_rows.observe(len(batch))
+        if await self._commit(batch, final=len(batch) == 1):
+            return
+        for entry in batch:
+            await self._commit([entry], final=True)
+
+    async def _commit(self, batch: list[tuple[ChunkRecord, asyncio.Future]], final: bool) -> bool:
+        """
+        Write [batch] in one transaction and resolve its callers. Returns False if
+        it failed and [final] is off; the callers are then left waiting for a retry.
+        """
+        try:
+            async with async_session() as db:
+                outcomes = await _write(db, [record for record, _ in batch])
+                await db.commit()
+        except BaseException as exc:
+            if isinstance(exc, Exception) and not final:
+                logger.warning("Writing a batch of %d chunk rows failed, retrying one by one", len(batch), exc_info=True)
+                return False
+            for _, done in batch:
+                if done.done():
+                    continue
+                if isinstance(exc, Exception):
+                    done.set_exception(exc)
+                else:
+                    done.cancel()
+            if not isinstance(exc, Exception):
+                raise
+            logger.exception("Writing %d chunk row(s) failed", len(batch))
+            return True
+        for (_, done), outcome in zip(batch, outcomes):
+            if not done.done():  # caller went away; its row is committed all the same
+                done.set_result(outcome)
+        return True
+
+
+async def _write(db, records: list[ChunkRecord]) -> list[bool | None]:
+    """
+    Insert and account for [records]; returns, per record, whether its row was
+    new, or None if its file is no longer uploading.
+    """
+    # Lock the files first, in id order so batches from other workers can't
+    # deadlock this one: until the commit none can be completed or purged
+    result = await db.execute(
+        select(BackupFile.id)
+        .where(BackupFile.id.in_(sorted({record.file_id for record in records})), BackupFile.status == "uploading")
+        .order_by(BackupFile.id)
+        .with_for_update()
+    )
+    live = set(result.scalars().all())
+
+    # A chunk sent twice within one batch: the first copy is inserted, the
+    # second is reported as existing and its caller replaces the row afterwards
+    firsts: dict[tuple[uuid.UUID, int], ChunkRecord] = {}
+    for record in records:
+        if record.file_id in live:
+            firsts.setdefault((record.file_id, record.chunk_index), record)
+    if not firsts:
+        return [None] * len(records)
+
+    # Key order, so concurrent batches from other workers lock rows in the same order
+    keys = sorted(firsts)
+    result = await db.execute(
+        insert(Chunk)
+        .on_conflict_do_nothing(index_elements=[Chunk.file_id, Chunk.chunk_index])
+        .returning(Chunk.file_id, Chunk.chunk_index),
+        [
+            {
+                "file_id": file_id,
+                "chunk_index": chunk_index,
+                "chunk_hash": firsts[file_id, chunk_index].chunk_hash,
+                "size": firsts[file_id, chunk_index].size,
+                "shared": False,
+            }
+            for file_id, chunk_index in keys
+        ],
+    )
+    new = {(file_id, chunk_index) for file_id, chunk_index in result.all()}
+
+    received: dict[uuid.UUID, int] = defaultdict(int)
+    leaves: dict[uuid.UUID, int] = defaultdict(int)
+    stored: dict[tuple[uuid.UUID, uuid.UUID], int] = defaultdict(int)
+    for key in new:
+        record = firsts[key]
+        received[record.file_id] += 1
+        leaves[record.file_id] += manifest.leaf(record.chunk_index, record.chunk_hash)
+        stored[record.user_id, record.device_id] += record.size
+
+    if received:
+        file_ids = sorted(received)
+        deltas = values(
+            column("id", UUID(as_uuid=True)), column("received", Integer), column("leaves", Numeric(78, 0)),
+            name="deltas",
+        ).data([(file_id, received[file_id], Decimal(leaves[file_id] % manifest.MODULUS)) for file_id in file_ids])
+        await db.execute(
+            update(BackupFile)
+            .where(BackupFile.id == deltas.c.id)
+            .values(
+                chunks_received=BackupFile.chunks_received + deltas.c.received,
+                manifest_acc=func.mod(BackupFile.manifest_acc + deltas.c.leaves, Decimal(manifest.MODULUS)),
+            )
+        )
+    for (user_id, device_id), size in sorted(stored.items()):
+        await usage.add(db, user_id, device_id, size)
+
+    taken = set()
+    outcomes: list[bool | None] = []
+    for record in records:
+        key = (record.file_id, record.chunk_index)
+        outcomes.append(None if record.file_id not in live else (key in new and key not in taken))
+        taken.add(key)
+    return outcomes
+
+
+chunk_writer = ChunkWriter(settings.CHUNK_GROUP_COMMIT_WAIT_MS / 1000, settings.CHUNK_GROUP_COMMIT_MAX_ROWS)
+
+registry.gauge(
+    "zkbackup_chunk_batch_queued", "Chunk rows waiting for the next group commit.", lambda: chunk_writer.queued
+)
@@ -0,0 +1,65 @@
+"""
+Bounded thread pool for CPU-heavy work called from async handlers.
+
+bcrypt (~250 ms per hash/check) and SHA-256 over chunk bodies would otherwise
+run on the event loop and stall every other request in the worker. Both release
+the GIL while they work, so a plain thread pool spreads them over all cores.
+
+At most CPU_MAX_PENDING jobs are queued or running at once; further callers
+wait for a slot (backpressure) rather than growing the pool's queue without
+bound. Queue wait, run time and the number of pending jobs are exported on
+/metrics.
+"""
+
+import asyncio
+import os
+import time
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from typing import TypeVar
+
+from app.config import per_worker, settings
+from app.metrics import cpu_run, cpu_wait, registry
+
+T = TypeVar("T")
+
+
+def _timed(fn: Callable[..., T], args: tuple) -> tuple[float, T]:
+    return time.perf_counter(), fn(*args)
+
+
+class CpuExecutor:
+    def __init__(self, workers: int, max_pending: int):
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="cpu")
+        self._slots = asyncio.Semaphore(max_pending)
+        self.pending = 0
+        self._histograms: dict[str, tuple] = {}
+
+    async def run(self, task: str, fn: Callable[..., T], *args) -> T:
+        """Run fn(*args) on the pool; [task] labels the metrics ("bcrypt", "sha256", ...)."""
+        histograms = self._histograms.get(task)
+        if histograms is None:
+            histograms = self._histograms[task] = (cpu_wait.labels(task=task), cpu_run.labels(task=task))
+        wait, run = histograms
+
+        queued = time.perf_counter()
+        self.pending += 1
+        try:
+            async with self._slots:
+                started, result = await asyncio.get_running_loop().run_in_executor(
+                    self._pool, _timed, fn, args
+                )
+        finally:
+            self.pending -= 1
+        # Observed here, on the loop thread, like every other metric
+        wait.observe(started - queued)
+        run.observe(time.perf_counter() - started)
+        return result
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+cpu = CpuExecutor(settings.CPU_WORKERS or per_worker(os.cpu_count() or 1), settings.CPU_MAX_PENDING)
+
+registry.gauge("zkbackup_cpu_pending", "CPU jobs queued or running on the pool.", lambda: cpu.pending)
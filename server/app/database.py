@@ -5,9 +5,15 @@ SQLAlchemy async engine + session factory.
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import DeclarativeBase
 
-from app.config import settings
+from app.config import per_worker, settings
 
-engine = create_async_engine(settings.DATABASE_URL, echo=False)
+# This worker's share of DB_MAX_CONNECTIONS: a third kept open, the rest opened under load
+_connections = per_worker(settings.DB_MAX_CONNECTIONS)
+_pool_size = max(1, _connections // 3)
+
+engine = create_async_engine(
+    settings.DATABASE_URL, echo=False, pool_size=_pool_size, max_overflow=_connections - _pool_size
+)
 
 async_session = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
@@ -2,6 +2,8 @@
 FastAPI application entrypoint.
 """
 
+import asyncio
+import contextlib
 from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
@@ -10,18 +12,56 @@ from fastapi.middleware.trustedhost import TrustedHostMiddleware
 from slowapi import _rate_limit_exceeded_handler
 from slowapi.errors import RateLimitExceeded
 from slowapi.middleware import SlowAPIMiddleware
+from sqlalchemy import func, select
 
+from app import shared_state
+from app.admission import AdmissionMiddleware
+from app.auth.cache import user_cache
+from app.chunk_writer import chunk_writer
 from app.config import settings
+from app.cpu import cpu
 from app.database import engine, Base
-from app.routers import auth, upload, health
+from app.metrics import instrument_engine
+from app.routers import auth, files, upload, usage, health, metrics
+from app.storage.base import get_storage
+from app.storage.scrubber import run_scrubber
+from app.storage.sweeper import run_sweeper
+from app.usage import run_reconciler
+
+
+# Advisory lock key serializing create_all between worker processes
+_SCHEMA_LOCK = 0x7A6B_0001
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Create tables on startup (dev convenience — use Alembic in production)
+    # Create tables on startup (dev convenience — use Alembic in production).
+    # Workers start together: the first creates them, the rest wait and find them.
     async with engine.begin() as conn:
+        await conn.execute(select(func.pg_advisory_xact_lock(_SCHEMA_LOCK)))
         await conn.run_sync(Base.metadata.create_all)
-    yield
+
+    storage = get_storage()
+    await storage.start()
+    background = []
+    if settings.GC_INTERVAL_SECONDS > 0 and shared_state.claim_primary():
+        background.append(asyncio.create_task(run_sweeper()))
+    if settings.USAGE_RECONCILE_INTERVAL_SECONDS > 0 and shared_state.claim_primary():
+        background.append(asyncio.create_task(run_reconciler()))
+    if settings.SCRUB_MB_PER_SECOND > 0 and shared_state.claim_primary():
+        background.append(asyncio.create_task(run_scrubber()))
+    if settings.WORKERS > 1 and settings.AUTH_CACHE_SIZE > 0:
+        background.append(asyncio.create_task(shared_state.run_invalidation_sync(user_cache.invalidate)))
+    try:
+        yield
+    finally:
+        await chunk_writer.drain()
+        for task in background:
+            task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+        await storage.close()
+        cpu.shutdown()
 
 
 app = FastAPI(
@@ -36,6 +76,10 @@ app.state.limiter = auth.limiter
 app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
 app.add_middleware(SlowAPIMiddleware)
 
+# Admission control (bulk uploads queue behind a byte budget; 503 when saturated)
+if settings.ADMISSION_ENABLED:
+    app.add_middleware(AdmissionMiddleware)
+
 # CORS
 app.add_middleware(
     CORSMiddleware,
@@ -49,6 +93,13 @@ app.add_middleware(
 app.include_router(health.router, prefix=settings.API_V1_PREFIX, tags=["health"])
 app.include_router(auth.router, prefix=settings.API_V1_PREFIX, tags=["auth"])
 app.include_router(upload.router, prefix=settings.API_V1_PREFIX, tags=["upload"])
+app.include_router(files.router, prefix=settings.API_V1_PREFIX, tags=["files"])
+app.include_router(usage.router, prefix=settings.API_V1_PREFIX, tags=["usage"])
+
+# Metrics
+if settings.METRICS_ENABLED:
+    instrument_engine(engine)
+    app.include_router(metrics.router)
 
 # Trusted host (reject requests with forged Host headers)
 if settings.ALLOWED_ORIGINS != ["*"]:
@@ -0,0 +1,33 @@
+"""
+Upload manifest digest.
+
+The server keeps a running digest of (chunk_index, chunk_hash) pairs on each
+BackupFile as chunks arrive, so /upload/{id}/complete can compare it against the
+client's own view in O(1) — without reading the chunks table.
+
+Chunks arrive out of order and may be re-sent, so the digest is an additive
+set hash rather than a Merkle tree: each chunk contributes
+
+    leaf(i, h) = int(SHA-256(b"zkbackup-manifest" || i as 4-byte big-endian || h as 32 raw bytes))
+
+and the manifest root is the sum of all leaves mod 2^256, as 64 hex chars.
+Replacing a chunk subtracts its old leaf and adds the new one. It detects
+missing, extra, reordered and corrupted chunks; it is not meant to resist a
+client deliberately forging its own manifest.
+"""
+
+import hashlib
+
+MODULUS = 2 ** 256
+
+_DOMAIN = b"zkbackup-manifest"
+
+
+def leaf(chunk_index: int, chunk_hash: str) -> int:
+    digest = hashlib.sha256(_DOMAIN + chunk_index.to_bytes(4, "big") + bytes.fromhex(chunk_hash))
+    return int.from_bytes(digest.digest(), "big")
+
+
+def root(chunks: list[tuple[int, str]]) -> str:
+    """Manifest root of (chunk_index, chunk_hash) pairs — what a client sends on complete."""
+    return format(sum(leaf(i, h) for i, h in chunks) % MODULUS, "064x")
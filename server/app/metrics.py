@@ -0,0 +1,280 @@
+"""
+In-process metrics, exposed in the Prometheus text format at GET /metrics.
+
+Everything is updated from the event loop thread, so counters are plain ints —
+no locks. Each labelled series is created once (at setup or first use) and
+kept by reference, so recording a sample allocates nothing.
+
+  zkbackup_http_request_duration_seconds{route}        histogram, upload + auth routes
+  zkbackup_ingested_bytes_total / _chunks_total        counters, chunk PUTs
+  zkbackup_storage_op_duration_seconds{backend,op}     histogram, every outermost StorageBackend call
+  zkbackup_db_query_duration_seconds{verb}             histogram, engine cursor executes
+  zkbackup_db_pool_*                                   gauges, read at scrape time
+  zkbackup_cpu_wait_seconds / _run_seconds{task}       histograms, CPU thread pool (bcrypt, sha256)
+  zkbackup_admission_*                                 queue depth / bytes in flight gauges,
+                                                       wait histogram, rejections{lane}
+  zkbackup_chunk_batch_rows / _queued                  histogram / gauge, chunk metadata group commit
+  zkbackup_scrub_*                                     counters, integrity scrubber (failures{reason})
+  zkbackup_auth_cache_*                                lookups{result} / evictions counters, size gauge
+"""
+
+import time
+from bisect import bisect_left
+from collections.abc import Callable
+from contextvars import ContextVar
+
+from fastapi import Request, Response
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+# Seconds. Chunk PUTs on mobile links can take a while, DB queries are sub-ms.
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Counter:
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount: int = 1) -> None:
+        self.value += amount
+
+
+class Histogram:
+    def __init__(self, buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+
+class Family:
+    """A named metric with one series per label set."""
+
+    def __init__(self, name: str, kind: str, help_text: str, factory: Callable = Counter):
+        self.name = name
+        self.kind = kind
+        self.help = help_text
+        self._factory = factory
+        self.series: dict[tuple[tuple[str, str], ...], object] = {}
+
+    def labels(self, **labels: str):
+        key = tuple(sorted(labels.items()))
+        series = self.series.get(key)
+        if series is None:
+            series = self.series[key] = self._factory()
+        return series
+
+
+class Registry:
+    def __init__(self):
+        self.families: list[Family] = []
+        self.gauges: list[tuple[str, str, Callable[[], float]]] = []
+
+    def counter(self, name: str, help_text: str) -> Family:
+        family = Family(name, "counter", help_text)
+        self.families.append(family)
+        return family
+
+    def histogram(self, name: str, help_text: str, buckets: tuple[float, ...] = LATENCY_BUCKETS) -> Family:
+        family = Family(name, "histogram", help_text, lambda: Histogram(buckets))
+        self.families.append(family)
+        return family
+
+    def gauge(self, name: str, help_text: str, read: Callable[[], float]) -> None:
+        """A gauge whose value is computed when scraped."""
+        self.gauges.append((name, help_text, read))
+
+    def render(self) -> str:
+        lines = []
+        for family in self.families:
+            lines.append(f"# HELP {family.name} {family.help}")
+            lines.append(f"# TYPE {family.name} {family.kind}")
+            for key, series in family.series.items():
+                if family.kind == "counter":
+                    lines.append(f"{family.name}{_labels(key)} {series.value}")
+                    continue
+                cumulative = 0
+                for bound, count in zip((*series.buckets, "+Inf"), series.counts):
+                    cumulative += count
+                    lines.append(f"{family.name}_bucket{_labels(key + (('le', str(bound)),))} {cumulative}")
+                lines.append(f"{family.name}_sum{_labels(key)} {series.sum}")
+                lines.append(f"{family.name}_count{_labels(key)} {cumulative}")
+        for name, help_text, read in self.gauges:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {read()}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(key: tuple[tuple[str, str], ...]) -> str:
+    if not key:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in key) + "}"
+
+
+registry = Registry()
+
+http_duration = registry.histogram(
+    "zkbackup_http_request_duration_seconds", "Time spent in route handlers, body streaming included."
+)
+ingested_bytes = registry.counter(
+    "zkbackup_ingested_bytes_total", "Encrypted chunk bytes received."
+).labels()
+ingested_chunks = registry.counter(
+    "zkbackup_ingested_chunks_total", "Chunks stored, including ones deduplicated by hash."
+).labels()
+storage_duration = registry.histogram(
+    "zkbackup_storage_op_duration_seconds", "Storage backend call latency."
+)
+db_duration = registry.histogram(
+    "zkbackup_db_query_duration_seconds", "SQL statement execution time."
+)
+cpu_wait = registry.histogram(
+    "zkbackup_cpu_wait_seconds", "Time CPU jobs waited for a pool thread."
+)
+cpu_run = registry.histogram(
+    "zkbackup_cpu_run_seconds", "Time CPU jobs spent running on the pool."
+)
+admission_wait = registry.histogram(
+    "zkbackup_admission_wait_seconds", "Time bulk requests spent queued for admission."
+).labels()
+admission_rejected = registry.counter(
+    "zkbackup_admission_rejected_total", "Requests turned away with 503 by admission control."
+)
+scrub_bytes = registry.counter(
+    "zkbackup_scrub_bytes_total", "Stored chunk bytes re-read by the integrity scrubber."
+).labels()
+scrub_chunks = registry.counter(
+    "zkbackup_scrub_chunks_total", "Chunks checked by the integrity scrubber."
+).labels()
+scrub_failures = registry.counter(
+    "zkbackup_scrub_failures_total", "Chunks the scrubber found missing or corrupted."
+)
+auth_cache_lookups = registry.counter(
+    "zkbackup_auth_cache_lookups_total", "Authenticated-user cache lookups, by result (hit or miss)."
+)
+auth_cache_evictions = registry.counter(
+    "zkbackup_auth_cache_evictions_total", "Users evicted from the auth cache to stay within AUTH_CACHE_SIZE."
+).labels()
+chunk_batch_rows = registry.histogram(
+    "zkbackup_chunk_batch_rows", "Chunk rows written per group commit.", (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+).labels()
+
+
+# ── HTTP ───────────────────────────────────────────────────────
+
+class TimedRoute(APIRoute):
+    """Route class that records handler latency under the route's path template."""
+
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+        route = f"{','.join(sorted(self.methods))} {self.path_format}"
+        histogram = None  # bound on first use: include_router() copies routes with the prefix
+
+        async def timed_handler(request: Request) -> Response:
+            nonlocal histogram
+            start = time.perf_counter()
+            try:
+                return await handler(request)
+            finally:
+                if histogram is None:
+                    histogram = http_duration.labels(route=route)
+                histogram.observe(time.perf_counter() - start)
+
+        return timed_handler
+
+
+# ── Storage ────────────────────────────────────────────────────
+
+_STORAGE_OPS = ("write", "write_stream", "read", "delete", "exists", "move", "delete_many", "assemble")
+
+# Set while a timed storage call runs. Backends delegate (LocalStorage.write is
+# write_stream, delete is delete_many, ...); only the outermost call is observed.
+_in_storage_op: ContextVar[bool] = ContextVar("in_storage_op", default=False)
+
+
+def instrument_storage(storage, backend: str) -> None:
+    """Wrap the backend's async methods (on the instance) with latency histograms."""
+    for op in _STORAGE_OPS:
+        setattr(storage, op, _timed(getattr(storage, op), storage_duration.labels(backend=backend, op=op)))
+    storage.read_stream = _timed_stream(
+        storage.read_stream, storage_duration.labels(backend=backend, op="read_stream")
+    )
+
+
+def _timed(method: Callable, histogram: Histogram) -> Callable:
+    async def wrapper(*args, **kwargs):
+        if _in_storage_op.get():
+            return await method(*args, **kwargs)
+        token = _in_storage_op.set(True)
+        start = time.perf_counter()
+        try:
+            return await method(*args, **kwargs)
+        finally:
+            histogram.observe(time.perf_counter() - start)
+            _in_storage_op.reset(token)
+    return wrapper
+
+
+def _timed_stream(method: Callable, histogram: Histogram) -> Callable:
+    # Time to fully drain (or abandon) the stream, not time to first byte
+    async def wrapper(*args, **kwargs):
+        outermost = not _in_storage_op.get()
+        start = time.perf_counter()
+        pieces = aiter(method(*args, **kwargs))
+        try:
+            while True:
+                # Set only while the backend runs: between pieces the consumer
+                # may make storage calls of its own
+                token = _in_storage_op.set(True)
+                try:
+                    piece = await anext(pieces)
+                except StopAsyncIteration:
+                    break
+                finally:
+                    _in_storage_op.reset(token)
+                yield piece
+        finally:
+            await pieces.aclose()
+            if outermost:
+                histogram.observe(time.perf_counter() - start)
+    return wrapper
+
+
+# ── Database ───────────────────────────────────────────────────
+
+_VERBS = ("SELECT", "INSERT", "UPDATE", "DELETE")
+
+
+def instrument_engine(engine: AsyncEngine) -> None:
+    """Time every cursor execute and expose connection pool gauges."""
+    by_verb = {verb: db_duration.labels(verb=verb.lower()) for verb in _VERBS}
+    other = db_duration.labels(verb="other")
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _start(conn, cursor, statement, parameters, context, executemany):
+        conn.info["query_start"] = time.perf_counter()
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _stop(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info.pop("query_start", time.perf_counter())
+        by_verb.get(statement[:6], other).observe(elapsed)
+
+    pool = sync_engine.pool
+    if hasattr(pool, "checkedout"):
+        registry.gauge("zkbackup_db_pool_size", "Connections the pool keeps open.", pool.size)
+        registry.gauge("zkbackup_db_pool_checked_out", "Connections currently in use.", pool.checkedout)
+        registry.gauge(
+            "zkbackup_db_pool_overflow", "Connections opened beyond the pool size.",
+            lambda: max(pool.overflow(), 0),
+        )
+        registry.gauge(
+            "zkbackup_db_pool_saturation",
+            "Checked-out connections / (pool size + max overflow).",
+            lambda: pool.checkedout() / max(pool.size() + max(pool._max_overflow, 0), 1),
+        )
@@ -3,5 +3,8 @@ from app.models.user import User
 from app.models.device import Device
 from app.models.file import BackupFile
 from app.models.chunk import Chunk
+from app.models.chunk_blob import ChunkBlob
+from app.models.usage import StorageUsage
+from app.models.scrub import ScrubCheckpoint, ScrubFailure
 
-__all__ = ["User", "Device", "BackupFile", "Chunk"]
+__all__ = ["User", "Device", "BackupFile", "Chunk", "ChunkBlob", "StorageUsage", "ScrubCheckpoint", "ScrubFailure"]
@@ -1,36 +1,77 @@
 import uuid
 from datetime import datetime
 
-from sqlalchemy import BigInteger, DateTime, ForeignKey, Integer, String, func
+from sqlalchemy import BigInteger, Boolean, DateTime, ForeignKey, Integer, LargeBinary, String, event, func, text
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import Mapped, mapped_column, relationship
+from sqlalchemy.types import TypeDecorator
 
 from app.database import Base
 
+# Hash partitions of the chunks table. Fixed: changing it means re-partitioning.
+PARTITIONS = 16
+
+
+class HexDigest(TypeDecorator):
+    """A SHA-256 digest stored as 32 raw bytes (bytea), exposed as 64 hex chars."""
+
+    impl = LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return bytes.fromhex(value) if value is not None else None
+
+    def process_result_value(self, value, dialect):
+        return bytes(value).hex() if value is not None else None
+
 
 class Chunk(Base):
     """
     Tracks individual chunk uploads for a BackupFile.
 
-    The chunk's encrypted bytes are stored on disk/S3 at [storage_path].
-    Postgres only holds metadata — never the blob itself.
+    The chunk's encrypted bytes are stored on disk/S3; Postgres only holds
+    metadata — never the blob itself. The blob's path isn't stored, since it
+    follows from the row (see StorageBackend.blob_path): the upload layout path,
+    the user's content-addressed blob when [shared], or the file's assembled
+    object when [blob_offset] is set.
+
+    Keyed by (file_id, chunk_index) and hash-partitioned by file_id, so a
+    file's chunks live in one partition and the key index stays small.
     """
 
     __tablename__ = "chunks"
+    __table_args__ = {"postgresql_partition_by": "HASH (file_id)"}
 
-    id: Mapped[uuid.UUID] = mapped_column(
-        UUID(as_uuid=True), primary_key=True, default=uuid.uuid4
-    )
     file_id: Mapped[uuid.UUID] = mapped_column(
-        UUID(as_uuid=True), ForeignKey("files.id"), nullable=False, index=True
+        UUID(as_uuid=True), ForeignKey("files.id"), primary_key=True
     )
-    chunk_index: Mapped[int] = mapped_column(Integer, nullable=False)
-    chunk_hash: Mapped[str] = mapped_column(String(64), nullable=False)
+    chunk_index: Mapped[int] = mapped_column(Integer, primary_key=True)
+    chunk_hash: Mapped[str] = mapped_column(HexDigest, nullable=False)
     size: Mapped[int] = mapped_column(BigInteger, nullable=False)
-    storage_path: Mapped[str] = mapped_column(String(512), nullable=False)
+    # Blob is the user's content-addressed copy (CHUNK_LAYOUT=content)
+    shared: Mapped[bool] = mapped_column(Boolean, nullable=False, default=False, server_default="false")
+    # Byte offset inside the file's assembled object; None while the chunk is its own blob
+    blob_offset: Mapped[int | None] = mapped_column(BigInteger, nullable=True)
+    # Only set for blobs at a path that can't be derived (rows migrated from the old schema)
+    storage_path: Mapped[str | None] = mapped_column(String(512), nullable=True)
     uploaded_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), server_default=func.now()
     )
 
     # Relationships
     file = relationship("BackupFile", back_populates="chunks")
+
+
+# What StorageBackend.blob_path() reads, for queries that don't load whole Chunk objects
+CHUNK_LOCATION = (
+    Chunk.file_id, Chunk.chunk_index, Chunk.chunk_hash, Chunk.shared, Chunk.blob_offset, Chunk.storage_path
+)
+
+
+@event.listens_for(Chunk.__table__, "after_create")
+def _create_partitions(target, connection, **kw):
+    for i in range(PARTITIONS):
+        connection.execute(text(
+            f"CREATE TABLE IF NOT EXISTS chunks_p{i:02d} PARTITION OF chunks "
+            f"FOR VALUES WITH (MODULUS {PARTITIONS}, REMAINDER {i})"
+        ))
@@ -0,0 +1,36 @@
+import uuid
+from datetime import datetime
+
+from sqlalchemy import BigInteger, DateTime, ForeignKey, Index, Integer, String, func, text
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.database import Base
+
+
+class ChunkBlob(Base):
+    """
+    Reference count for a content-addressed chunk blob (CHUNK_LAYOUT=content).
+
+    Keyed by (user_id, chunk_hash) so identical encrypted chunks are stored once
+    per user — never shared across users. Each Chunk row pointing at the blob
+    holds one reference; once the last one goes away, the sweeper deletes the
+    blob and the row.
+    """
+
+    __tablename__ = "chunk_blobs"
+    __table_args__ = (
+        # The sweeper's scan for blobs nothing references any more
+        Index("ix_chunk_blobs_unreferenced", "user_id", postgresql_where=text("refcount <= 0")),
+    )
+
+    user_id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True), ForeignKey("users.id"), primary_key=True
+    )
+    chunk_hash: Mapped[str] = mapped_column(String(64), primary_key=True)
+    size: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    storage_path: Mapped[str] = mapped_column(String(512), nullable=False)
+    refcount: Mapped[int] = mapped_column(Integer, nullable=False, default=1)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now()
+    )
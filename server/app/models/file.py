@@ -1,7 +1,7 @@
 import uuid
 from datetime import datetime
 
-from sqlalchemy import BigInteger, DateTime, ForeignKey, Integer, String, func
+from sqlalchemy import BigInteger, DateTime, ForeignKey, Index, Integer, Numeric, String, func, text
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
@@ -18,6 +18,20 @@ class BackupFile(Base):
     """
 
     __tablename__ = "files"
+    __table_args__ = (
+        # GET /files pages through a user's completed files in (completed_at, id) order
+        Index(
+            "ix_files_user_completed",
+            "user_id", "completed_at", "id",
+            postgresql_where=text("status = 'complete'"),
+        ),
+        # GET /upload/pending lists a device's uploads still in progress
+        Index(
+            "ix_files_device_uploading",
+            "user_id", "device_id",
+            postgresql_where=text("status = 'uploading'"),
+        ),
+    )
 
     id: Mapped[uuid.UUID] = mapped_column(
         UUID(as_uuid=True), primary_key=True, default=uuid.uuid4
@@ -33,6 +47,11 @@ class BackupFile(Base):
     )
     encrypted_size: Mapped[int] = mapped_column(BigInteger, nullable=False)
     chunk_count: Mapped[int] = mapped_column(Integer, nullable=False)
+    # Maintained by upload_chunk so complete never has to scan the chunks table
+    chunks_received: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
+    manifest_acc: Mapped[int] = mapped_column(
+        Numeric(78, 0), nullable=False, default=0, server_default="0"
+    )  # running manifest digest, see app/manifest.py
     status: Mapped[str] = mapped_column(
         String(20), nullable=False, default="uploading"
     )  # uploading | complete | failed
@@ -42,6 +61,8 @@ class BackupFile(Base):
     completed_at: Mapped[datetime | None] = mapped_column(
         DateTime(timezone=True), nullable=True
     )
+    # Single assembled object holding all chunks back to back (S3_ASSEMBLE_FILES)
+    blob_path: Mapped[str | None] = mapped_column(String(512), nullable=True)
 
     # Relationships
     user = relationship("User", back_populates="files")
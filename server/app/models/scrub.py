@@ -0,0 +1,48 @@
+import uuid
+from datetime import datetime
+
+from sqlalchemy import DateTime, ForeignKey, Integer, String, func
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.database import Base
+
+
+class ScrubCheckpoint(Base):
+    """
+    Where the integrity scrubber (app/storage/scrubber.py) left off: the last
+    chunk key checked in the current pass, or none at the start of a pass.
+    A single row.
+    """
+
+    __tablename__ = "scrub_checkpoint"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, default=1)
+    file_id: Mapped[uuid.UUID | None] = mapped_column(UUID(as_uuid=True), nullable=True)
+    chunk_index: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    passes: Mapped[int] = mapped_column(Integer, nullable=False, default=0)  # completed
+    pass_started_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now()
+    )
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), onupdate=func.now()
+    )
+
+
+class ScrubFailure(Base):
+    """
+    A chunk whose stored blob failed its latest integrity check: "missing", or
+    "mismatch" when its bytes no longer hash to chunk_hash. Removed once the
+    chunk checks out again.
+    """
+
+    __tablename__ = "scrub_failures"
+
+    file_id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True), ForeignKey("files.id", ondelete="CASCADE"), primary_key=True
+    )
+    chunk_index: Mapped[int] = mapped_column(Integer, primary_key=True)
+    reason: Mapped[str] = mapped_column(String(20), nullable=False)
+    found_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now()
+    )
@@ -0,0 +1,33 @@
+import uuid
+from datetime import datetime
+
+from sqlalchemy import BigInteger, DateTime, ForeignKey, Integer, func
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.database import Base
+
+
+class StorageUsage(Base):
+    """
+    Running storage counters per (user, device), kept up to date by the upload
+    endpoints and the sweeper (see app/usage.py).
+
+    [bytes] is the sum of the user's chunk sizes on that device, uploads in
+    progress included; [files] counts completed files. A user's total is the
+    sum over their few device rows.
+    """
+
+    __tablename__ = "storage_usage"
+
+    user_id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True), ForeignKey("users.id"), primary_key=True
+    )
+    device_id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True), ForeignKey("devices.id"), primary_key=True
+    )
+    bytes: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    files: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), onupdate=func.now()
+    )
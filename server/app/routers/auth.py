@@ -15,12 +15,15 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.auth.dependencies import get_current_user
 from app.auth.jwt import create_access_token, create_refresh_token, verify_token
+from app.cpu import cpu
 from app.database import get_db
+from app.metrics import TimedRoute
 from app.models.device import Device
 from app.models.user import User
+from app.shared_state import limiter_storage_uri
 
-limiter = Limiter(key_func=get_remote_address)
-router = APIRouter(prefix="/auth")
+limiter = Limiter(key_func=get_remote_address, storage_uri=limiter_storage_uri())
+router = APIRouter(prefix="/auth", route_class=TimedRoute)
 
 
 # ── Schemas ────────────────────────────────────────────────────
@@ -58,8 +61,8 @@ async def register(request: Request, req: RegisterRequest, db: AsyncSession = De
     if result.scalar_one_or_none():
         raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Email already registered")
 
-    # Hash password with bcrypt
-    pw_hash = bcrypt.hashpw(req.password.encode(), bcrypt.gensalt()).decode()
+    # Hash password with bcrypt (on the CPU pool — ~250 ms that would block the loop)
+    pw_hash = (await cpu.run("bcrypt", bcrypt.hashpw, req.password.encode(), bcrypt.gensalt())).decode()
 
     user = User(email=req.email, password_hash=pw_hash)
     db.add(user)
@@ -78,7 +81,9 @@ async def login(request: Request, req: LoginRequest, db: AsyncSession = Depends(
     result = await db.execute(select(User).where(User.email == req.email))
     user = result.scalar_one_or_none()
 
-    if user is None or not bcrypt.checkpw(req.password.encode(), user.password_hash.encode()):
+    if user is None or not await cpu.run(
+        "bcrypt", bcrypt.checkpw, req.password.encode(), user.password_hash.encode()
+    ):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
 
     if not user.is_active:
@@ -0,0 +1,229 @@
+"""
+File endpoints: listing and download (restore) of completed uploads.
+
+  GET /files              → compact rows of completed files, cursor-paginated
+  GET /files/{id}/content → encrypted file bytes (chunks concatenated in order)
+
+The listing is a keyset scan over (completed_at, id), served by a partial
+index, so every page costs the same however many files a user has. The cursor
+of the last page doubles as a sync token: GET /files?since=<cursor> later
+returns only files completed after it. Pages carry an ETag and honor
+If-None-Match.
+
+Supports single-range `Range: bytes=...` requests so interrupted restores can
+resume. Bytes are streamed from storage with chunk read-ahead. There is no
+sendfile path: uvicorn doesn't implement the ASGI zero-copy send extension, so
+every byte passes through the process in bounded pieces.
+"""
+
+import base64
+import binascii
+import hashlib
+import re
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from pydantic import BaseModel
+from sqlalchemy import select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+from app.auth.dependencies import get_current_user
+from app.config import settings
+from app.database import get_db
+from app.models.chunk import CHUNK_LOCATION, Chunk
+from app.models.file import BackupFile
+from app.models.user import User
+from app.storage.base import StorageBackend, get_storage
+from app.storage.restore import Piece, stream_pieces
+
+router = APIRouter(prefix="/files")
+
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+# ── Schemas ────────────────────────────────────────────────────
+
+class FileEntry(BaseModel):
+    id: str
+    hash: str  # file_hash, as sent to /upload/init
+    size: int  # encrypted_size
+    status: str
+
+class FileListResponse(BaseModel):
+    files: list[FileEntry]
+    cursor: str | None  # pass as ?since= for the next page, or the next sync
+    has_more: bool
+
+
+# ── Helpers ────────────────────────────────────────────────────
+
+def _encode_cursor(completed_at: datetime, file_id: uuid.UUID) -> str:
+    micros = (completed_at - _EPOCH) // timedelta(microseconds=1)
+    return base64.urlsafe_b64encode(f"{micros}.{file_id.hex}".encode()).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> tuple[datetime, uuid.UUID]:
+    try:
+        micros, file_id = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode().split(".")
+        return _EPOCH + timedelta(microseconds=int(micros)), uuid.UUID(hex=file_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+
+def _etag_matches(header: str | None, etag: str) -> bool:
+    if not header:
+        return False
+    return any(tag.strip().removeprefix("W/") in (etag, "*") for tag in header.split(","))
+
+
+def _parse_range(header: str | None, total: int) -> tuple[int, int] | None:
+    """
+    Parse a single-range Range header into an inclusive (start, end).
+
+    Returns None to serve the whole file (no header, or a multi-range request,
+    which we're allowed to ignore). Raises 416 for unsatisfiable ranges.
+    """
+    if not header:
+        return None
+    match = _RANGE_RE.match(header.strip())
+    if not match or match.groups() == ("", ""):
+        return None
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), total - 1) if last else total - 1
+    else:
+        start, end = max(total - int(last), 0), total - 1
+    if start > end or start >= total:
+        raise HTTPException(
+            status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+            detail="Range not satisfiable",
+            headers={"Content-Range": f"bytes */{total}"},
+        )
+    return start, end
+
+
+def _pieces(chunks, start: int, end: int) -> list[Piece]:
+    """Map the inclusive byte range [start, end] of the file onto chunk blobs."""
+    pieces = []
+    pos = 0
+    for storage_path, blob_offset, size in chunks:
+        lo, hi = max(start, pos), min(end + 1, pos + size)
+        if lo < hi:
+            pieces.append(Piece(storage_path, (blob_offset or 0) + lo - pos, hi - lo))
+        pos += size
+        if pos > end:
+            break
+    return pieces
+
+
+class _FileContentResponse(Response):
+    """Streams pieces in order, with the next ones read ahead (see app/storage/restore.py)."""
+
+    def __init__(self, storage: StorageBackend, pieces: list[Piece], status_code: int, headers: dict):
+        super().__init__(status_code=status_code, headers=headers, media_type="application/octet-stream")
+        self.storage = storage
+        self.pieces = pieces
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        async for data in stream_pieces(self.storage, self.pieces):
+            await send({"type": "http.response.body", "body": data, "more_body": True})
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+# ── Endpoints ──────────────────────────────────────────────────
+
+@router.get("", response_model=FileListResponse)
+async def list_files(
+    request: Request,
+    since: str | None = None,
+    limit: int = Query(settings.FILES_PAGE_SIZE, ge=1, le=settings.FILES_PAGE_MAX),
+    user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    List completed files after [since] (a cursor from an earlier response), oldest first.
+
+    Files completed in the last FILES_SYNC_SETTLE_SECONDS are left for the next
+    call, so a cursor never moves past a file whose transaction hasn't committed yet.
+    """
+    settled = datetime.now(timezone.utc) - timedelta(seconds=settings.FILES_SYNC_SETTLE_SECONDS)
+    query = (
+        select(BackupFile.id, BackupFile.file_hash, BackupFile.encrypted_size, BackupFile.status,
+               BackupFile.completed_at)
+        .where(
+            BackupFile.user_id == user.id,
+            BackupFile.status == "complete",
+            BackupFile.completed_at <= settled,
+        )
+        .order_by(BackupFile.completed_at, BackupFile.id)
+        .limit(limit + 1)
+    )
+    if since:
+        query = query.where(tuple_(BackupFile.completed_at, BackupFile.id) > tuple_(*_decode_cursor(since)))
+    rows = (await db.execute(query)).all()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    cursor = _encode_cursor(rows[-1].completed_at, rows[-1].id) if rows else since
+
+    # Completed rows never change, so the page is identified by where it starts and ends
+    etag = '"' + hashlib.sha256(f"{since}|{limit}|{cursor}|{len(rows)}|{has_more}".encode()).hexdigest()[:32] + '"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    body = FileListResponse(
+        files=[
+            FileEntry(id=str(row.id), hash=row.file_hash, size=row.encrypted_size, status=row.status)
+            for row in rows
+        ],
+        cursor=cursor,
+        has_more=has_more,
+    )
+    return Response(body.model_dump_json(), media_type="application/json", headers=headers)
+
+
+@router.get("/{file_id}/content")
+async def file_content(
+    file_id: str,
+    request: Request,
+    user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """Download a completed file's encrypted bytes. Honors single-range Range requests."""
+    result = await db.execute(
+        select(BackupFile).where(BackupFile.id == uuid.UUID(file_id), BackupFile.user_id == user.id)
+    )
+    backup_file = result.scalar_one_or_none()
+    if not backup_file:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="File not found")
+    if backup_file.status != "complete":
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Upload not complete")
+
+    chunk_result = await db.execute(
+        select(*CHUNK_LOCATION, Chunk.size)
+        .where(Chunk.file_id == backup_file.id)
+        .order_by(Chunk.chunk_index)
+    )
+    storage = get_storage()
+    chunks = [(storage.blob_path(str(user.id), row), row.blob_offset, row.size) for row in chunk_result]
+    total = sum(size for _, _, size in chunks)
+
+    byte_range = _parse_range(request.headers.get("range"), total)
+    start, end = byte_range or (0, total - 1)
+    headers = {"Accept-Ranges": "bytes", "Content-Length": str(end - start + 1 if total else 0)}
+    if byte_range:
+        headers["Content-Range"] = f"bytes {start}-{end}/{total}"
+
+    return _FileContentResponse(
+        storage,
+        _pieces(chunks, start, end),
+        status.HTTP_206_PARTIAL_CONTENT if byte_range else status.HTTP_200_OK,
+        headers,
+    )
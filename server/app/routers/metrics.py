@@ -0,0 +1,18 @@
+"""
+Prometheus scrape endpoint (see app/metrics.py).
+
+Served at /metrics, outside the API prefix. The bundled Caddyfiles don't proxy
+it, so scrape the api container directly (api:8000/metrics).
+"""
+
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from app.metrics import registry
+
+router = APIRouter()
+
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
@@ -3,28 +3,48 @@ Upload endpoints: init, chunk, complete, status.
 
 Protocol:
   1. POST /upload/init         → returns upload_id
+     (or POST /upload/init-batch for many files at once)
   2. PUT  /upload/{id}/chunk/n → upload encrypted chunk bytes
   3. POST /upload/{id}/complete → finalize
   4. GET  /upload/{id}/status   → check progress
+
+A client coming back online calls GET /upload/pending?device_id=... instead:
+every upload of that device still in progress, with the chunk ranges it still
+has to send, from one aggregate query.
+
+Files that fit in one chunk can skip all of that: POST /upload/files takes many
+of them in one multipart body and stores and finalizes them in one go.
 """
 
+import asyncio
 import hashlib
+import re
 import uuid
+from collections.abc import AsyncIterator
+from datetime import datetime, timezone
+from decimal import Decimal
 
-from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Request, UploadFile, status
 from pydantic import BaseModel
-from sqlalchemy import select
+from sqlalchemy import ARRAY, String, any_, bindparam, func, select, update
+from sqlalchemy.dialects.postgresql import aggregate_order_by, insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app import manifest, usage
 from app.auth.dependencies import get_current_user
+from app.chunk_writer import ChunkRecord, chunk_writer
 from app.config import settings
+from app.cpu import cpu
 from app.database import get_db
-from app.models.chunk import Chunk
+from app.metrics import TimedRoute, ingested_bytes, ingested_chunks
+from app.models.chunk import CHUNK_LOCATION, Chunk
 from app.models.file import BackupFile
 from app.models.user import User
-from app.storage.base import get_storage
+from app.storage import content
+from app.storage.assemble import assemble_file, assembly_enabled
+from app.storage.base import STREAM_PIECE_SIZE, get_storage
 
-router = APIRouter(prefix="/upload")
+router = APIRouter(prefix="/upload", route_class=TimedRoute)
 
 
 # ── Schemas ────────────────────────────────────────────────────
@@ -39,13 +59,154 @@ class UploadInitResponse(BaseModel):
     upload_id: str
     already_exists: bool
 
+class UploadInitBatchRequest(BaseModel):
+    files: list[UploadInitRequest]
+
+class UploadInitBatchResponse(BaseModel):
+    results: dict[str, UploadInitResponse]  # keyed by file_hash
+
+class UploadFileResult(BaseModel):
+    upload_id: str | None = None
+    already_exists: bool = False
+    chunk_hash: str | None = None  # SHA-256 of the encrypted bytes, as stored
+    flushed: bool = True
+    error: str | None = None  # this file was rejected; the rest of the batch still went through
+
+class UploadFilesResponse(BaseModel):
+    results: dict[str, UploadFileResult]  # keyed by file_hash
+
+class UploadCompleteRequest(BaseModel):
+    manifest_root: str | None = None  # see app/manifest.py; checked when given
+    deep_verify: bool = False  # also confirm every chunk blob exists in storage
+
 class UploadCompleteResponse(BaseModel):
     status: str
+    flushed: bool = True  # False while chunks still sit in the local staging tier
 
 class UploadStatusResponse(BaseModel):
     upload_id: str
     status: str
     chunks_received: list[int]
+    flushed: bool = True
+
+class PendingUpload(BaseModel):
+    upload_id: str
+    file_hash: str
+    chunk_count: int
+    chunks_received: int
+    missing: list[tuple[int, int]]  # inclusive [first, last] chunk index ranges, ascending
+
+class PendingUploadsResponse(BaseModel):
+    uploads: list[PendingUpload]
+
+
+# ── Helpers ────────────────────────────────────────────────────
+
+class _HashingStream:
+    """
+    Wraps a request body stream: hashes and counts bytes as they pass through
+    and aborts with 413 as soon as [max_size] is exceeded.
+
+    Pieces are passed on as they arrive; hashing happens on the CPU pool in
+    batches of CPU_HASH_BATCH_BYTES, in order, so the loop never runs SHA-256.
+    """
+
+    def __init__(self, source: AsyncIterator[bytes], max_size: int):
+        self._source = source
+        self._max_size = max_size
+        self._sha = hashlib.sha256()
+        self.size = 0
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        batch: list[bytes] = []
+        batch_size = 0
+        async for piece in self._source:
+            if not piece:
+                continue
+            self.size += len(piece)
+            if self.size > self._max_size:
+                raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="Chunk too large")
+            batch.append(piece)
+            batch_size += len(piece)
+            if batch_size >= settings.CPU_HASH_BATCH_BYTES:
+                await cpu.run("sha256", _hash_pieces, self._sha, batch)
+                batch, batch_size = [], 0
+            yield piece
+        if batch:
+            await cpu.run("sha256", _hash_pieces, self._sha, batch)
+
+    def hexdigest(self) -> str:
+        return self._sha.hexdigest()
+
+
+def _hash_pieces(sha, pieces: list[bytes]) -> None:
+    for piece in pieces:
+        sha.update(piece)
+
+
+_FILE_HASH_RE = re.compile(r"^[0-9a-f]{64}$")
+
+
+def _limit_body(request: Request, max_size: int) -> Request:
+    """
+    [request] with a body that aborts with 413 once more than [max_size] bytes
+    have arrived, declared Content-Length or not (chunked transfer encoding).
+    """
+    received = 0
+
+    async def receive():
+        nonlocal received
+        message = await request.receive()
+        if message["type"] == "http.request":
+            received += len(message.get("body", b""))
+            if received > max_size:
+                raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="Request too large")
+        return message
+
+    return Request(request.scope, receive)
+
+
+async def _read_pieces(part: UploadFile) -> AsyncIterator[bytes]:
+    while piece := await part.read(STREAM_PIECE_SIZE):
+        yield piece
+
+
+async def _missing_blobs(db: AsyncSession, user_id: uuid.UUID, file_id: uuid.UUID) -> list[int]:
+    """Chunk indexes whose blob is absent from storage, checked with bounded concurrency."""
+    result = await db.execute(select(*CHUNK_LOCATION).where(Chunk.file_id == file_id))
+    storage = get_storage()
+    gate = asyncio.Semaphore(settings.VERIFY_CONCURRENCY)
+
+    async def check(chunk_index: int, storage_path: str) -> int | None:
+        async with gate:
+            return None if await storage.exists(storage_path) else chunk_index
+
+    found = await asyncio.gather(*(
+        check(row.chunk_index, storage.blob_path(str(user_id), row)) for row in result.all()
+    ))
+    return sorted(i for i in found if i is not None)
+
+
+async def _flushed(db: AsyncSession, user_id: uuid.UUID, file_id: uuid.UUID) -> bool:
+    """Whether every chunk blob of the file has reached long-term storage."""
+    storage = get_storage()
+    if not storage.write_back:
+        return True
+    result = await db.execute(select(*CHUNK_LOCATION).where(Chunk.file_id == file_id))
+    return storage.flushed(storage.blob_path(str(user_id), row) for row in result.all())
+
+
+def _missing_ranges(received: list[int], chunk_count: int) -> list[tuple[int, int]]:
+    """Gaps in the ascending chunk indexes [received] among 0..chunk_count-1, as inclusive ranges."""
+    ranges = []
+    start = 0
+    for index in received:
+        if index > start:
+            ranges.append((start, index - 1))
+        start = index + 1
+    if start < chunk_count:
+        ranges.append((start, chunk_count - 1))
+    return ranges
 
 
 # ── Endpoints ──────────────────────────────────────────────────
@@ -76,6 +237,8 @@ async def upload_init(
     device_id = uuid.UUID(req.device_id)
     # (In production, verify device ownership — skipped for brevity)
 
+    await usage.check_quota(db, user.id, req.encrypted_size)
+
     # Create file record
     backup_file = BackupFile(
         user_id=user.id,
@@ -91,6 +254,195 @@ async def upload_init(
     return UploadInitResponse(upload_id=str(backup_file.id), already_exists=False)
 
 
+@router.post("/init-batch", response_model=UploadInitBatchResponse)
+async def upload_init_batch(
+    req: UploadInitBatchRequest,
+    user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Initialize many uploads in one round trip (e.g. a phone's first full scan).
+
+    Same semantics as /upload/init for each entry, but duplicates are resolved with
+    one query and the missing file records are created with one bulk insert.
+    Repeated hashes within the batch share a single upload.
+    """
+    if len(req.files) > settings.MAX_INIT_BATCH:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"At most {settings.MAX_INIT_BATCH} files per batch",
+        )
+
+    requests = {f.file_hash: f for f in req.files}
+
+    # One array parameter rather than an IN list, so huge batches stay one statement
+    result = await db.execute(
+        select(BackupFile.file_hash, BackupFile.id).where(
+            BackupFile.user_id == user.id,
+            BackupFile.file_hash == any_(bindparam("hashes", list(requests), type_=ARRAY(String))),
+            BackupFile.status == "complete",
+        )
+    )
+    results = {
+        file_hash: UploadInitResponse(upload_id=str(file_id), already_exists=True)
+        for file_hash, file_id in result.all()
+    }
+
+    # (In production, verify device ownership — skipped for brevity)
+    rows = [
+        {
+            "id": uuid.uuid4(),
+            "user_id": user.id,
+            "device_id": uuid.UUID(f.device_id),
+            "file_hash": f.file_hash,
+            "encrypted_size": f.encrypted_size,
+            "chunk_count": f.chunk_count,
+            "status": "uploading",
+        }
+        for file_hash, f in requests.items()
+        if file_hash not in results
+    ]
+    if rows:
+        await usage.check_quota(db, user.id, sum(row["encrypted_size"] for row in rows))
+        await db.execute(insert(BackupFile), rows)
+    for row in rows:
+        results[row["file_hash"]] = UploadInitResponse(upload_id=str(row["id"]), already_exists=False)
+
+    return UploadInitBatchResponse(results=results)
+
+
+@router.post("/files", response_model=UploadFilesResponse)
+async def upload_files(
+    request: Request,
+    user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Upload many single-chunk files (photos, voice notes, ...) in one request.
+
+    The multipart/form-data body holds a `device_id` field and one file part per
+    file, named by its file_hash, whose content is the encrypted file. Each file
+    ends up exactly as if it had gone through init → chunk/0 → complete, but the
+    whole batch costs one round trip, one dedup query and one transaction.
+    Files that already exist are skipped; a rejected file (bad hash, larger than
+    one chunk) only gets an error in its own result.
+    """
+    # Refuse a declared oversized body up front; an undeclared one is cut off as it streams in
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > settings.MAX_UPLOAD_FILES_BYTES:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="Request too large")
+    request = _limit_body(request, settings.MAX_UPLOAD_FILES_BYTES)
+
+    # Parts are spooled as they stream in (to disk past 1 MB), never held whole in memory
+    async with request.form(max_files=settings.MAX_UPLOAD_FILES, max_fields=1) as form:
+        try:
+            device_id = uuid.UUID(str(form.get("device_id")))
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid device_id")
+        # (In production, verify device ownership — skipped for brevity)
+
+        results: dict[str, UploadFileResult] = {}
+        parts: dict[str, UploadFile] = {}
+        for file_hash, part in form.multi_items():
+            if not isinstance(part, UploadFile):
+                continue
+            if not _FILE_HASH_RE.match(file_hash):
+                results[file_hash] = UploadFileResult(error="Invalid file_hash")
+            elif part.size is not None and part.size > settings.MAX_CHUNK_SIZE:
+                results[file_hash] = UploadFileResult(error="File larger than one chunk")
+            else:
+                parts[file_hash] = part  # a repeated hash is stored once
+
+        if parts:
+            result = await db.execute(
+                select(BackupFile.file_hash, BackupFile.id).where(
+                    BackupFile.user_id == user.id,
+                    BackupFile.file_hash == any_(bindparam("hashes", list(parts), type_=ARRAY(String))),
+                    BackupFile.status == "complete",
+                )
+            )
+            for file_hash, file_id in result.all():
+                results[file_hash] = UploadFileResult(upload_id=str(file_id), already_exists=True)
+                parts.pop(file_hash, None)
+            await usage.check_quota(db, user.id, sum(part.size or 0 for part in parts.values()))
+
+        storage = get_storage()
+        gate = asyncio.Semaphore(settings.UPLOAD_FILES_CONCURRENCY)
+
+        async def store(file_hash: str, part: UploadFile) -> tuple[str, uuid.UUID, str, str, int] | None:
+            file_id = uuid.uuid4()
+            storage_path = storage.chunk_path(str(user.id), str(file_id), 0)
+            body = _HashingStream(_read_pieces(part), settings.MAX_CHUNK_SIZE)
+            async with gate:
+                try:
+                    await storage.write_stream(storage_path, body)
+                except HTTPException:
+                    # Larger than the part's declared size let on; nothing was kept
+                    results[file_hash] = UploadFileResult(error="File larger than one chunk")
+                    return None
+            return file_hash, file_id, storage_path, body.hexdigest(), body.size
+
+        outcomes = await asyncio.gather(*(store(h, p) for h, p in parts.items()), return_exceptions=True)
+
+    stored = [o for o in outcomes if isinstance(o, tuple)]
+    failure = next((o for o in outcomes if isinstance(o, BaseException)), None)
+    if failure is not None:
+        await storage.delete_many([storage_path for _, _, storage_path, _, _ in stored])
+        raise failure
+
+    content_layout = settings.CHUNK_LAYOUT == "content"
+    now = datetime.now(timezone.utc)
+    file_rows, chunk_rows, paths = [], [], []
+    try:
+        for file_hash, file_id, storage_path, chunk_hash, size in stored:
+            if content_layout:
+                storage_path = await content.acquire(db, storage, user.id, chunk_hash, size, storage_path)
+            file_rows.append({
+                "id": file_id,
+                "user_id": user.id,
+                "device_id": device_id,
+                "file_hash": file_hash,
+                "encrypted_size": size,
+                "chunk_count": 1,
+                "chunks_received": 1,
+                "manifest_acc": Decimal(manifest.leaf(0, chunk_hash)),
+                "status": "complete",
+                "completed_at": now,
+            })
+            chunk_rows.append({
+                "file_id": file_id,
+                "chunk_index": 0,
+                "chunk_hash": chunk_hash,
+                "size": size,
+                "shared": content_layout,
+            })
+            paths.append(storage_path)
+        if file_rows:
+            await db.execute(insert(BackupFile), file_rows)
+            await db.execute(insert(Chunk), chunk_rows)
+            await usage.add(
+                db, user.id, device_id, sum(row["size"] for row in chunk_rows), len(file_rows)
+            )
+    except Exception:
+        # Content-addressed blobs may be shared with other files, so only
+        # per-upload blobs are safe to drop here.
+        if not content_layout:
+            await storage.delete_many([storage_path for _, _, storage_path, _, _ in stored])
+        raise
+
+    for row in chunk_rows:
+        ingested_bytes.inc(row["size"])
+        ingested_chunks.inc()
+    for file_row, chunk_row, storage_path in zip(file_rows, chunk_rows, paths):
+        results[file_row["file_hash"]] = UploadFileResult(
+            upload_id=str(file_row["id"]),
+            chunk_hash=chunk_row["chunk_hash"],
+            flushed=storage.flushed([storage_path]),
+        )
+
+    return UploadFilesResponse(results=results)
+
+
 @router.put("/{upload_id}/chunk/{chunk_index}")
 async def upload_chunk(
     upload_id: str,
@@ -116,37 +468,102 @@ async def upload_chunk(
     if chunk_index < 0 or chunk_index >= backup_file.chunk_count:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid chunk index")
 
-    # Read binary body
-    body = await request.body()
-    if len(body) > settings.MAX_CHUNK_SIZE:
-        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="Chunk too large")
-
-    # Compute hash of encrypted chunk
-    chunk_hash = hashlib.sha256(body).hexdigest()
-
-    # Store chunk blob via storage adapter
     storage = get_storage()
-    storage_path = storage.chunk_path(str(user.id), upload_id, chunk_index)
-    await storage.write(storage_path, body)
-
-    # Upsert chunk record
-    existing_chunk = await db.execute(
-        select(Chunk).where(Chunk.file_id == file_id, Chunk.chunk_index == chunk_index)
-    )
-    chunk = existing_chunk.scalar_one_or_none()
-    if chunk:
-        chunk.chunk_hash = chunk_hash
-        chunk.size = len(body)
-        chunk.storage_path = storage_path
+    content_layout = settings.CHUNK_LAYOUT == "content"
+
+    # Content-addressed layout: a client that already knows the chunk's hash can
+    # skip re-sending bytes this user has stored before (e.g. after a reinstall).
+    reused = None
+    claimed_hash = request.headers.get("x-chunk-hash", "").lower()
+    if content_layout and len(claimed_hash) == 64:
+        reused = await content.acquire_existing(db, user.id, claimed_hash)
+
+    if reused:
+        storage_path, size = reused
+        chunk_hash = claimed_hash
     else:
-        chunk = Chunk(
-            file_id=file_id,
-            chunk_index=chunk_index,
-            chunk_hash=chunk_hash,
-            size=len(body),
-            storage_path=storage_path,
+        # Reject oversized bodies before reading anything when the client declares a length
+        content_length = request.headers.get("content-length")
+        if content_length and content_length.isdigit() and int(content_length) > settings.MAX_CHUNK_SIZE:
+            raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="Chunk too large")
+
+        # Stream the body into storage, hashing the encrypted bytes on the way through
+        body = _HashingStream(request.stream(), settings.MAX_CHUNK_SIZE)
+        storage_path = storage.chunk_path(str(user.id), str(file_id), chunk_index)
+        await storage.write_stream(storage_path, body)
+        chunk_hash = body.hexdigest()
+        size = body.size
+        ingested_bytes.inc(size)
+
+        if content_layout:
+            storage_path = await content.acquire(db, storage, user.id, chunk_hash, size, storage_path)
+
+    ingested_chunks.inc()
+    shared = content_layout
+
+    # Record the chunk: a first upload is a single INSERT ... ON CONFLICT DO NOTHING.
+    # If the row already existed (a re-send, or a concurrent PUT that won the insert
+    # and has committed by now), replace it and get the old values back.
+    if settings.CHUNK_GROUP_COMMIT and not content_layout:
+        # The writer also counts the chunk, and commits it with other requests' rows
+        record = ChunkRecord(user.id, backup_file.device_id, file_id, chunk_index, chunk_hash, size)
+        # End the read-only transaction first: its pool connection would otherwise sit
+        # idle through the wait while the writer needs one from the same pool
+        await db.commit()
+        inserted = await chunk_writer.insert(record)
+        if inserted is None:  # completed or expired since the check above
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Upload already complete")
+        if inserted:
+            return {"status": "ok", "chunk_index": chunk_index, "chunk_hash": chunk_hash}
+    else:
+        result = await db.execute(
+            insert(Chunk)
+            .values(file_id=file_id, chunk_index=chunk_index, chunk_hash=chunk_hash, size=size, shared=shared)
+            .on_conflict_do_nothing(index_elements=[Chunk.file_id, Chunk.chunk_index])
+            .returning(Chunk.chunk_index)
+        )
+        inserted = result.first() is not None
+    old = None
+    if not inserted:
+        previous = (
+            select(*CHUNK_LOCATION, Chunk.size)
+            .where(Chunk.file_id == file_id, Chunk.chunk_index == chunk_index)
+            .with_for_update()
+            .subquery("previous")
+        )
+        result = await db.execute(
+            update(Chunk)
+            .where(
+                Chunk.file_id == file_id,
+                Chunk.chunk_index == chunk_index,
+                Chunk.chunk_index == previous.c.chunk_index,
+            )
+            .values(
+                chunk_hash=chunk_hash, size=size, shared=shared,
+                blob_offset=None, storage_path=None, uploaded_at=func.now(),
+            )
+            .returning(*previous.c)
         )
-        db.add(chunk)
+        old = result.one()
+
+    # Fold the chunk into the file's running count and manifest digest. A single
+    # UPDATE, so concurrent chunk PUTs for the same file can't lose increments.
+    old_leaf = manifest.leaf(chunk_index, old.chunk_hash) if old else 0
+    delta = (manifest.leaf(chunk_index, chunk_hash) - old_leaf) % manifest.MODULUS
+    await db.execute(
+        update(BackupFile)
+        .where(BackupFile.id == file_id)
+        .values(
+            chunks_received=BackupFile.chunks_received + (0 if old else 1),
+            manifest_acc=func.mod(BackupFile.manifest_acc + Decimal(delta), Decimal(manifest.MODULUS)),
+        )
+    )
+    await usage.add(db, user.id, backup_file.device_id, size - (old.size if old else 0))
+
+    if old and old.shared:
+        # The new reference was taken before the old one is dropped, so re-sending
+        # the same bytes never lets the refcount touch zero.
+        await content.release(db, user.id, old.chunk_hash)
 
     return {"status": "ok", "chunk_index": chunk_index, "chunk_hash": chunk_hash}
 
@@ -154,37 +571,107 @@ async def upload_chunk(
 @router.post("/{upload_id}/complete", response_model=UploadCompleteResponse)
 async def upload_complete(
     upload_id: str,
+    background_tasks: BackgroundTasks,
+    req: UploadCompleteRequest | None = None,
     user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ):
-    """Finalize an upload. Verifies all chunks are present."""
+    """
+    Finalize an upload. Verifies all chunks are present.
+
+    The chunk count and manifest checks read counters kept on the file row, so
+    they cost the same for 1 chunk or 500. deep_verify additionally checks that
+    every chunk blob exists in storage (VERIFY_CONCURRENCY lookups at a time).
+    """
+    req = req or UploadCompleteRequest()
     file_id = uuid.UUID(upload_id)
 
+    # Locked, so a concurrent repeat of this call waits and then sees "complete"
     result = await db.execute(
-        select(BackupFile).where(BackupFile.id == file_id, BackupFile.user_id == user.id)
+        select(BackupFile)
+        .where(BackupFile.id == file_id, BackupFile.user_id == user.id)
+        .with_for_update()
     )
     backup_file = result.scalar_one_or_none()
     if not backup_file:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Upload not found")
 
-    # Count received chunks
-    chunk_result = await db.execute(
-        select(Chunk).where(Chunk.file_id == file_id)
-    )
-    chunks = chunk_result.scalars().all()
+    # Repeats are no-ops: completed rows never change (GET /files relies on that)
+    if backup_file.status == "complete":
+        return UploadCompleteResponse(status="complete", flushed=await _flushed(db, user.id, file_id))
 
-    if len(chunks) != backup_file.chunk_count:
+    if backup_file.chunks_received != backup_file.chunk_count:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Expected {backup_file.chunk_count} chunks, got {len(chunks)}",
+            detail=f"Expected {backup_file.chunk_count} chunks, got {backup_file.chunks_received}",
         )
 
+    if req.manifest_root is not None:
+        try:
+            client_root = int(req.manifest_root, 16)
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid manifest_root")
+        if client_root != int(backup_file.manifest_acc):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Manifest mismatch")
+
+    if req.deep_verify:
+        missing = await _missing_blobs(db, user.id, file_id)
+        if missing:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail={"message": "Chunk blobs missing from storage", "missing_chunks": missing},
+            )
+
     # Mark complete
-    from datetime import datetime, timezone
+    await usage.add(db, user.id, backup_file.device_id, files_delta=1)
     backup_file.status = "complete"
     backup_file.completed_at = datetime.now(timezone.utc)
 
-    return UploadCompleteResponse(status="complete")
+    # Merge chunk objects into one after the response (and the commit) went out
+    if assembly_enabled():
+        background_tasks.add_task(assemble_file, file_id)
+
+    return UploadCompleteResponse(status="complete", flushed=await _flushed(db, user.id, file_id))
+
+
+@router.get("/pending", response_model=PendingUploadsResponse)
+async def upload_pending(
+    device_id: uuid.UUID,
+    user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Every upload of [device_id] that hasn't been completed, with the chunks it
+    still needs, so a reconnecting client can resume them all in one round trip.
+    """
+    received = (
+        func.array_agg(aggregate_order_by(Chunk.chunk_index, Chunk.chunk_index))
+        .filter(Chunk.chunk_index.isnot(None))
+    )
+    result = await db.execute(
+        select(BackupFile.id, BackupFile.file_hash, BackupFile.chunk_count, received.label("received"))
+        .outerjoin(Chunk, Chunk.file_id == BackupFile.id)
+        .where(
+            BackupFile.user_id == user.id,
+            BackupFile.device_id == device_id,
+            BackupFile.status == "uploading",
+        )
+        .group_by(BackupFile.id)
+        .order_by(BackupFile.id)
+    )
+
+    return PendingUploadsResponse(
+        uploads=[
+            PendingUpload(
+                upload_id=str(row.id),
+                file_hash=row.file_hash,
+                chunk_count=row.chunk_count,
+                chunks_received=len(row.received or ()),
+                missing=_missing_ranges(row.received or [], row.chunk_count),
+            )
+            for row in result.all()
+        ]
+    )
 
 
 @router.get("/{upload_id}/status", response_model=UploadStatusResponse)
@@ -203,13 +690,13 @@ async def upload_status(
     if not backup_file:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Upload not found")
 
-    chunk_result = await db.execute(
-        select(Chunk.chunk_index).where(Chunk.file_id == file_id)
-    )
-    received = [row[0] for row in chunk_result.all()]
+    chunk_result = await db.execute(select(*CHUNK_LOCATION).where(Chunk.file_id == file_id))
+    rows = chunk_result.all()
+    storage = get_storage()
 
     return UploadStatusResponse(
         upload_id=upload_id,
         status=backup_file.status,
-        chunks_received=sorted(received),
+        chunks_received=sorted(row.chunk_index for row in rows),
+        flushed=storage.flushed(storage.blob_path(str(user.id), row) for row in rows),
     )
@@ -0,0 +1,55 @@
+"""
+Usage endpoint: how much the authenticated user stores, from the running
+counters in app/usage.py (no scan of files or chunks).
+"""
+
+from fastapi import APIRouter, Depends
+from pydantic import BaseModel
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.auth.dependencies import get_current_user
+from app.config import settings
+from app.database import get_db
+from app.models.usage import StorageUsage
+from app.models.user import User
+
+router = APIRouter()
+
+
+# ── Schemas ────────────────────────────────────────────────────
+
+class DeviceUsage(BaseModel):
+    device_id: str
+    bytes: int
+    files: int
+
+class UsageResponse(BaseModel):
+    bytes: int  # encrypted chunk bytes, uploads in progress included
+    files: int  # completed files
+    quota_bytes: int | None  # None = unlimited
+    devices: list[DeviceUsage]
+
+
+# ── Endpoints ──────────────────────────────────────────────────
+
+@router.get("/usage", response_model=UsageResponse)
+async def get_usage(
+    user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """Storage used by the current user, in total and per device."""
+    result = await db.execute(
+        select(StorageUsage.device_id, StorageUsage.bytes, StorageUsage.files)
+        .where(StorageUsage.user_id == user.id)
+    )
+    devices = [
+        DeviceUsage(device_id=str(device_id), bytes=stored, files=files)
+        for device_id, stored, files in result.all()
+    ]
+    return UsageResponse(
+        bytes=sum(d.bytes for d in devices),
+        files=sum(d.files for d in devices),
+        quota_bytes=settings.USER_QUOTA_BYTES or None,
+        devices=devices,
+    )
@@ -0,0 +1,273 @@
+"""
+State shared by the worker processes on one host (WEB_CONCURRENCY > 1).
+
+uvicorn --workers runs independent processes, so anything kept in memory is
+per worker. Two things must not be: rate-limit counters (or each worker grants
+the full limit) and auth cache invalidations (or a deactivated user keeps
+working on every worker that cached them). Both live in one SQLite file at
+SHARED_STATE_PATH, on /dev/shm by default, so in practice shared memory:
+
+  counters       fixed-window rate-limit counters; the "sqlite://" storage of
+                 the `limits` package behind slowapi's Limiter
+  invalidations  users dropped from the auth cache; each worker polls for new
+                 rows every AUTH_CACHE_SYNC_SECONDS
+
+Nothing on the event loop waits for SQLite, which can block for up to its busy
+timeout while another worker holds the write lock. The limiter calls its
+storage synchronously, so SQLiteStorage answers from memory: the shared count
+as of the last sync plus this worker's hits since. A background thread pushes
+those hits and pulls everyone's totals every SHARED_STATE_SYNC_MS, and writes
+published invalidations on the same tick; the invalidation poll runs in a
+worker thread. Together, workers can overshoot a limit by the hits that land
+within one sync interval. With a single worker none of this is used: the
+limiter counts in memory.
+
+The file's directory also holds the primary lock: one worker per host claims
+it at startup and runs the jobs that must not run once per worker.
+"""
+
+import asyncio
+import fcntl
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from collections.abc import Callable
+
+from limits.storage import Storage
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS counters (key TEXT PRIMARY KEY, value INTEGER NOT NULL, expires REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS invalidations (seq INTEGER PRIMARY KEY AUTOINCREMENT, user_id TEXT NOT NULL, at REAL NOT NULL);
+"""
+
+# Expired counters are deleted every this many syncs
+_PRUNE_EVERY = 1000
+
+_local = threading.local()
+_primary_lock: int | None = None
+
+
+def connection() -> sqlite3.Connection:
+    """This thread's connection to the state file, opened (and the schema created) on first use."""
+    conn = getattr(_local, "connection", None)
+    if conn is None:
+        conn = sqlite3.connect(settings.SHARED_STATE_PATH, timeout=5, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=OFF")
+        conn.executescript(_SCHEMA)
+        _local.connection = conn
+    return conn
+
+
+def limiter_storage_uri() -> str:
+    """storage_uri for slowapi's Limiter: shared between workers only when there are several."""
+    return "sqlite://" if settings.WORKERS > 1 else "memory://"
+
+
+def claim_primary() -> bool:
+    """
+    Whether this process is the host's primary worker. The first caller wins and
+    holds the lock until it exits; with a single worker, that worker is primary.
+    """
+    global _primary_lock
+    if settings.WORKERS <= 1 or _primary_lock is not None:
+        return True
+    fd = os.open(settings.SHARED_STATE_PATH + ".primary", os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        os.close(fd)
+        return False
+    _primary_lock = fd
+    return True
+
+
+# ── Sync thread ────────────────────────────────────────────────
+
+_storages: list["SQLiteStorage"] = []
+_published: queue.SimpleQueue[tuple[str, float]] = queue.SimpleQueue()
+_thread: threading.Thread | None = None
+_thread_lock = threading.Lock()
+
+
+def _start_sync_thread() -> None:
+    global _thread
+    with _thread_lock:
+        if _thread is None:
+            _thread = threading.Thread(target=_sync_forever, name="shared-state-sync", daemon=True)
+            _thread.start()
+
+
+def _sync_forever() -> None:
+    syncs = 0
+    while True:
+        time.sleep(settings.SHARED_STATE_SYNC_MS / 1000)
+        syncs += 1
+        try:
+            conn = connection()
+            rows = []
+            while not _published.empty():
+                rows.append(_published.get_nowait())
+            if rows:
+                conn.executemany("INSERT INTO invalidations (user_id, at) VALUES (?, ?)", rows)
+            for storage in _storages:
+                storage.sync(conn)
+            if syncs % _PRUNE_EVERY == 0:
+                conn.execute("DELETE FROM counters WHERE expires <= ?", (time.time(),))
+        except Exception:
+            logger.exception("Syncing shared worker state failed")
+
+
+# ── Rate-limit counters ────────────────────────────────────────
+
+class SQLiteStorage(Storage):
+    """`limits` storage keeping fixed-window counters in the shared state file, synced in the background."""
+
+    STORAGE_SCHEME = ["sqlite"]
+
+    def __init__(self, uri: str | None = None, wrap_exceptions: bool = False, **options):
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+        self._lock = threading.Lock()
+        # key → (count, expires): the shared count as of the last sync plus local hits since
+        self._counts: dict[str, tuple[int, float]] = {}
+        # key → [hits, expiry, elastic_expiry] not yet pushed to the file
+        self._pending: dict[str, list] = {}
+        self._cleared: set[str] = set()
+        self._reset = False
+        _storages.append(self)
+        _start_sync_thread()
+
+    @property
+    def base_exceptions(self) -> type[Exception]:
+        return sqlite3.Error
+
+    def incr(self, key: str, expiry: int, elastic_expiry: bool = False, amount: int = 1) -> int:
+        now = time.time()
+        with self._lock:
+            value, expires = self._counts.get(key, (0, 0.0))
+            if expires <= now:
+                value, expires = 0, now + expiry
+            elif elastic_expiry:
+                expires = now + expiry
+            value += amount
+            self._counts[key] = (value, expires)
+            pending = self._pending.setdefault(key, [0, expiry, False])
+            pending[0] += amount
+            pending[2] = pending[2] or elastic_expiry
+            return value
+
+    def get(self, key: str) -> int:
+        with self._lock:
+            value, expires = self._counts.get(key, (0, 0.0))
+        return value if expires > time.time() else 0
+
+    def get_expiry(self, key: str) -> float:
+        now = time.time()
+        with self._lock:
+            _, expires = self._counts.get(key, (0, 0.0))
+        return expires if expires > now else now
+
+    def check(self) -> bool:
+        return _thread is not None and _thread.is_alive()
+
+    def reset(self) -> int:
+        with self._lock:
+            count = len(self._counts)
+            self._counts.clear()
+            self._pending.clear()
+            self._reset = True
+        return count
+
+    def clear(self, key: str) -> None:
+        with self._lock:
+            self._counts.pop(key, None)
+            self._pending.pop(key, None)
+            self._cleared.add(key)
+
+    def sync(self, conn: sqlite3.Connection) -> None:
+        """Push local hits and pull shared totals. Runs on the sync thread."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            cleared, self._cleared = self._cleared, set()
+            reset, self._reset = self._reset, False
+            watched = [key for key in self._counts if key not in pending]
+
+        if reset:
+            conn.execute("DELETE FROM counters")
+        for key in cleared:
+            conn.execute("DELETE FROM counters WHERE key = ?", (key,))
+
+        now = time.time()
+        totals = {}
+        try:
+            for key, (amount, expiry, elastic_expiry) in list(pending.items()):
+                totals[key] = conn.execute(
+                    """
+                    INSERT INTO counters (key, value, expires) VALUES (?1, ?2, ?3 + ?4)
+                    ON CONFLICT (key) DO UPDATE SET
+                        value = CASE WHEN expires <= ?3 THEN ?2 ELSE value + ?2 END,
+                        expires = CASE WHEN expires <= ?3 OR ?5 THEN ?3 + ?4 ELSE expires END
+                    RETURNING value, expires
+                    """,
+                    (key, amount, now, expiry, elastic_expiry),
+                ).fetchone()
+                del pending[key]
+            for key in watched:
+                row = conn.execute(
+                    "SELECT value, expires FROM counters WHERE key = ? AND expires > ?", (key, now)
+                ).fetchone()
+                if row:
+                    totals[key] = row
+        finally:
+            with self._lock:
+                # Hits that weren't pushed go out with the next sync
+                for key, (amount, expiry, elastic_expiry) in pending.items():
+                    merged = self._pending.setdefault(key, [0, expiry, False])
+                    merged[0] += amount
+                    merged[2] = merged[2] or elastic_expiry
+                for key, (value, expires) in totals.items():
+                    if key in self._counts:
+                        since = self._pending.get(key, (0,))[0]  # hits taken while this sync ran
+                        self._counts[key] = (value + since, expires)
+                for key in [key for key, (_, expires) in self._counts.items() if expires <= now]:
+                    if key not in self._pending:
+                        del self._counts[key]
+
+
+# ── Auth cache invalidations ───────────────────────────────────
+
+def publish_invalidation(user_id: uuid.UUID) -> None:
+    """Tell the other workers to drop [user_id] from their auth caches (written on the next sync)."""
+    _published.put((str(user_id), time.time()))
+    _start_sync_thread()
+
+
+def _read_invalidations(seen: int) -> list[tuple[int, str]]:
+    conn = connection()
+    rows = conn.execute("SELECT seq, user_id FROM invalidations WHERE seq > ? ORDER BY seq", (seen,)).fetchall()
+    # Older entries would have expired from every cache by now anyway
+    conn.execute("DELETE FROM invalidations WHERE at < ?", (time.time() - settings.AUTH_CACHE_TTL_SECONDS,))
+    return rows
+
+
+async def run_invalidation_sync(invalidate: Callable[[uuid.UUID], None]) -> None:
+    """Apply other workers' invalidations forever. Started from the app lifespan."""
+    (seen,) = await asyncio.to_thread(
+        lambda: connection().execute("SELECT COALESCE(MAX(seq), 0) FROM invalidations").fetchone()
+    )
+    while True:
+        await asyncio.sleep(settings.AUTH_CACHE_SYNC_SECONDS)
+        try:
+            for seq, user_id in await asyncio.to_thread(_read_invalidations, seen):
+                invalidate(uuid.UUID(user_id))
+                seen = seq
+        except sqlite3.Error:
+            logger.exception("Reading auth cache invalidations failed")
@@ -0,0 +1,76 @@
+"""
+Background assembly of completed uploads (S3_ASSEMBLE_FILES=true).
+
+After /upload/{id}/complete, a file's chunk objects are stitched into a single
+object with server-side multipart copy, so restores and lifecycle rules deal with
+one key per file instead of hundreds. Each Chunk row gets its byte offset in
+the assembled object (which then becomes its blob_path), and the chunk objects
+are deleted.
+
+Runs after the response has been sent; a file that can't be assembled (or whose
+assembly fails) simply stays as individual chunks.
+"""
+
+import logging
+import uuid
+
+from sqlalchemy import select
+
+from app.config import settings
+from app.database import async_session
+from app.models.chunk import Chunk
+from app.models.file import BackupFile
+from app.storage.base import get_storage
+
+logger = logging.getLogger(__name__)
+
+
+def assembly_enabled() -> bool:
+    # Content-addressed chunks are shared between files, so they can't be
+    # folded into (and deleted in favour of) a per-file object.
+    return (
+        settings.S3_ASSEMBLE_FILES
+        and settings.STORAGE_BACKEND == "s3"
+        and settings.CHUNK_LAYOUT == "upload"
+    )
+
+
+async def assemble_file(file_id: uuid.UUID) -> None:
+    """Merge a completed file's chunks into one object and drop the chunk objects."""
+    from app.storage.s3 import S3_MAX_PARTS, S3_MIN_PART_SIZE
+
+    storage = get_storage()
+    async with async_session() as db:
+        backup_file = await db.get(BackupFile, file_id)
+        if backup_file is None or backup_file.status != "complete" or backup_file.blob_path:
+            return
+
+        result = await db.execute(
+            select(Chunk).where(Chunk.file_id == file_id).order_by(Chunk.chunk_index)
+        )
+        chunks = result.scalars().all()
+        if len(chunks) < 2 or len(chunks) > S3_MAX_PARTS:
+            return
+        if any(chunk.size < S3_MIN_PART_SIZE for chunk in chunks[:-1]):
+            return  # not expressible as a multipart copy
+        if any(chunk.shared or chunk.storage_path for chunk in chunks):
+            return  # shared blobs, or legacy paths the offsets can't be derived from
+
+        user_id = str(backup_file.user_id)
+        srcs = [storage.blob_path(user_id, chunk) for chunk in chunks]
+        dst = storage.file_path(user_id, str(file_id))
+        try:
+            await storage.assemble(dst, srcs)
+        except Exception:
+            logger.exception("Assembling file %s failed; keeping its chunks", file_id)
+            return
+
+        offset = 0
+        for chunk in chunks:
+            chunk.blob_offset = offset
+            offset += chunk.size
+        backup_file.blob_path = dst
+        await db.commit()
+
+    # Only once the metadata points at the assembled object
+    await storage.delete_many(srcs)
@@ -1,18 +1,26 @@
 """
 Abstract storage interface for encrypted blob storage.
 
-Concrete implementations: LocalStorage (disk) and S3Storage (S3-compatible).
+Concrete implementations: LocalStorage (disk), PackStorage (disk, segment files)
+and S3Storage (S3-compatible).
 Selected at runtime via the STORAGE_BACKEND env var.
 """
 
 from abc import ABC, abstractmethod
+from collections.abc import AsyncIterable, AsyncIterator, Iterable
 
 from app.config import settings
 
+# Piece size for streamed reads — what a single read keeps in memory
+STREAM_PIECE_SIZE = 64 * 1024
+
 
 class StorageBackend(ABC):
     """Interface for blob storage backends."""
 
+    # True when writes are acknowledged before reaching long-term storage
+    write_back: bool = False
+
     def chunk_path(self, user_id: str, upload_id: str, chunk_index: int) -> str:
         """
         Generate a deterministic storage path for a chunk.
@@ -23,16 +31,86 @@ class StorageBackend(ABC):
         prefix = upload_id[:2]
         return f"{user_id}/{prefix}/{upload_id}/chunk_{chunk_index:05d}"
 
+    def content_path(self, user_id: str, chunk_hash: str) -> str:
+        """
+        Storage path for a content-addressed chunk (CHUNK_LAYOUT=content).
+
+        Layout: {user_id}/cas/{chunk_hash[0:2]}/{chunk_hash}
+        Scoped per user, so identical ciphertext is never shared across accounts.
+        """
+        return f"{user_id}/cas/{chunk_hash[:2]}/{chunk_hash}"
+
+    def file_path(self, user_id: str, upload_id: str) -> str:
+        """
+        Storage path for a file whose chunks were assembled into one blob.
+
+        Layout: {user_id}/{upload_id[0:2]}/{upload_id}/file
+        """
+        prefix = upload_id[:2]
+        return f"{user_id}/{prefix}/{upload_id}/file"
+
+    def blob_path(self, user_id: str, chunk) -> str:
+        """
+        Path of a Chunk row's bytes. [chunk] is a Chunk or a row of CHUNK_LOCATION.
+
+        The chunks table doesn't store paths it can derive: an assembled chunk
+        lives in file_path(), a shared one in content_path(), any other in
+        chunk_path(). An explicit storage_path (legacy rows) wins.
+        """
+        if chunk.storage_path:
+            return chunk.storage_path
+        if chunk.blob_offset is not None:
+            return self.file_path(user_id, str(chunk.file_id))
+        if chunk.shared:
+            return self.content_path(user_id, chunk.chunk_hash)
+        return self.chunk_path(user_id, str(chunk.file_id), chunk.chunk_index)
+
+    async def start(self) -> None:
+        """Open long-lived resources (clients, pools). Called from the app lifespan."""
+
+    async def close(self) -> None:
+        """Release whatever start() opened. Called from the app lifespan."""
+
     @abstractmethod
     async def write(self, path: str, data: bytes) -> None:
         """Write bytes to storage at the given path."""
         ...
 
+    @abstractmethod
+    async def write_stream(self, path: str, stream: AsyncIterable[bytes]) -> int:
+        """
+        Write a stream of byte pieces to storage at the given path.
+
+        Pieces are consumed as they arrive so memory stays bounded regardless
+        of blob size. Returns the number of bytes written. If the stream raises,
+        nothing is left behind at [path].
+        """
+        ...
+
     @abstractmethod
     async def read(self, path: str) -> bytes:
         """Read bytes from storage at the given path."""
         ...
 
+    async def read_stream(
+        self, path: str, offset: int = 0, length: int | None = None
+    ) -> AsyncIterator[bytes]:
+        """
+        Stream [length] bytes (or everything) of a blob from [offset], in pieces
+        of at most STREAM_PIECE_SIZE.
+
+        The default reads the whole blob first; backends override it to read
+        only the requested range, a piece at a time.
+        """
+        data = await self.read(path)
+        end = len(data) if length is None else min(len(data), offset + length)
+        for start in range(offset, end, STREAM_PIECE_SIZE):
+            yield data[start:min(end, start + STREAM_PIECE_SIZE)]
+
+    def flushed(self, paths: Iterable[str]) -> bool:
+        """Whether every blob at [paths] has reached long-term storage (see write_back)."""
+        return True
+
     @abstractmethod
     async def delete(self, path: str) -> None:
         """Delete a blob at the given path."""
@@ -43,6 +121,30 @@ class StorageBackend(ABC):
         """Check if a blob exists at the given path."""
         ...
 
+    async def move(self, src: str, dst: str) -> None:
+        """
+        Move a blob to a new path, replacing anything already there.
+
+        The default copies through memory; backends override it with a cheap
+        native rename/copy.
+        """
+        await self.write(dst, await self.read(src))
+        await self.delete(src)
+
+    async def delete_many(self, paths: list[str]) -> None:
+        """Delete several blobs. Backends override this with a bulk call."""
+        for path in paths:
+            await self.delete(path)
+
+    async def assemble(self, dst: str, srcs: list[str]) -> None:
+        """
+        Concatenate the blobs at [srcs], in order, into one blob at [dst].
+
+        Sources are left in place. Only backends that can do this without
+        streaming the bytes through the API process implement it.
+        """
+        raise NotImplementedError(f"{type(self).__name__} cannot assemble blobs")
+
 
 # ── Factory ────────────────────────────────────────────────────
 
@@ -55,11 +157,29 @@ def get_storage() -> StorageBackend:
     if _storage_instance is not None:
         return _storage_instance
 
-    if settings.STORAGE_BACKEND == "s3":
+    if settings.WORKERS > 1 and settings.STORAGE_BACKEND in ("pack", "tiered"):
+        # Their index / upload queue lives in process memory, so workers would
+        # overwrite each other's segments or miss each other's staged chunks
+        raise ValueError(f"STORAGE_BACKEND={settings.STORAGE_BACKEND} needs a single worker (WEB_CONCURRENCY=1)")
+
+    if settings.STORAGE_BACKEND == "tiered":
+        from app.storage.tiered import TieredStorage
+        _storage_instance = TieredStorage(settings.STAGING_PATH)
+    elif settings.STORAGE_BACKEND == "s3":
         from app.storage.s3 import S3Storage
         _storage_instance = S3Storage()
+    elif settings.STORAGE_BACKEND == "striped":
+        from app.storage.striped import StripedStorage
+        _storage_instance = StripedStorage(settings.STRIPE_ROOTS)
+    elif settings.STORAGE_BACKEND == "pack":
+        from app.storage.pack import PackStorage
+        _storage_instance = PackStorage(settings.STORAGE_PATH)
     else:
         from app.storage.local import LocalStorage
         _storage_instance = LocalStorage(settings.STORAGE_PATH)
 
+    if settings.METRICS_ENABLED:
+        from app.metrics import instrument_storage
+        instrument_storage(_storage_instance, settings.STORAGE_BACKEND)
+
     return _storage_instance
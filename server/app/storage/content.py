@@ -0,0 +1,116 @@
+"""
+Content-addressed chunk layout (CHUNK_LAYOUT=content).
+
+Chunk blobs are keyed by (user_id, chunk_hash) instead of (upload_id, chunk_index),
+so a retried or re-initialized upload of the same file stores each encrypted chunk
+once. The `chunk_blobs` table holds one reference per Chunk row pointing at a blob.
+
+Refcount changes are single-statement upserts/updates, so concurrent uploads of
+the same chunk serialize on the chunk_blobs row lock instead of racing.
+
+Releasing the last reference only takes the count to zero; nothing is deleted
+inside the caller's transaction, which may still roll back. The sweeper
+collects zero-count rows later, deleting blob and row under the row lock
+(collect_unreferenced). A zero-count row is never reused by acquire_existing;
+acquire() revives it by moving fresh bytes into place, as for a new blob.
+"""
+
+import uuid
+from collections.abc import Awaitable, Callable
+
+from sqlalchemy import delete, select, tuple_, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.chunk_blob import ChunkBlob
+from app.storage.base import StorageBackend
+
+
+async def acquire_existing(
+    db: AsyncSession, user_id: uuid.UUID, chunk_hash: str
+) -> tuple[str, int] | None:
+    """
+    Take a reference on an already-stored blob, if there is one.
+
+    Returns (storage_path, size), or None if this user has no such blob yet.
+    """
+    result = await db.execute(
+        update(ChunkBlob)
+        .where(ChunkBlob.user_id == user_id, ChunkBlob.chunk_hash == chunk_hash, ChunkBlob.refcount > 0)
+        .values(refcount=ChunkBlob.refcount + 1)
+        .returning(ChunkBlob.storage_path, ChunkBlob.size)
+    )
+    row = result.one_or_none()
+    return (row.storage_path, row.size) if row else None
+
+
+async def acquire(
+    db: AsyncSession,
+    storage: StorageBackend,
+    user_id: uuid.UUID,
+    chunk_hash: str,
+    size: int,
+    staged_path: str,
+) -> str:
+    """
+    Take a reference on the blob for [chunk_hash], using the bytes already
+    written at [staged_path].
+
+    The first reference (or the first since the count dropped to zero) moves the
+    staged blob into its content-addressed home; later ones just drop the staged copy. Returns the blob's storage path.
+    """
+    path = storage.content_path(str(user_id), chunk_hash)
+    result = await db.execute(
+        insert(ChunkBlob)
+        .values(user_id=user_id, chunk_hash=chunk_hash, size=size, storage_path=path, refcount=1)
+        .on_conflict_do_update(
+            index_elements=[ChunkBlob.user_id, ChunkBlob.chunk_hash],
+            set_={"refcount": ChunkBlob.refcount + 1},
+        )
+        .returning(ChunkBlob.refcount)
+    )
+    if result.scalar_one() == 1:
+        await storage.move(staged_path, path)
+    else:
+        await storage.delete(staged_path)
+    return path
+
+
+async def release(db: AsyncSession, user_id: uuid.UUID, chunk_hash: str) -> None:
+    """
+    Drop one reference to a shared blob. At zero the blob stays in place until
+    the sweeper collects it, so a rollback of the caller never leaves a
+    referenced row without its blob.
+    """
+    await db.execute(
+        update(ChunkBlob)
+        .where(ChunkBlob.user_id == user_id, ChunkBlob.chunk_hash == chunk_hash)
+        .values(refcount=ChunkBlob.refcount - 1)
+    )
+
+
+async def collect_unreferenced(
+    db: AsyncSession, delete_blobs: Callable[[list[str]], Awaitable[None]], limit: int
+) -> int:
+    """
+    Delete up to [limit] blobs whose last reference is gone, and their rows.
+
+    The rows stay locked from before the blobs are deleted until the caller
+    commits, so a concurrent acquire() waits and then starts a fresh row.
+    Returns how many were collected.
+    """
+    result = await db.execute(
+        select(ChunkBlob.user_id, ChunkBlob.chunk_hash, ChunkBlob.storage_path)
+        .where(ChunkBlob.refcount <= 0)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    rows = result.all()
+    if rows:
+        await delete_blobs([row.storage_path for row in rows])
+        await db.execute(
+            delete(ChunkBlob).where(
+                tuple_(ChunkBlob.user_id, ChunkBlob.chunk_hash).in_([(row.user_id, row.chunk_hash) for row in rows])
+            )
+        )
+    return len(rows)
@@ -3,41 +3,241 @@ Local disk storage adapter.
 
 Stores encrypted chunk blobs under STORAGE_PATH on the local filesystem.
 Best for self-hosted single-VPS deployments.
+
+Writes are atomic: bytes go to a uniquely named temp file next to the blob and
+are renamed into place once complete, so a crash never leaves a torn chunk
+behind a Chunk row. With LOCAL_FSYNC on (the default) the file and its directory
+are fsynced around the rename, group-committed: writes finishing within
+LOCAL_FSYNC_WINDOW_MS of each other are synced in one worker-thread pass, each
+directory once. Every filesystem call runs off the event loop.
 """
 
+import asyncio
+import contextlib
+import logging
 import os
+import time
+import uuid
+from collections.abc import AsyncIterable, AsyncIterator
 from pathlib import Path
 
 import aiofiles
 
-from app.storage.base import StorageBackend
+from app.config import settings
+from app.storage.base import STREAM_PIECE_SIZE, StorageBackend
+
+logger = logging.getLogger(__name__)
+
+# Unlinks issued at once by delete_many
+_UNLINK_PARALLELISM = 32
+
+# Suffix of in-progress writes; leftovers older than an hour are removed on start()
+TMP_SUFFIX = ".tmp"
+_STALE_TMP_SECONDS = 3600
+
+
+class _GroupSync:
+    """
+    Group commit of renames into place. Callers queue (src, dst) and wait; the
+    first of a batch starts a timer, and when it fires the whole batch is
+    fsynced, renamed and directory-synced in one thread job.
+    """
+
+    def __init__(self, window: float, durable: bool):
+        self.window = window
+        self.durable = durable
+        self._batch: list[tuple[Path, Path, bool, asyncio.Future]] = []
+        self._flusher: asyncio.Task | None = None
+
+    async def commit(self, src: Path, dst: Path, sync_data: bool = True) -> None:
+        """Rename [src] to [dst] durably; [sync_data] fsyncs src's bytes first."""
+        if not self.durable:
+            await asyncio.to_thread(os.replace, src, dst)
+            return
+        done = asyncio.get_running_loop().create_future()
+        self._batch.append((src, dst, sync_data, done))
+        if self._flusher is None:
+            self._flusher = asyncio.create_task(self._flush_later())
+        await done
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(self.window)
+        batch, self._batch = self._batch, []
+        self._flusher = None  # commits from here on start the next batch
+        try:
+            errors = await asyncio.to_thread(_sync_batch, [entry[:3] for entry in batch])
+        except BaseException as exc:
+            errors = [exc] * len(batch)
+        for (_, _, _, done), error in zip(batch, errors):
+            if done.done():
+                continue  # caller went away
+            if error is None:
+                done.set_result(None)
+            else:
+                done.set_exception(error)
 
 
 class LocalStorage(StorageBackend):
     def __init__(self, base_path: str):
         self.base = Path(base_path)
         self.base.mkdir(parents=True, exist_ok=True)
+        self._sync = _GroupSync(settings.LOCAL_FSYNC_WINDOW_MS / 1000, settings.LOCAL_FSYNC)
+        self._cleanup: asyncio.Task | None = None
 
     def _resolve(self, path: str) -> Path:
         return self.base / path
 
+    async def start(self) -> None:
+        if self._cleanup is None:
+            self._cleanup = asyncio.create_task(asyncio.to_thread(_remove_stale_tmp, self.base))
+
+    async def close(self) -> None:
+        if self._cleanup is not None:
+            self._cleanup.cancel()
+            self._cleanup = None
+
     async def write(self, path: str, data: bytes) -> None:
+        async def single() -> AsyncIterator[bytes]:
+            yield data
+
+        await self.write_stream(path, single())
+
+    async def write_stream(self, path: str, stream: AsyncIterable[bytes]) -> int:
         full_path = self._resolve(path)
-        full_path.parent.mkdir(parents=True, exist_ok=True)
-        async with aiofiles.open(full_path, "wb") as f:
-            await f.write(data)
+        tmp = full_path.with_name(f"{full_path.name}.{uuid.uuid4().hex[:8]}{TMP_SUFFIX}")
+        await asyncio.to_thread(full_path.parent.mkdir, parents=True, exist_ok=True)
+        written = 0
+        try:
+            async with aiofiles.open(tmp, "wb") as f:
+                async for piece in stream:
+                    await f.write(piece)
+                    written += len(piece)
+            await self._sync.commit(tmp, full_path)
+        except BaseException:
+            await asyncio.to_thread(_unlink, tmp)
+            raise
+        return written
 
     async def read(self, path: str) -> bytes:
-        full_path = self._resolve(path)
-        if not full_path.exists():
+        try:
+            async with aiofiles.open(self._resolve(path), "rb") as f:
+                return await f.read()
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Blob not found: {path}")
+
+    async def read_stream(
+        self, path: str, offset: int = 0, length: int | None = None
+    ) -> AsyncIterator[bytes]:
+        try:
+            async with aiofiles.open(self._resolve(path), "rb") as f:
+                await f.seek(offset)
+                remaining = length
+                while remaining is None or remaining > 0:
+                    piece = await f.read(STREAM_PIECE_SIZE if remaining is None else min(STREAM_PIECE_SIZE, remaining))
+                    if not piece:
+                        break
+                    if remaining is not None:
+                        remaining -= len(piece)
+                    yield piece
+        except FileNotFoundError:
             raise FileNotFoundError(f"Blob not found: {path}")
-        async with aiofiles.open(full_path, "rb") as f:
-            return await f.read()
 
     async def delete(self, path: str) -> None:
-        full_path = self._resolve(path)
-        if full_path.exists():
-            full_path.unlink()
+        await asyncio.to_thread(_unlink, self._resolve(path))
 
     async def exists(self, path: str) -> bool:
-        return self._resolve(path).exists()
+        return await asyncio.to_thread(self._resolve(path).exists)
+
+    async def move(self, src: str, dst: str) -> None:
+        dst_path = self._resolve(dst)
+        await asyncio.to_thread(dst_path.parent.mkdir, parents=True, exist_ok=True)
+        # src's bytes were synced when it was written; only the rename needs to be
+        await self._sync.commit(self._resolve(src), dst_path, sync_data=False)
+
+    async def publish(self, src: str, dst: str) -> bool:
+        """
+        Rename [src] to [dst] unless [dst] already exists, in which case [src] is
+        dropped instead. Returns whether it was renamed.
+        """
+        return await asyncio.to_thread(_publish, self._resolve(src), self._resolve(dst), self._sync.durable)
+
+    async def delete_many(self, paths: list[str]) -> None:
+        # Unlinks run in parallel on worker threads, a group at a time
+        for start in range(0, len(paths), _UNLINK_PARALLELISM):
+            group = [self._resolve(path) for path in paths[start:start + _UNLINK_PARALLELISM]]
+            await asyncio.gather(*(asyncio.to_thread(_unlink, p) for p in group))
+        # Drop the per-upload directories left empty
+        await asyncio.to_thread(_rmdirs, {self._resolve(path).parent for path in paths})
+
+
+def _unlink(path: Path) -> None:
+    path.unlink(missing_ok=True)
+
+
+def _publish(src: Path, dst: Path, durable: bool) -> bool:
+    # link() fails on an existing target where rename() would replace it
+    try:
+        os.link(src, dst)
+    except FileExistsError:
+        return False
+    finally:
+        src.unlink(missing_ok=True)
+    if durable:
+        _fsync_path(dst.parent)
+    return True
+
+
+def _rmdirs(dirs: set[Path]) -> None:
+    for path in dirs:
+        with contextlib.suppress(OSError):
+            path.rmdir()
+
+
+def _fsync_path(path: Path) -> None:
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _sync_batch(batch: list[tuple[Path, Path, bool]]) -> list[BaseException | None]:
+    """
+    fsync the sources, rename each into place, then fsync every touched
+    directory once. Returns one error (or None) per entry.
+    """
+    errors: list[BaseException | None] = [None] * len(batch)
+    dirs: dict[Path, list[int]] = {}
+    for i, (src, dst, sync_data) in enumerate(batch):
+        try:
+            if sync_data:
+                _fsync_path(src)
+            os.replace(src, dst)
+        except OSError as exc:
+            errors[i] = exc
+            continue
+        dirs.setdefault(dst.parent, []).append(i)
+    for directory, entries in dirs.items():
+        try:
+            _fsync_path(directory)
+        except OSError as exc:
+            for i in entries:
+                errors[i] = exc
+    return errors
+
+
+def _remove_stale_tmp(base: Path) -> None:
+    """Delete temp files of writes interrupted by a crash — old enough to be no one's."""
+    cutoff = time.time() - _STALE_TMP_SECONDS
+    removed = 0
+    for dirpath, _, filenames in os.walk(base):
+        for name in filenames:
+            if not name.endswith(TMP_SUFFIX):
+                continue
+            with contextlib.suppress(OSError):
+                full = Path(dirpath) / name
+                if full.stat().st_mtime < cutoff:
+                    full.unlink()
+                    removed += 1
+    if removed:
+        logger.info("Removed %d interrupted write(s) under %s", removed, base)
@@ -0,0 +1,555 @@
+"""
+Pack-file storage adapter (STORAGE_BACKEND=pack).
+
+LocalStorage creates one file (and often a directory) per chunk, which exhausts
+inodes on boxes holding millions of chunks. PackStorage instead appends blobs to
+large segment files under STORAGE_PATH/packs and finds them through a compact index:
+
+  seg-00000001.pack   records: 41-byte header (key digest, length, crc32, seq) + blob
+  index               sorted table of key digest → (segment, offset, length),
+                      memory-mapped for lookups, plus per-segment checkpoints
+
+Recent writes are kept in an in-memory table and periodically merged into a new
+index file (written aside, fsynced, then renamed into place). On startup, records
+past each segment's checkpoint are replayed in sequence order, so nothing written
+before a crash is lost and a torn tail record is truncated away.
+
+A write returns only once its record is durable: with LOCAL_FSYNC on, the
+segment is fsynced after the record is published, group-committed like
+LocalStorage's renames (writes finishing within LOCAL_FSYNC_WINDOW_MS share
+one fsync per segment). The index flush syncs again before it points at them.
+
+Every concurrent writer appends to its own segment, so a slow mobile upload
+never holds up anyone else. Segments whose blobs are mostly deleted or
+overwritten are compacted in the background: live blobs are copied forward and
+the old segment file is removed.
+"""
+
+import asyncio
+import hashlib
+import logging
+import mmap
+import os
+import struct
+import zlib
+from collections.abc import AsyncIterable, AsyncIterator, Iterator
+from pathlib import Path
+
+from app.config import settings
+from app.storage.base import STREAM_PIECE_SIZE, StorageBackend
+
+logger = logging.getLogger(__name__)
+
+# Segment record header: magic, kind, sequence number, key digest, blob length, crc32(blob)
+_RECORD = struct.Struct("<4sBQ16sQI")
+_RECORD_MAGIC = b"ZKPK"
+_PUT = 1
+_DELETE = 2
+
+# Index file: header, one checkpoint per segment, then entries sorted by key digest
+_INDEX_HEADER = struct.Struct("<4sIQIQ")  # magic, version, max seq, segment count, entry count
+_INDEX_SEGMENT = struct.Struct("<IQ")  # segment id, checkpoint offset
+_INDEX_ENTRY = struct.Struct("<16sIQI")  # key digest, segment id, blob offset, blob length
+_INDEX_MAGIC = b"ZKPI"
+_INDEX_VERSION = 1
+
+# (segment id, blob offset, blob length)
+Location = tuple[int, int, int]
+
+_MISSING = object()
+
+
+def _digest(path: str) -> bytes:
+    return hashlib.blake2b(path.encode(), digest_size=16).digest()
+
+
+class _Segment:
+    """One append-only pack file. At most one writer appends to it at a time."""
+
+    def __init__(self, seg_id: int, path: Path):
+        self.id = seg_id
+        self.path = path
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        self.size = os.fstat(self.fd).st_size  # end of the last committed record
+        self.live = 0  # bytes of blobs the index still points at
+        self.sealed = False  # full — no more appends, eligible for compaction
+        self.dirty = False  # appended to since the last fsync
+        self.retired = False  # compacted away; fd closes once readers drain
+        self.readers = 0
+
+    def records(self, start: int, end: int) -> Iterator[tuple[int, int, int, bytes, Location, int]]:
+        """Yield (record offset, kind, seq, key, location, crc) for records in [start, end)."""
+        with open(self.path, "rb", buffering=0) as f:
+            pos = start
+            while pos + _RECORD.size <= end:
+                f.seek(pos)
+                header = f.read(_RECORD.size)
+                magic, kind, seq, key, length, crc = _RECORD.unpack(header)
+                data_at = pos + _RECORD.size
+                if magic != _RECORD_MAGIC or kind not in (_PUT, _DELETE) or data_at + length > end:
+                    return
+                yield pos, kind, seq, key, (self.id, data_at, length), crc
+                pos = data_at + length
+
+
+class _GroupFsync:
+    """
+    Group commit of segment fsyncs. Writers queue their segment and wait; the
+    first of a batch starts a timer, and when it fires every segment in the
+    batch is fsynced once, in one thread job.
+    """
+
+    def __init__(self, window: float, durable: bool):
+        self.window = window
+        self.durable = durable
+        self._batch: list[tuple[_Segment, asyncio.Future]] = []
+        self._flusher: asyncio.Task | None = None
+
+    async def sync(self, seg: _Segment) -> None:
+        """Wait until everything written to [seg] so far is on disk."""
+        if not self.durable:
+            return
+        done = asyncio.get_running_loop().create_future()
+        self._batch.append((seg, done))
+        if self._flusher is None:
+            self._flusher = asyncio.create_task(self._flush_later())
+        await done
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(self.window)
+        batch, self._batch = self._batch, []
+        self._flusher = None  # syncs from here on start the next batch
+        fds = list({seg.id: seg.fd for seg, _ in batch}.values())
+        error = None
+        try:
+            await asyncio.to_thread(_fsync_all, fds)
+        except BaseException as exc:
+            error = exc
+        for _, done in batch:
+            if done.done():
+                continue  # caller went away
+            if error is None:
+                done.set_result(None)
+            else:
+                done.set_exception(error)
+
+
+def _fsync_all(fds: list[int]) -> None:
+    for fd in fds:
+        os.fsync(fd)
+
+
+class _Index:
+    """Immutable sorted on-disk index, memory-mapped for lookups."""
+
+    def __init__(self, path: Path):
+        self.max_seq = 0
+        self.checkpoints: dict[int, int] = {}
+        self.count = 0
+        self._mm: mmap.mmap | None = None
+        self._base = 0
+        if not path.exists() or path.stat().st_size == 0:
+            return
+
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.max_seq, segments, self.count = _INDEX_HEADER.unpack_from(self._mm, 0)
+        if magic != _INDEX_MAGIC or version != _INDEX_VERSION:
+            raise RuntimeError(f"Unrecognized pack index: {path}")
+        pos = _INDEX_HEADER.size
+        for _ in range(segments):
+            seg_id, checkpoint = _INDEX_SEGMENT.unpack_from(self._mm, pos)
+            self.checkpoints[seg_id] = checkpoint
+            pos += _INDEX_SEGMENT.size
+        self._base = pos
+
+    def get(self, key: bytes) -> Location | None:
+        mm, base, size = self._mm, self._base, _INDEX_ENTRY.size
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            at = base + mid * size
+            probe = mm[at:at + 16]
+            if probe < key:
+                lo = mid + 1
+            elif probe > key:
+                hi = mid
+            else:
+                _, seg_id, offset, length = _INDEX_ENTRY.unpack_from(mm, at)
+                return seg_id, offset, length
+        return None
+
+    def entries(self) -> Iterator[tuple[bytes, Location]]:
+        if self._mm is None:
+            return
+        end = self._base + self.count * _INDEX_ENTRY.size
+        with memoryview(self._mm) as view:
+            for key, seg_id, offset, length in _INDEX_ENTRY.iter_unpack(view[self._base:end]):
+                yield key, (seg_id, offset, length)
+
+    def close(self) -> None:
+        if self._mm is not None:
+            self._mm.close()
+
+
+class PackStorage(StorageBackend):
+    def __init__(
+        self,
+        base_path: str,
+        segment_size: int = settings.PACK_SEGMENT_SIZE,
+        flush_entries: int = settings.PACK_INDEX_FLUSH_ENTRIES,
+    ):
+        self.root = Path(base_path) / "packs"
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.segment_size = segment_size
+        self.flush_entries = flush_entries
+
+        self._index = _Index(self.root / "index")
+        self._memtable: dict[bytes, Location | None] = {}  # None = deleted
+        self._segments: dict[int, _Segment] = {}
+        self._idle: list[_Segment] = []  # open for appends, no current writer
+        self._seq = self._index.max_seq
+        self._flush_lock = asyncio.Lock()
+        self._flush_task: asyncio.Task | None = None
+        self._sync = _GroupFsync(settings.LOCAL_FSYNC_WINDOW_MS / 1000, settings.LOCAL_FSYNC)
+        self._maintenance_task: asyncio.Task | None = None
+        self._recover()
+
+    # ── Startup ────────────────────────────────────────────────
+
+    def _recover(self) -> None:
+        replay = []
+        for path in sorted(self.root.glob("seg-*.pack")):
+            seg = _Segment(int(path.stem[4:]), path)
+            self._segments[seg.id] = seg
+            end = seg.size
+            pos = self._index.checkpoints.get(seg.id, 0)
+            # Records older than the index's max seq are already in it (or were
+            # superseded), so replay only what came after — in global seq order.
+            for _, kind, seq, key, loc, crc in seg.records(pos, end):
+                if kind == _PUT and zlib.crc32(os.pread(seg.fd, loc[2], loc[1])) != crc:
+                    break
+                if seq > self._index.max_seq:
+                    replay.append((seq, key, loc if kind == _PUT else None))
+                pos = loc[1] + loc[2]
+            if pos < end:
+                logger.warning("Truncating torn tail of %s at %d", path.name, pos)
+                os.ftruncate(seg.fd, pos)
+            seg.size = min(pos, end)
+
+        for seq, key, loc in sorted(replay, key=lambda r: r[0]):
+            self._memtable[key] = loc
+            self._seq = max(self._seq, seq)
+
+        for key, loc in self._index.entries():
+            if key not in self._memtable:
+                self._add_live(loc)
+        for loc in self._memtable.values():
+            self._add_live(loc)
+
+        # Never reuse the id of a segment the index still has a checkpoint for
+        self._next_id = max([*self._segments, *self._index.checkpoints, 0]) + 1
+        for seg in self._segments.values():
+            if seg.size >= self.segment_size:
+                seg.sealed = True
+            else:
+                self._idle.append(seg)
+
+    async def start(self) -> None:
+        if self._maintenance_task is None:
+            self._maintenance_task = asyncio.create_task(self._maintenance())
+
+    async def close(self) -> None:
+        if self._maintenance_task is not None:
+            self._maintenance_task.cancel()
+            self._maintenance_task = None
+        await self.flush()
+        for seg in self._segments.values():
+            os.close(seg.fd)
+        self._segments.clear()
+        self._idle.clear()
+        self._index.close()
+
+    # ── Index ──────────────────────────────────────────────────
+
+    def _lookup(self, key: bytes) -> Location | None:
+        loc = self._memtable.get(key, _MISSING)
+        if loc is _MISSING:
+            return self._index.get(key)
+        return loc
+
+    def _add_live(self, loc: Location | None, sign: int = 1) -> None:
+        if loc is not None and loc[0] in self._segments:
+            self._segments[loc[0]].live += sign * loc[2]
+
+    async def flush(self) -> None:
+        """Merge the in-memory table into a new on-disk index."""
+        async with self._flush_lock:
+            if not self._memtable:
+                return
+            snapshot = dict(self._memtable)
+            max_seq = self._seq
+            checkpoints = {seg.id: seg.size for seg in self._segments.values()}
+            dirty = [seg for seg in self._segments.values() if seg.dirty]
+            for seg in dirty:
+                seg.dirty = False
+
+            # The index must never point past data that is durably on disk
+            await asyncio.to_thread(
+                self._write_index, snapshot, max_seq, checkpoints, [seg.fd for seg in dirty]
+            )
+
+            old, self._index = self._index, _Index(self.root / "index")
+            old.close()
+            for key, loc in snapshot.items():
+                if self._memtable.get(key, _MISSING) == loc:
+                    del self._memtable[key]
+
+    def _write_index(
+        self,
+        snapshot: dict[bytes, Location | None],
+        max_seq: int,
+        checkpoints: dict[int, int],
+        fds: list[int],
+    ) -> None:
+        for fd in fds:
+            os.fsync(fd)
+
+        updates = sorted(snapshot.items())
+        tmp = self.root / "index.tmp"
+        count = 0
+        with open(tmp, "wb") as f:
+            f.write(bytes(_INDEX_HEADER.size + _INDEX_SEGMENT.size * len(checkpoints)))
+
+            # Streaming merge of two sorted runs; tombstones are dropped
+            i = 0
+            for key, loc in self._index.entries():
+                while i < len(updates) and updates[i][0] < key:
+                    if updates[i][1] is not None:
+                        f.write(_INDEX_ENTRY.pack(updates[i][0], *updates[i][1]))
+                        count += 1
+                    i += 1
+                if i < len(updates) and updates[i][0] == key:
+                    loc = updates[i][1]
+                    i += 1
+                if loc is not None:
+                    f.write(_INDEX_ENTRY.pack(key, *loc))
+                    count += 1
+            for key, loc in updates[i:]:
+                if loc is not None:
+                    f.write(_INDEX_ENTRY.pack(key, *loc))
+                    count += 1
+
+            f.seek(0)
+            f.write(_INDEX_HEADER.pack(_INDEX_MAGIC, _INDEX_VERSION, max_seq, len(checkpoints), count))
+            for seg_id, checkpoint in sorted(checkpoints.items()):
+                f.write(_INDEX_SEGMENT.pack(seg_id, checkpoint))
+            f.flush()
+            os.fsync(f.fileno())
+
+        os.replace(tmp, self.root / "index")
+        dir_fd = os.open(self.root, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+    # ── Segments ───────────────────────────────────────────────
+
+    def _acquire_segment(self) -> _Segment:
+        if self._idle:
+            return self._idle.pop()
+        seg_id = self._next_id
+        self._next_id += 1
+        seg = _Segment(seg_id, self.root / f"seg-{seg_id:08d}.pack")
+        self._segments[seg_id] = seg
+        return seg
+
+    def _release_segment(self, seg: _Segment) -> None:
+        if seg.size >= self.segment_size:
+            seg.sealed = True
+        else:
+            self._idle.append(seg)
+
+    def _trim_idle(self) -> None:
+        """Seal the smallest appendable segments left over from a concurrency burst."""
+        surplus = len(self._idle) - settings.PACK_MAX_OPEN_SEGMENTS
+        if surplus <= 0:
+            return
+        self._idle.sort(key=lambda seg: seg.size)
+        for seg in self._idle[:surplus]:
+            seg.sealed = True
+        del self._idle[:surplus]
+
+    def _commit(
+        self, seg: _Segment, start: int, kind: int, key: bytes, length: int, crc: int,
+        expect: object = _MISSING,
+    ) -> bool:
+        """
+        Publish a record whose blob bytes are already at [start + header] in [seg].
+
+        Runs without awaiting, so the header write, sequence number and index
+        update are atomic with respect to every other coroutine. With [expect],
+        the record is only published if the key still maps to that location.
+        """
+        old = self._lookup(key)
+        if expect is not _MISSING and old != expect:
+            os.ftruncate(seg.fd, start)
+            return False
+
+        self._seq += 1
+        os.pwrite(seg.fd, _RECORD.pack(_RECORD_MAGIC, kind, self._seq, key, length, crc), start)
+        seg.size = start + _RECORD.size + length
+        seg.dirty = True
+
+        loc = (seg.id, start + _RECORD.size, length) if kind == _PUT else None
+        self._add_live(old, -1)
+        self._add_live(loc)
+        self._memtable[key] = loc
+
+        if len(self._memtable) >= self.flush_entries and (
+            self._flush_task is None or self._flush_task.done()
+        ):
+            self._flush_task = asyncio.create_task(self.flush())
+        return True
+
+    async def _append(
+        self, key: bytes, stream: AsyncIterable[bytes], expect: object = _MISSING
+    ) -> int:
+        seg = self._acquire_segment()
+        start = seg.size
+        pos = start + _RECORD.size
+        crc = 0
+        try:
+            async for piece in stream:
+                await asyncio.to_thread(os.pwrite, seg.fd, piece, pos)
+                crc = zlib.crc32(piece, crc)
+                pos += len(piece)
+            length = pos - start - _RECORD.size
+            committed = self._commit(seg, start, _PUT, key, length, crc, expect)
+        except BaseException:
+            os.ftruncate(seg.fd, start)
+            raise
+        finally:
+            self._release_segment(seg)
+
+        if committed:
+            # Held like a reader, so compaction can't close the fd under the fsync
+            seg.readers += 1
+            try:
+                await self._sync.sync(seg)
+            finally:
+                seg.readers -= 1
+                if seg.retired and seg.readers == 0:
+                    os.close(seg.fd)
+        return length
+
+    def _retire(self, seg: _Segment) -> None:
+        seg.retired = True
+        del self._segments[seg.id]
+        seg.path.unlink(missing_ok=True)
+        if seg.readers == 0:
+            os.close(seg.fd)
+
+    # ── Compaction ─────────────────────────────────────────────
+
+    async def compact(self) -> int:
+        """
+        Rewrite sealed segments that are mostly dead, or small leftovers sealed
+        after a concurrency burst. Returns the number of segments removed.
+        """
+        self._trim_idle()
+        victims = [
+            seg for seg in self._segments.values()
+            if seg.sealed and (
+                seg.live < seg.size * settings.PACK_COMPACT_THRESHOLD
+                or seg.size < self.segment_size // 8
+            )
+        ]
+        for seg in victims:
+            puts = await asyncio.to_thread(self._puts, seg)
+            for key, loc in puts:
+                if self._lookup(key) != loc:
+                    continue
+                data = await asyncio.to_thread(os.pread, seg.fd, loc[2], loc[1])
+                await self._append(key, _single(data), expect=loc)
+
+        if victims:
+            # The new index must stop referencing the victims before they go
+            await self.flush()
+            for seg in victims:
+                self._retire(seg)
+        return len(victims)
+
+    @staticmethod
+    def _puts(seg: _Segment) -> list[tuple[bytes, Location]]:
+        return [(key, loc) for _, kind, _, key, loc, _ in seg.records(0, seg.size) if kind == _PUT]
+
+    async def _maintenance(self) -> None:
+        while True:
+            await asyncio.sleep(settings.PACK_MAINTENANCE_INTERVAL)
+            try:
+                await self.flush()
+                removed = await self.compact()
+                if removed:
+                    logger.info("Compacted %d pack segment(s)", removed)
+            except Exception:
+                logger.exception("Pack maintenance failed")
+
+    # ── StorageBackend ─────────────────────────────────────────
+
+    async def write(self, path: str, data: bytes) -> None:
+        await self._append(_digest(path), _single(data))
+
+    async def write_stream(self, path: str, stream: AsyncIterable[bytes]) -> int:
+        return await self._append(_digest(path), stream)
+
+    async def read(self, path: str) -> bytes:
+        loc = self._lookup(_digest(path))
+        if loc is None:
+            raise FileNotFoundError(f"Blob not found: {path}")
+        seg = self._segments[loc[0]]
+        seg.readers += 1
+        try:
+            return await asyncio.to_thread(os.pread, seg.fd, loc[2], loc[1])
+        finally:
+            seg.readers -= 1
+            if seg.retired and seg.readers == 0:
+                os.close(seg.fd)
+
+    async def read_stream(
+        self, path: str, offset: int = 0, length: int | None = None
+    ) -> AsyncIterator[bytes]:
+        loc = self._lookup(_digest(path))
+        if loc is None:
+            raise FileNotFoundError(f"Blob not found: {path}")
+        seg = self._segments[loc[0]]
+        pos = loc[1] + min(offset, loc[2])
+        end = loc[1] + (loc[2] if length is None else min(loc[2], offset + length))
+        seg.readers += 1
+        try:
+            while pos < end:
+                piece = await asyncio.to_thread(os.pread, seg.fd, min(STREAM_PIECE_SIZE, end - pos), pos)
+                pos += len(piece)
+                yield piece
+        finally:
+            seg.readers -= 1
+            if seg.retired and seg.readers == 0:
+                os.close(seg.fd)
+
+    async def delete(self, path: str) -> None:
+        key = _digest(path)
+        if self._lookup(key) is None:
+            return
+        seg = self._acquire_segment()
+        try:
+            self._commit(seg, seg.size, _DELETE, key, 0, 0)
+        finally:
+            self._release_segment(seg)
+
+    async def exists(self, path: str) -> bool:
+        return self._lookup(_digest(path)) is not None
+
+
+async def _single(data: bytes) -> AsyncIterable[bytes]:
+    yield data
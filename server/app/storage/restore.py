@@ -0,0 +1,71 @@
+"""
+Streaming reads of a whole file's chunks, for restore/download.
+
+A file is a sequence of byte ranges ("pieces") in chunk_index order — one per
+chunk blob, or several ranges of one assembled object. stream_pieces() yields
+them in order while the next RESTORE_READ_AHEAD pieces are already being fetched
+into small bounded queues, so object-store latency overlaps with sending and
+memory stays at a few buffered pieces rather than whole chunks.
+"""
+
+import asyncio
+from collections import deque
+from collections.abc import AsyncIterator
+from dataclasses import dataclass
+
+from app.config import settings
+from app.storage.base import StorageBackend
+
+_DONE = object()
+
+
+@dataclass(frozen=True)
+class Piece:
+    """[length] bytes at [offset] inside the blob at [path]."""
+
+    path: str
+    offset: int
+    length: int
+
+
+async def _pump(storage: StorageBackend, piece: Piece, queue: asyncio.Queue) -> None:
+    try:
+        async for data in storage.read_stream(piece.path, piece.offset, piece.length):
+            await queue.put(data)
+        await queue.put(_DONE)
+    except Exception as exc:
+        await queue.put(exc)
+
+
+async def stream_pieces(
+    storage: StorageBackend,
+    pieces: list[Piece],
+    read_ahead: int = settings.RESTORE_READ_AHEAD,
+    buffer_pieces: int = settings.RESTORE_BUFFER_PIECES,
+) -> AsyncIterator[bytes]:
+    """Yield the bytes of [pieces] in order, prefetching the next [read_ahead] pieces."""
+    window: deque[tuple[asyncio.Task, asyncio.Queue]] = deque()
+    upcoming = iter(pieces)
+
+    def launch() -> None:
+        piece = next(upcoming, None)
+        if piece is not None:
+            queue: asyncio.Queue = asyncio.Queue(maxsize=buffer_pieces)
+            window.append((asyncio.create_task(_pump(storage, piece, queue)), queue))
+
+    try:
+        for _ in range(read_ahead + 1):
+            launch()
+        while window:
+            _, queue = window[0]
+            while (item := await queue.get()) is not _DONE:
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+            window.popleft()
+            launch()
+    finally:
+        # Client went away (or a read failed): stop the prefetchers
+        for task, _ in window:
+            task.cancel()
+
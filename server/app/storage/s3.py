@@ -5,10 +5,33 @@ Works with MinIO, Scaleway, Wasabi, Infomaniak, OVH S3, AWS S3, etc.
 Configure via S3_ENDPOINT, S3_ACCESS_KEY, S3_SECRET_KEY, S3_BUCKET env vars.
 """
 
+import asyncio
+import contextlib
+from collections.abc import AsyncIterable, AsyncIterator
+
 import aioboto3
+import aiofiles.tempfile
+from aiobotocore.config import AioConfig
+from boto3.s3.transfer import TransferConfig
+from botocore.exceptions import ClientError
 
 from app.config import settings
-from app.storage.base import StorageBackend
+from app.storage.base import STREAM_PIECE_SIZE, StorageBackend
+
+
+# S3 rejects multipart parts smaller than 5 MB (except the last one)
+S3_MIN_PART_SIZE = 5 * 1024 * 1024
+S3_MAX_PARTS = 10_000
+S3_MAX_DELETE_BATCH = 1000
+
+# The smallest read buffer upload_fileobj can use while still streaming from the spool file
+_STREAM_PART_SIZE = S3_MIN_PART_SIZE
+
+# ClientError codes meaning the object doesn't exist
+_MISSING = {"NoSuchKey", "404", "NotFound"}
+
+# Part copies issued at once while assembling a single file
+_ASSEMBLE_PARALLELISM = 8
 
 
 class S3Storage(StorageBackend):
@@ -20,20 +43,118 @@ class S3Storage(StorageBackend):
             "aws_access_key_id": settings.S3_ACCESS_KEY,
             "aws_secret_access_key": settings.S3_SECRET_KEY,
             "region_name": settings.S3_REGION,
+            "config": AioConfig(max_pool_connections=settings.S3_MAX_POOL_CONNECTIONS),
         }
+        # One long-lived client (and its HTTP connection pool) for the whole process
+        self._s3 = None
+        self._stack: contextlib.AsyncExitStack | None = None
+        self._start_lock = asyncio.Lock()
+        self._inflight = (
+            asyncio.Semaphore(settings.S3_MAX_CONCURRENCY)
+            if settings.S3_MAX_CONCURRENCY > 0
+            else contextlib.nullcontext()
+        )
 
-    def _client(self):
-        return self.session.client("s3", **self._client_kwargs)
+    async def start(self) -> None:
+        async with self._start_lock:
+            if self._s3 is not None:
+                return
+            stack = contextlib.AsyncExitStack()
+            self._s3 = await stack.enter_async_context(
+                self.session.client("s3", **self._client_kwargs)
+            )
+            self._stack = stack
+
+    async def close(self) -> None:
+        async with self._start_lock:
+            if self._stack is not None:
+                await self._stack.aclose()
+            self._s3 = None
+            self._stack = None
+
+    @contextlib.asynccontextmanager
+    async def _client(self) -> AsyncIterator:
+        """Borrow the shared client, holding one of the S3_MAX_CONCURRENCY slots."""
+        if self._s3 is None:
+            await self.start()  # outside the app lifespan (scripts, Alembic, ...)
+        async with self._inflight:
+            yield self._s3
 
     async def write(self, path: str, data: bytes) -> None:
         async with self._client() as s3:
             await s3.put_object(Bucket=self.bucket, Key=path, Body=data)
 
+    async def write_stream(self, path: str, stream: AsyncIterable[bytes]) -> int:
+        # Spool to a temp file on disk (not memory) so the length is known, then
+        # send it in one PutObject. Only bodies above MAX_CHUNK_SIZE, which chunk
+        # PUTs never produce, go out as a multipart upload in bounded parts.
+        written = 0
+        async with aiofiles.tempfile.TemporaryFile("w+b") as spool:
+            async for piece in stream:
+                await spool.write(piece)
+                written += len(piece)
+            await spool.seek(0)
+            async with self._client() as s3:
+                if written <= settings.MAX_CHUNK_SIZE:
+                    # The HTTP client reads a plain file object in a thread
+                    await s3.put_object(
+                        Bucket=self.bucket, Key=path, Body=spool.raw, ContentLength=written
+                    )
+                else:
+                    await s3.upload_fileobj(
+                        spool,
+                        self.bucket,
+                        path,
+                        Config=TransferConfig(
+                            multipart_threshold=_STREAM_PART_SIZE,
+                            multipart_chunksize=_STREAM_PART_SIZE,
+                        ),
+                    )
+        return written
+
+    async def write_file(self, path: str, local_path: str) -> None:
+        """Upload a local file as-is (multipart above 5 MB), without spooling a copy."""
+        async with self._client() as s3:
+            await s3.upload_file(
+                local_path,
+                self.bucket,
+                path,
+                Config=TransferConfig(
+                    multipart_threshold=_STREAM_PART_SIZE,
+                    multipart_chunksize=_STREAM_PART_SIZE,
+                ),
+            )
+
     async def read(self, path: str) -> bytes:
         async with self._client() as s3:
-            response = await s3.get_object(Bucket=self.bucket, Key=path)
+            response = await self._get_object(s3, path)
             return await response["Body"].read()
 
+    async def _get_object(self, s3, path: str, **extra) -> dict:
+        # A missing key is FileNotFoundError like on every backend; other errors pass through
+        try:
+            return await s3.get_object(Bucket=self.bucket, Key=path, **extra)
+        except ClientError as exc:
+            if exc.response.get("Error", {}).get("Code") in _MISSING:
+                raise FileNotFoundError(f"Blob not found: {path}") from None
+            raise
+
+    async def read_stream(
+        self, path: str, offset: int = 0, length: int | None = None
+    ) -> AsyncIterator[bytes]:
+        if length == 0:
+            return
+        extra = {}
+        if offset or length is not None:
+            last = "" if length is None else offset + length - 1
+            extra["Range"] = f"bytes={offset}-{last}"
+        async with self._client() as s3:
+            response = await self._get_object(s3, path, **extra)
+            body = response["Body"]
+            async with body:  # releases the connection even if the reader stops early
+                async for piece in body.iter_chunks(STREAM_PIECE_SIZE):
+                    yield piece
+
     async def delete(self, path: str) -> None:
         async with self._client() as s3:
             await s3.delete_object(Bucket=self.bucket, Key=path)
@@ -43,5 +164,59 @@ class S3Storage(StorageBackend):
             try:
                 await s3.head_object(Bucket=self.bucket, Key=path)
                 return True
-            except Exception:
-                return False
+            except ClientError as exc:
+                if exc.response.get("Error", {}).get("Code") in _MISSING:
+                    return False
+                raise
+
+    async def move(self, src: str, dst: str) -> None:
+        # Server-side copy — the bytes never pass through this process
+        async with self._client() as s3:
+            await s3.copy_object(
+                Bucket=self.bucket, Key=dst, CopySource={"Bucket": self.bucket, "Key": src}
+            )
+            await s3.delete_object(Bucket=self.bucket, Key=src)
+
+    async def delete_many(self, paths: list[str]) -> None:
+        for start in range(0, len(paths), S3_MAX_DELETE_BATCH):
+            batch = paths[start:start + S3_MAX_DELETE_BATCH]
+            async with self._client() as s3:
+                await s3.delete_objects(
+                    Bucket=self.bucket,
+                    Delete={"Objects": [{"Key": key} for key in batch], "Quiet": True},
+                )
+
+    async def assemble(self, dst: str, srcs: list[str]) -> None:
+        # Multipart upload whose parts are UploadPartCopy calls: S3 stitches the
+        # objects together internally. Every part but the last must be >= 5 MB.
+        async with self._client() as s3:
+            mpu = await s3.create_multipart_upload(Bucket=self.bucket, Key=dst)
+        upload_id = mpu["UploadId"]
+        gate = asyncio.Semaphore(_ASSEMBLE_PARALLELISM)
+
+        async def copy_part(part_number: int, src: str) -> dict:
+            async with gate, self._client() as s3:
+                result = await s3.upload_part_copy(
+                    Bucket=self.bucket,
+                    Key=dst,
+                    UploadId=upload_id,
+                    PartNumber=part_number,
+                    CopySource={"Bucket": self.bucket, "Key": src},
+                )
+            return {"PartNumber": part_number, "ETag": result["CopyPartResult"]["ETag"]}
+
+        try:
+            parts = await asyncio.gather(
+                *(copy_part(n, src) for n, src in enumerate(srcs, start=1))
+            )
+            async with self._client() as s3:
+                await s3.complete_multipart_upload(
+                    Bucket=self.bucket,
+                    Key=dst,
+                    UploadId=upload_id,
+                    MultipartUpload={"Parts": list(parts)},
+                )
+        except BaseException:
+            async with self._client() as s3:
+                await s3.abort_multipart_upload(Bucket=self.bucket, Key=dst, UploadId=upload_id)
+            raise
@@ -0,0 +1,194 @@
+"""
+Background integrity scrubber for stored chunks.
+
+Nothing else re-reads a blob after it was written, so bit rot on disk or in S3
+would only show up on restore. The scrubber walks the chunks of completed
+files in key order, (file_id, chunk_index), streams each blob back through the
+StorageBackend and compares its SHA-256 with chunks.chunk_hash:
+
+  1. read the next SCRUB_BATCH_CHUNKS chunk locations after the checkpoint
+  2. re-hash their blobs, paced to SCRUB_MB_PER_SECOND and SCRUB_IOPS blob
+     reads per second (no database connection is held meanwhile)
+  3. in one transaction, record failures in scrub_failures, clear the ones
+     that check out again, and move the checkpoint past the batch
+
+The checkpoint survives restarts, so a pass over millions of chunks can take
+weeks at a budget uploads never notice. After a full pass the scrubber idles
+for SCRUB_PASS_PAUSE_HOURS, then starts over. A failure is only recorded if the
+chunk's row still points where it was read from; a blob moved in between (by
+assembly, say) is checked again on the next pass. Read errors other than a
+missing blob are treated as transient: logged, and retried next pass.
+
+Runs in one worker process per host (the primary, see app/shared_state.py).
+"""
+
+import asyncio
+import hashlib
+import logging
+import time
+
+from sqlalchemy import delete, func, select, tuple_, update
+from sqlalchemy.dialects.postgresql import insert
+
+from app.config import settings
+from app.cpu import cpu
+from app.database import async_session
+from app.metrics import scrub_bytes, scrub_chunks, scrub_failures
+from app.models.chunk import CHUNK_LOCATION, Chunk
+from app.models.file import BackupFile
+from app.models.scrub import ScrubCheckpoint, ScrubFailure
+from app.storage.base import StorageBackend, get_storage
+
+logger = logging.getLogger(__name__)
+
+_LOCATION_KEYS = [column.key for column in CHUNK_LOCATION]
+
+# _check() result for a read that failed for some other reason than a missing blob
+_RETRY = "retry"
+
+
+class _Budget:
+    """Paces reads to a byte rate and an operation rate, whichever is slower."""
+
+    def __init__(self, bytes_per_second: float, ops_per_second: float):
+        self.bytes_per_second = bytes_per_second
+        self.ops_per_second = ops_per_second
+        self._bytes_at = self._ops_at = time.monotonic()
+
+    async def take(self, nbytes: int = 0, ops: int = 0) -> None:
+        now = time.monotonic()
+        self._bytes_at = max(self._bytes_at, now) + nbytes / self.bytes_per_second
+        self._ops_at = max(self._ops_at, now) + ops / self.ops_per_second
+        delay = max(self._bytes_at, self._ops_at) - now
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+def _update(sha, pieces: list[bytes]) -> None:
+    for piece in pieces:
+        sha.update(piece)
+
+
+async def _check(storage: StorageBackend, budget: _Budget, path: str, row) -> str | None:
+    """None if the chunk's blob is intact, else the failure reason (or _RETRY)."""
+    await budget.take(ops=1)
+    sha = hashlib.sha256()
+    size = 0
+    batch: list[bytes] = []
+    batch_size = 0
+    try:
+        async for piece in storage.read_stream(path, row.blob_offset or 0, row.size):
+            await budget.take(nbytes=len(piece))
+            size += len(piece)
+            batch.append(piece)
+            batch_size += len(piece)
+            if batch_size >= settings.CPU_HASH_BATCH_BYTES:
+                await cpu.run("scrub", _update, sha, batch)
+                batch, batch_size = [], 0
+        if batch:
+            await cpu.run("scrub", _update, sha, batch)
+    except Exception:
+        try:
+            missing = not await storage.exists(path)
+        except Exception:
+            missing = False  # the backend can't tell right now either
+        if missing:
+            return "missing"
+        logger.warning("Scrub read of %s failed; retrying next pass", path, exc_info=True)
+        return _RETRY
+    finally:
+        scrub_bytes.inc(size)
+    if size != row.size or sha.hexdigest() != row.chunk_hash:
+        return "mismatch"
+    return None
+
+
+async def _checkpoint(db) -> ScrubCheckpoint:
+    await db.execute(insert(ScrubCheckpoint).values(id=1).on_conflict_do_nothing())
+    return (await db.execute(select(ScrubCheckpoint).where(ScrubCheckpoint.id == 1).with_for_update())).scalar_one()
+
+
+async def scrub_batch(storage: StorageBackend, budget: _Budget) -> bool:
+    """Check the next batch of chunks. Returns False once the pass is complete."""
+    async with async_session() as db:
+        checkpoint = await _checkpoint(db)
+        query = (
+            select(BackupFile.user_id, *CHUNK_LOCATION, Chunk.size)
+            .join(BackupFile, BackupFile.id == Chunk.file_id)
+            .where(BackupFile.status == "complete")
+        )
+        if checkpoint.file_id is not None:
+            query = query.where(
+                tuple_(Chunk.file_id, Chunk.chunk_index) > tuple_(checkpoint.file_id, checkpoint.chunk_index)
+            )
+        rows = (
+            await db.execute(
+                query.order_by(Chunk.file_id, Chunk.chunk_index).limit(settings.SCRUB_BATCH_CHUNKS)
+            )
+        ).all()
+        if not rows:
+            await db.execute(
+                update(ScrubCheckpoint)
+                .where(ScrubCheckpoint.id == 1)
+                .values(file_id=None, chunk_index=None, passes=ScrubCheckpoint.passes + 1)
+            )
+            await db.commit()
+            return False
+        await db.commit()
+
+    failed = {}
+    healthy = []
+    for row in rows:
+        reason = await _check(storage, budget, storage.blob_path(str(row.user_id), row), row)
+        scrub_chunks.inc()
+        if reason is None:
+            healthy.append((row.file_id, row.chunk_index))
+        elif reason != _RETRY:
+            failed[row.file_id, row.chunk_index] = (reason, row)
+
+    async with async_session() as db:
+        await _checkpoint(db)
+        if failed:
+            # Only blame blobs the rows still point at
+            result = await db.execute(
+                select(*CHUNK_LOCATION).where(tuple_(Chunk.file_id, Chunk.chunk_index).in_(list(failed)))
+            )
+            current = {(row.file_id, row.chunk_index): tuple(row) for row in result.all()}
+            for key, (reason, row) in failed.items():
+                if current.get(key) != tuple(getattr(row, name) for name in _LOCATION_KEYS):
+                    continue
+                logger.warning("Scrub: chunk %d of file %s is %s", key[1], key[0], reason)
+                scrub_failures.labels(reason=reason).inc()
+                await db.execute(
+                    insert(ScrubFailure)
+                    .values(file_id=key[0], chunk_index=key[1], reason=reason)
+                    .on_conflict_do_update(
+                        index_elements=[ScrubFailure.file_id, ScrubFailure.chunk_index],
+                        set_={"reason": reason},
+                    )
+                )
+        if healthy:
+            await db.execute(
+                delete(ScrubFailure).where(tuple_(ScrubFailure.file_id, ScrubFailure.chunk_index).in_(healthy))
+            )
+        progress = {"file_id": rows[-1].file_id, "chunk_index": rows[-1].chunk_index}
+        if checkpoint.file_id is None:
+            progress["pass_started_at"] = func.now()  # first batch of a pass
+        await db.execute(update(ScrubCheckpoint).where(ScrubCheckpoint.id == 1).values(**progress))
+        await db.commit()
+    return True
+
+
+async def run_scrubber() -> None:
+    """Scrub forever, within the I/O budget. Started from the app lifespan."""
+    storage = get_storage()
+    budget = _Budget(settings.SCRUB_MB_PER_SECOND * 1024 * 1024, settings.SCRUB_IOPS)
+    while True:
+        try:
+            if await scrub_batch(storage, budget):
+                continue
+            logger.info("Scrub pass complete")
+            await asyncio.sleep(settings.SCRUB_PASS_PAUSE_HOURS * 3600)
+        except Exception:
+            logger.exception("Scrub batch failed")
+            await asyncio.sleep(60)
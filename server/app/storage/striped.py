@@ -0,0 +1,296 @@
+"""
+Striped storage across several local roots (STORAGE_BACKEND=striped).
+
+One LocalStorage is limited by one disk's IOPS and bandwidth. StripedStorage
+spreads blobs over STRIPE_ROOTS (one directory per disk) with a consistent-hash
+ring keyed on the blob path, so concurrent uploads and restores hit all disks
+at once, and adding a root only moves the ~1/n of blobs that now hash to it.
+
+With STRIPE_PARITY=true each blob is instead split into STRIPE_DATA_SHARDS
+shards plus one XOR parity shard (Reed-Solomon with a single parity symbol),
+stored on distinct roots: any one root can be lost and every blob still reads.
+
+Whenever the set of roots changes, a background rebalancer walks the roots and
+moves misplaced blobs (or shards) to where the ring now puts them, at most
+STRIPE_REBALANCE_RATE files per second. Until it finishes, lookups fall back to
+searching the other roots.
+"""
+
+import asyncio
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import re
+import struct
+import uuid
+from bisect import bisect_right
+from collections.abc import AsyncIterable, AsyncIterator
+
+from app.config import settings
+from app.cpu import cpu
+from app.storage.base import StorageBackend
+from app.storage.local import TMP_SUFFIX, LocalStorage
+
+logger = logging.getLogger(__name__)
+
+# Shard header: blob length, data shard count, shard index (== data shard count for parity)
+_SHARD = struct.Struct("<QBB")
+_SHARD_NAME = re.compile(r"^(.*)\.s(\d+)$")
+_ROOTS_FILE = ".stripe-roots"
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+
+
+class StripedStorage(StorageBackend):
+    def __init__(
+        self,
+        roots: list[str],
+        parity: bool = settings.STRIPE_PARITY,
+        data_shards: int = settings.STRIPE_DATA_SHARDS,
+    ):
+        if not roots:
+            raise ValueError("STRIPE_ROOTS must list at least one directory")
+        if parity and data_shards + 1 > len(roots):
+            raise ValueError(f"STRIPE_PARITY needs at least {data_shards + 1} roots")
+        self.names = [os.path.abspath(root) for root in roots]
+        self.roots = [LocalStorage(name) for name in self.names]
+        self.parity = parity
+        self.data_shards = data_shards
+
+        # Each root owns STRIPE_VNODES points on the ring, placed by its path
+        ring = sorted(
+            (_hash(f"{name}#{i}"), index)
+            for index, name in enumerate(self.names)
+            for i in range(settings.STRIPE_VNODES)
+        )
+        self._points = [point for point, _ in ring]
+        self._owners = [index for _, index in ring]
+        self._rebalance_task: asyncio.Task | None = None
+
+    # ── Placement ──────────────────────────────────────────────
+
+    def _placement(self, path: str, count: int) -> list[int]:
+        """The first [count] distinct roots clockwise from the path's ring position."""
+        found: list[int] = []
+        at = bisect_right(self._points, _hash(path))
+        for step in range(len(self._owners)):
+            index = self._owners[(at + step) % len(self._owners)]
+            if index not in found:
+                found.append(index)
+                if len(found) == count:
+                    break
+        return found
+
+    def _home(self, path: str) -> int:
+        """Root a stored file (a whole blob, or one shard) belongs on."""
+        match = _SHARD_NAME.match(path) if self.parity else None
+        if match:
+            return self._placement(match.group(1), self.data_shards + 1)[int(match.group(2))]
+        return self._placement(path, 1)[0]
+
+    async def _locate(self, path: str) -> LocalStorage | None:
+        """Root holding [path]: its home, else wherever it was before a rebalance."""
+        home = self.roots[self._home(path)]
+        if await home.exists(path):
+            return home
+        for root in self.roots:
+            if root is not home and await root.exists(path):
+                return root
+        return None
+
+    # ── Erasure coding ─────────────────────────────────────────
+
+    def _encode(self, data: bytes) -> list[bytes]:
+        k = self.data_shards
+        size = -(-len(data) // k) or 1
+        shards = [data[i * size:(i + 1) * size].ljust(size, b"\0") for i in range(k)]
+        parity = 0
+        for shard in shards:
+            parity ^= int.from_bytes(shard, "big")
+        shards.append(parity.to_bytes(size, "big"))
+        return [_SHARD.pack(len(data), k, i) + shard for i, shard in enumerate(shards)]
+
+    async def _read_shard(self, path: str, index: int) -> bytes | None:
+        try:
+            root = await self._locate(f"{path}.s{index}")
+            return await root.read(f"{path}.s{index}") if root else None
+        except OSError:
+            return None  # a failed or missing disk counts as a lost shard
+
+    async def _decode(self, path: str) -> bytes:
+        k = self.data_shards
+        shards = await asyncio.gather(*(self._read_shard(path, i) for i in range(k)))
+        lost = [i for i, shard in enumerate(shards) if shard is None]
+        if len(lost) > 1:
+            raise FileNotFoundError(f"Blob not found: {path}")
+        if lost:
+            parity = await self._read_shard(path, k)
+            if parity is None:
+                raise FileNotFoundError(f"Blob not found: {path}")
+            shards[lost[0]] = await cpu.run("parity", _rebuild, parity, shards)
+        length = _SHARD.unpack_from(next(s for s in shards if s is not None))[0]
+        return b"".join(shard[_SHARD.size:] for shard in shards)[:length]
+
+    # ── Rebalancing ────────────────────────────────────────────
+
+    async def start(self) -> None:
+        for root in self.roots:
+            await root.start()
+        if self._rebalance_task is None:
+            self._rebalance_task = asyncio.create_task(self._rebalance_if_changed())
+
+    async def close(self) -> None:
+        if self._rebalance_task is not None:
+            self._rebalance_task.cancel()
+            self._rebalance_task = None
+        for root in self.roots:
+            await root.close()
+
+    async def _rebalance_if_changed(self) -> None:
+        marker = os.path.join(self.names[0], _ROOTS_FILE)
+        layout = {"roots": sorted(self.names), "parity": self.parity, "data_shards": self.data_shards}
+        try:
+            with open(marker) as f:
+                if json.load(f) == layout:
+                    return
+        except (OSError, ValueError):
+            pass
+        # With several worker processes, one rebalances and the rest skip it
+        with open(marker + ".lock", "w") as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return
+            try:
+                moved = await self.rebalance()
+            except Exception:
+                logger.exception("Stripe rebalance failed")
+                return
+            logger.info("Stripe rebalance done, moved %d file(s)", moved)
+            with open(marker, "w") as f:
+                json.dump(layout, f)
+
+    async def rebalance(self) -> int:
+        """
+        Move every file that isn't on its home root there, unless its home
+        already has a newer copy. Returns how many moved.
+        """
+        moved = 0
+        delay = 1 / settings.STRIPE_REBALANCE_RATE
+        for index, root in enumerate(self.roots):
+            for path in await asyncio.to_thread(_walk, self.names[index]):
+                home = self._home(path)
+                if home == index:
+                    continue
+                # Copied under a temp name, then published only if nothing is there
+                # yet: writes go to the home root, so a copy that got there first
+                # (a re-sent chunk) is newer than this one, even mid-copy
+                staged = f"{path}.{uuid.uuid4().hex[:8]}{TMP_SUFFIX}"
+                try:
+                    await self.roots[home].write_stream(staged, root.read_stream(path))
+                except FileNotFoundError:
+                    continue  # deleted since the walk
+                if await self.roots[home].publish(staged, path) and not await root.exists(path):
+                    # Deleted (by the sweeper) while being copied: don't bring it back
+                    await self.roots[home].delete(path)
+                    continue
+                await root.delete(path)
+                moved += 1
+                await asyncio.sleep(delay)
+        return moved
+
+    # ── StorageBackend ─────────────────────────────────────────
+
+    async def write(self, path: str, data: bytes) -> None:
+        if not self.parity:
+            await self.roots[self._home(path)].write(path, data)
+            return
+        placement = self._placement(path, self.data_shards + 1)
+        shards = await cpu.run("parity", self._encode, data)
+        await asyncio.gather(*(
+            self.roots[root].write(f"{path}.s{i}", shard)
+            for i, (root, shard) in enumerate(zip(placement, shards))
+        ))
+
+    async def write_stream(self, path: str, stream: AsyncIterable[bytes]) -> int:
+        if not self.parity:
+            return await self.roots[self._home(path)].write_stream(path, stream)
+        # Sharding needs the whole blob; chunks are bounded by MAX_CHUNK_SIZE
+        data = b"".join([piece async for piece in stream])
+        await self.write(path, data)
+        return len(data)
+
+    async def read(self, path: str) -> bytes:
+        if self.parity:
+            return await self._decode(path)
+        root = await self._locate(path)
+        if root is None:
+            raise FileNotFoundError(f"Blob not found: {path}")
+        return await root.read(path)
+
+    async def read_stream(
+        self, path: str, offset: int = 0, length: int | None = None
+    ) -> AsyncIterator[bytes]:
+        if self.parity:
+            async for piece in super().read_stream(path, offset, length):
+                yield piece
+            return
+        root = await self._locate(path)
+        if root is None:
+            raise FileNotFoundError(f"Blob not found: {path}")
+        async for piece in root.read_stream(path, offset, length):
+            yield piece
+
+    async def delete(self, path: str) -> None:
+        await self.delete_many([path])
+
+    async def delete_many(self, paths: list[str]) -> None:
+        # Every root, so copies not yet rebalanced go too; missing files are skipped
+        if self.parity:
+            paths = [f"{path}.s{i}" for path in paths for i in range(self.data_shards + 1)]
+        await asyncio.gather(*(root.delete_many(paths) for root in self.roots))
+
+    async def exists(self, path: str) -> bool:
+        if self.parity:
+            found = await asyncio.gather(
+                *(self._locate(f"{path}.s{i}") for i in range(self.data_shards + 1))
+            )
+            return sum(root is not None for root in found) >= self.data_shards
+        return await self._locate(path) is not None
+
+    async def move(self, src: str, dst: str) -> None:
+        if self.parity:
+            await super().move(src, dst)
+            return
+        root = await self._locate(src)
+        if root is None:
+            raise FileNotFoundError(f"Blob not found: {src}")
+        home = self.roots[self._home(dst)]
+        if home is root:
+            await root.move(src, dst)
+        else:
+            await home.write_stream(dst, root.read_stream(src))
+            await root.delete(src)
+
+
+def _rebuild(parity: bytes, shards: list[bytes | None]) -> bytes:
+    """The one missing data shard: [parity] XOR every shard that survived."""
+    acc = int.from_bytes(parity[_SHARD.size:], "big")
+    for shard in shards:
+        if shard is not None:
+            acc ^= int.from_bytes(shard[_SHARD.size:], "big")
+    return parity[:_SHARD.size] + acc.to_bytes(len(parity) - _SHARD.size, "big")
+
+
+def _walk(base: str) -> list[str]:
+    paths = []
+    for dirpath, _, filenames in os.walk(base):
+        for name in filenames:
+            # .stripe-roots and its .lock are bookkeeping, not blobs
+            if not name.startswith(_ROOTS_FILE) and not name.endswith(TMP_SUFFIX):
+                paths.append(os.path.relpath(os.path.join(dirpath, name), base))
+    return paths
@@ -0,0 +1,179 @@
+"""
+Background garbage collector for abandoned uploads.
+
+A BackupFile stuck in status "uploading" (the phone was wiped, the app was
+uninstalled, ...) would otherwise keep its chunk blobs and rows forever. Every
+GC_INTERVAL_SECONDS the sweeper looks for uploads created more than
+GC_STALE_AFTER_HOURS ago that haven't received a chunk in that time either, and
+removes them in batches of GC_BATCH_FILES:
+
+  1. mark the batch "expired" (commit) — late chunk PUTs now get 409
+  2. lock a batch of expired rows (FOR UPDATE SKIP LOCKED) and, in that same
+     transaction, delete the blobs of up to about one second's worth of their
+     chunks in bulk (S3 DeleteObjects / parallel unlinks), paced to at most
+     GC_DELETE_RATE blobs per second
+  3. still in it, drop those chunks' content-addressed blob references and
+     rows, take their bytes off the owners' storage usage counters, delete
+     the files left without chunks, and commit; repeat until none are left
+
+The row locks are held from before the first blob is deleted until its chunk
+row is gone, so two sweepers (other hosts, or a run overlapping a slow one)
+never purge the same file: each skips the rows the other holds. Capping each
+transaction at a second or so of deletes keeps those locks, and the pool
+connection, short however many chunks a file has. A crash mid-purge rolls back
+to chunk rows whose blobs may be gone already, which the next sweep deletes
+again (a no-op) and finishes off. Each sweep then deletes content-addressed
+blobs (CHUNK_LAYOUT=content) whose last reference was released,
+GC_BATCH_FILES per transaction.
+
+Runs in one worker process per host (the primary, see app/shared_state.py).
+"""
+
+import asyncio
+import logging
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import delete, exists, select, tuple_, update
+
+from app import usage
+from app.config import settings
+from app.database import async_session
+from app.models.chunk import CHUNK_LOCATION, Chunk
+from app.models.file import BackupFile
+from app.storage import content
+from app.storage.base import get_storage
+
+logger = logging.getLogger(__name__)
+
+# Blobs per storage.delete_many call (S3 DeleteObjects takes at most 1000)
+_UNPACED_BATCH = 1000
+
+
+async def _expire_batch(cutoff: datetime) -> int:
+    """Mark the next batch of stale uploads as expired. Returns how many."""
+    async with async_session() as db:
+        recent_chunk = exists().where(Chunk.file_id == BackupFile.id, Chunk.uploaded_at >= cutoff)
+        result = await db.execute(
+            select(BackupFile.id)
+            .where(BackupFile.status == "uploading", BackupFile.created_at < cutoff, ~recent_chunk)
+            .order_by(BackupFile.created_at)
+            .limit(settings.GC_BATCH_FILES)
+            .with_for_update(skip_locked=True)
+        )
+        file_ids = list(result.scalars())
+        if file_ids:
+            await db.execute(
+                update(BackupFile).where(BackupFile.id.in_(file_ids)).values(status="expired")
+            )
+            await db.commit()
+        return len(file_ids)
+
+
+def _purge_blobs() -> int:
+    """Blobs deleted per purge transaction: one second's worth, or a bulk call's worth unpaced."""
+    return settings.GC_DELETE_RATE if settings.GC_DELETE_RATE > 0 else _UNPACED_BATCH
+
+
+async def _delete_paced(paths: list[str]) -> None:
+    storage = get_storage()
+    step = min(_UNPACED_BATCH, _purge_blobs())
+    for start in range(0, len(paths), step):
+        batch = paths[start:start + step]
+        await storage.delete_many(batch)
+        if settings.GC_DELETE_RATE > 0:
+            await asyncio.sleep(len(batch) / settings.GC_DELETE_RATE)
+
+
+async def _purge_batch() -> int | None:
+    """
+    Delete the next round of expired uploads' blobs, then their metadata.
+    Returns how many files it removed entirely, or None once none are left.
+    """
+    storage = get_storage()
+    async with async_session() as db:
+        result = await db.execute(
+            select(BackupFile.id)
+            .where(BackupFile.status == "expired")
+            .order_by(BackupFile.created_at)
+            .limit(settings.GC_BATCH_FILES)
+            .with_for_update(skip_locked=True)
+        )
+        file_ids = list(result.scalars())
+        if not file_ids:
+            return None
+
+        result = await db.execute(
+            select(BackupFile.user_id, BackupFile.device_id, Chunk.size, *CHUNK_LOCATION)
+            .join(Chunk, Chunk.file_id == BackupFile.id)
+            .where(BackupFile.id.in_(file_ids))
+            .order_by(Chunk.file_id, Chunk.chunk_index)
+            .limit(_purge_blobs())
+        )
+        rows = result.all()
+        plain = []
+        purged: dict[tuple[uuid.UUID, uuid.UUID], int] = defaultdict(int)
+        for row in rows:
+            path = storage.blob_path(str(row.user_id), row)
+            if not row.shared and path not in plain[-1:]:  # an assembled file's chunks share one object
+                plain.append(path)
+            purged[row.user_id, row.device_id] += row.size
+
+        await _delete_paced(plain)
+
+        # Shared content-addressed blobs: only drop these chunks' references. After
+        # the deletes, so the chunk_blobs row locks aren't held through the pacing.
+        for row in rows:
+            if row.shared:
+                await content.release(db, row.user_id, row.chunk_hash)
+        for (user_id, device_id), size in sorted(purged.items()):
+            await usage.add(db, user_id, device_id, bytes_delta=-size)
+
+        if rows:
+            await db.execute(
+                delete(Chunk).where(
+                    tuple_(Chunk.file_id, Chunk.chunk_index).in_([(row.file_id, row.chunk_index) for row in rows])
+                )
+            )
+        result = await db.execute(
+            delete(BackupFile)
+            .where(BackupFile.id.in_(file_ids), ~exists().where(Chunk.file_id == BackupFile.id))
+            .returning(BackupFile.id)
+        )
+        removed = len(result.all())
+        await db.commit()
+        return removed
+
+
+async def _collect_blobs() -> int:
+    """Delete one batch of unreferenced content-addressed blobs."""
+    async with async_session() as db:
+        collected = await content.collect_unreferenced(db, _delete_paced, settings.GC_BATCH_FILES)
+        await db.commit()
+        return collected
+
+
+async def sweep_once() -> int:
+    """Remove all currently stale uploads. Returns how many files were removed."""
+    cutoff = datetime.now(timezone.utc) - timedelta(hours=settings.GC_STALE_AFTER_HOURS)
+    while await _expire_batch(cutoff):
+        pass
+    removed = 0
+    while (purged := await _purge_batch()) is not None:
+        removed += purged
+    while await _collect_blobs():
+        pass
+    return removed
+
+
+async def run_sweeper() -> None:
+    """Sweep forever, every GC_INTERVAL_SECONDS. Started from the app lifespan."""
+    while True:
+        await asyncio.sleep(settings.GC_INTERVAL_SECONDS)
+        try:
+            removed = await sweep_once()
+            if removed:
+                logger.info("Removed %d abandoned upload(s)", removed)
+        except Exception:
+            logger.exception("Abandoned-upload sweep failed")
@@ -0,0 +1,335 @@
+"""
+S3 storage with a local write-back staging tier (STORAGE_BACKEND=tiered).
+
+With plain S3 every chunk PUT waits on a put_object round trip before the phone
+gets its answer. Here chunks are written (and fsynced) to local disk and
+acknowledged straight away; background workers then push them to S3:
+
+  STAGING_PATH/pending/<path>~<tag>   written, not yet in S3 — the durable upload queue
+  STAGING_PATH/cache/<path>           already in S3; kept as an LRU read cache
+
+Each write gets its own <tag>, so a rewrite of the same path never touches the
+file an uploader is busy with. Pending files are re-queued on startup, so a
+restart loses nothing, and failed uploads are retried with exponential backoff.
+Reads are served from either directory when possible; misses are fetched from
+S3 into the cache, which is trimmed to STAGING_CACHE_BYTES (least recently used
+first).
+"""
+
+import asyncio
+import logging
+import os
+import uuid
+from collections import OrderedDict
+from collections.abc import AsyncIterable, AsyncIterator, Iterable
+from pathlib import Path
+
+import aiofiles
+
+from app.config import settings
+from app.storage.base import STREAM_PIECE_SIZE, StorageBackend
+from app.storage.s3 import S3Storage
+
+logger = logging.getLogger(__name__)
+
+_RETRY_MAX_DELAY = 300  # seconds
+_TMP = ".tmp"
+
+
+class TieredStorage(StorageBackend):
+    write_back = True
+
+    def __init__(self, staging_path: str, cache_bytes: int = settings.STAGING_CACHE_BYTES):
+        self.remote = S3Storage()
+        self.pending_root = Path(staging_path) / "pending"
+        self.cache_root = Path(staging_path) / "cache"
+        self.pending_root.mkdir(parents=True, exist_ok=True)
+        self.cache_root.mkdir(parents=True, exist_ok=True)
+        self.cache_bytes = cache_bytes
+
+        self._pending: dict[str, str] = {}  # path → tag of its latest staged write
+        self._inflight: set[str] = set()
+        self._cache: OrderedDict[str, int] = OrderedDict()  # path → size, oldest first
+        self._cache_size = 0
+        self._queue: asyncio.Queue[tuple[str, int]] = asyncio.Queue()
+        self._workers: list[asyncio.Task] = []
+
+    def _staged(self, path: str, tag: str) -> Path:
+        return self.pending_root / f"{path}~{tag}"
+
+    # ── Lifecycle ──────────────────────────────────────────────
+
+    async def start(self) -> None:
+        await self.remote.start()
+        if self._workers:
+            return
+        pending, cached = await asyncio.to_thread(self._scan)
+        for path, tag in pending.items():
+            self._pending[path] = tag
+            self._queue.put_nowait((path, 0))
+        for path, size in cached:
+            self._cache[path] = size
+            self._cache_size += size
+        if pending:
+            logger.info("Re-queued %d staged chunk(s) for upload", len(pending))
+        self._workers = [
+            asyncio.create_task(self._uploader()) for _ in range(settings.STAGING_UPLOAD_CONCURRENCY)
+        ]
+
+    async def close(self) -> None:
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        await self.remote.close()
+
+    def _scan(self) -> tuple[dict[str, str], list[tuple[str, int]]]:
+        latest: dict[str, tuple[int, str]] = {}
+        for full in _files(self.pending_root):
+            path, _, tag = full.relative_to(self.pending_root).as_posix().rpartition("~")
+            found = (full.stat().st_mtime_ns, tag)
+            if path in latest:
+                # Crashed before the superseded write was cleaned up: keep the newest
+                found, stale = max(found, latest[path]), min(found, latest[path])
+                self._staged(path, stale[1]).unlink(missing_ok=True)
+            latest[path] = found
+
+        cached = []
+        for full in _files(self.cache_root):
+            st = full.stat()
+            cached.append((st.st_atime_ns, full.relative_to(self.cache_root).as_posix(), st.st_size))
+        cached.sort()
+        return {path: tag for path, (_, tag) in latest.items()}, [(path, size) for _, path, size in cached]
+
+    # ── Upload queue ───────────────────────────────────────────
+
+    async def _uploader(self) -> None:
+        while True:
+            path, attempt = await self._queue.get()
+            tag = self._pending.get(path)
+            if tag is None or path in self._inflight:
+                # Deleted or moved away, or already uploading (that worker
+                # re-queues the path itself if it was rewritten meanwhile)
+                continue
+            self._inflight.add(path)
+            try:
+                await self.remote.write_file(path, str(self._staged(path, tag)))
+            except FileNotFoundError:
+                if self._pending.get(path) == tag:
+                    logger.error("Staged file for %s vanished before upload", path)
+                    del self._pending[path]
+                    continue
+                # otherwise superseded or deleted before we opened it; handled below
+            except Exception:
+                delay = min(2 ** attempt, _RETRY_MAX_DELAY)
+                logger.warning("Upload of %s to S3 failed, retrying in %ds", path, delay, exc_info=True)
+                asyncio.get_running_loop().call_later(delay, self._queue.put_nowait, (path, attempt + 1))
+                continue
+            finally:
+                self._inflight.discard(path)
+
+            current = self._pending.get(path)
+            try:
+                if current is None:
+                    # Deleted (or moved) while in flight — don't leave the copy behind
+                    await self.remote.delete(path)
+                elif current == tag:
+                    # Promote the staged file to the read cache. Nothing else ever
+                    # touches this tagged file, so a plain rename can't race a rewrite.
+                    del self._pending[path]
+                    size = await asyncio.to_thread(self._promote, path, tag)
+                    await self._cache_add(path, size)
+                else:
+                    self._queue.put_nowait((path, 0))  # rewritten while in flight
+            except Exception:
+                logger.exception("Post-upload bookkeeping for %s failed", path)
+
+    def _promote(self, path: str, tag: str) -> int:
+        dst = self.cache_root / path
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(self._staged(path, tag), dst)
+        return dst.stat().st_size
+
+    async def _enqueue(self, path: str, tag: str) -> None:
+        # Bookkeeping first, then the files it made stale are removed off the loop
+        old = self._pending.get(path)
+        self._pending[path] = tag
+        self._queue.put_nowait((path, 0))
+        await _remove([self._staged(path, old) if old is not None else None, self._uncache(path)])
+
+    # ── Read cache ─────────────────────────────────────────────
+
+    async def _cache_add(self, path: str, size: int) -> None:
+        self._cache_size += size - self._cache.pop(path, 0)
+        self._cache[path] = size
+        evicted = []
+        while self._cache_size > self.cache_bytes and self._cache:
+            old, old_size = self._cache.popitem(last=False)
+            self._cache_size -= old_size
+            evicted.append(self.cache_root / old)
+        await _remove(evicted)
+
+    def _uncache(self, path: str) -> Path | None:
+        """Forget [path]'s cached copy; returns its file for the caller to remove."""
+        size = self._cache.pop(path, None)
+        if size is None:
+            return None
+        self._cache_size -= size
+        return self.cache_root / path
+
+    def _local_path(self, path: str) -> Path | None:
+        tag = self._pending.get(path)
+        if tag is not None:
+            return self._staged(path, tag)
+        if path in self._cache:
+            self._cache.move_to_end(path)
+            return self.cache_root / path
+        return None
+
+    async def _local(self, path: str) -> Path:
+        """Local copy of a blob, fetching it from S3 into the cache on a miss."""
+        full = self._local_path(path)
+        if full is not None:
+            return full
+        # Streamed to disk piece by piece; a restore of large chunks never holds one in memory
+        full = self.cache_root / path
+        tmp = full.with_name(f"{full.name}.{uuid.uuid4().hex[:8]}{_TMP}")
+        await asyncio.to_thread(full.parent.mkdir, parents=True, exist_ok=True)
+        size = 0
+        try:
+            async with aiofiles.open(tmp, "wb") as f:
+                async for piece in self.remote.read_stream(path):
+                    await f.write(piece)
+                    size += len(piece)
+            await asyncio.to_thread(os.replace, tmp, full)
+        except BaseException:
+            # A missing object is FileNotFoundError already; anything else (S3
+            # unreachable, throttled, ...) is not evidence the blob is gone
+            await _remove([tmp])
+            raise
+        await self._cache_add(path, size)
+        return full
+
+    # ── StorageBackend ─────────────────────────────────────────
+
+    def flushed(self, paths: Iterable[str]) -> bool:
+        return not any(path in self._pending for path in paths)
+
+    async def write(self, path: str, data: bytes) -> None:
+        tag = uuid.uuid4().hex
+        await asyncio.to_thread(_write_file, self._staged(path, tag), data)
+        await self._enqueue(path, tag)
+
+    async def write_stream(self, path: str, stream: AsyncIterable[bytes]) -> int:
+        tag = uuid.uuid4().hex
+        full = self._staged(path, tag)
+        tmp = full.with_name(f"{full.name}{_TMP}")
+        await asyncio.to_thread(full.parent.mkdir, parents=True, exist_ok=True)
+        written = 0
+        try:
+            async with aiofiles.open(tmp, "wb") as f:
+                async for piece in stream:
+                    await f.write(piece)
+                    written += len(piece)
+                await f.flush()
+                await asyncio.to_thread(_commit, f.fileno(), tmp, full)
+        except BaseException:
+            await _remove([tmp])
+            raise
+        await self._enqueue(path, tag)
+        return written
+
+    async def read(self, path: str) -> bytes:
+        async with aiofiles.open(await self._local(path), "rb") as f:
+            return await f.read()
+
+    async def read_stream(
+        self, path: str, offset: int = 0, length: int | None = None
+    ) -> AsyncIterator[bytes]:
+        async with aiofiles.open(await self._local(path), "rb") as f:
+            await f.seek(offset)
+            remaining = length
+            while remaining is None or remaining > 0:
+                piece = await f.read(STREAM_PIECE_SIZE if remaining is None else min(STREAM_PIECE_SIZE, remaining))
+                if not piece:
+                    break
+                if remaining is not None:
+                    remaining -= len(piece)
+                yield piece
+
+    async def delete(self, path: str) -> None:
+        await self.delete_many([path])
+
+    async def delete_many(self, paths: list[str]) -> None:
+        stale = []
+        for path in paths:
+            tag = self._pending.pop(path, None)
+            if tag is not None:
+                stale.append(self._staged(path, tag))
+            stale.append(self._uncache(path))
+        await _remove(stale)
+        await self.remote.delete_many(paths)
+
+    async def exists(self, path: str) -> bool:
+        return self._local_path(path) is not None or await self.remote.exists(path)
+
+    async def move(self, src: str, dst: str) -> None:
+        tag = self._pending.pop(src, None)
+        if tag is None:
+            await _remove([self._uncache(src), self._uncache(dst)])
+            await self.remote.move(src, dst)
+            return
+        # Still staged: rename locally and upload under the new name instead
+        full = self._staged(dst, tag)
+        await asyncio.to_thread(full.parent.mkdir, parents=True, exist_ok=True)
+        await asyncio.to_thread(os.replace, self._staged(src, tag), full)
+        await self._enqueue(dst, tag)
+
+
+# ── Helpers ────────────────────────────────────────────────────
+
+async def _remove(paths: list[Path | None]) -> None:
+    """Unlink [paths] (None entries and missing files are skipped) on a worker thread."""
+    paths = [path for path in paths if path is not None]
+    if paths:
+        await asyncio.to_thread(_unlink_all, paths)
+
+
+def _unlink_all(paths: list[Path]) -> None:
+    for path in paths:
+        path.unlink(missing_ok=True)
+
+
+def _files(root: Path):
+    """Files under [root], removing leftovers of writes interrupted by a crash."""
+    for dirpath, _, filenames in os.walk(root):
+        for name in filenames:
+            full = Path(dirpath) / name
+            if name.endswith(_TMP):
+                full.unlink(missing_ok=True)
+            else:
+                yield full
+
+
+def _commit(fd: int, tmp: Path, full: Path) -> None:
+    """fsync [tmp], rename it to [full] and fsync the directory."""
+    os.fsync(fd)
+    os.replace(tmp, full)
+    dir_fd = os.open(full.parent, os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+
+
+def _write_file(full: Path, data: bytes) -> None:
+    full.parent.mkdir(parents=True, exist_ok=True)
+    tmp = full.with_name(f"{full.name}.{uuid.uuid4().hex[:8]}{_TMP}")
+    try:
+        with open(tmp, "wb") as f:
+            f.write(data)
+            f.flush()
+            _commit(f.fileno(), tmp, full)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
@@ -0,0 +1,153 @@
+"""
+Per-user and per-device storage accounting.
+
+Summing `chunks.size` for a user gets slower as the account grows, so usage is
+kept as running counters in `storage_usage`, one row per (user, device):
+
+  upload_chunk     bytes += new chunk size − replaced chunk size
+  upload_complete  files += 1
+  upload_files     bytes and files for the whole batch, one upsert
+  sweeper purge    bytes −= the purged chunks
+
+Every change is a single-statement upsert, so concurrent requests never lose
+an increment. Quota checks and GET /usage read the counters — a primary-key
+lookup over the user's few device rows.
+
+Counters can still drift (a bug, a manual cleanup), so every
+USAGE_RECONCILE_INTERVAL_SECONDS the reconciler recomputes them from the
+chunks and files tables, one user per transaction. It locks the user's counter
+rows before summing: uploads still in flight then either committed before the
+sum (and are counted) or add their delta on top of the corrected value.
+"""
+
+import asyncio
+import logging
+import uuid
+
+from fastapi import HTTPException, status
+from sqlalchemy import distinct, func, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.database import async_session
+from app.models.chunk import Chunk
+from app.models.file import BackupFile
+from app.models.usage import StorageUsage
+
+logger = logging.getLogger(__name__)
+
+
+async def add(
+    db: AsyncSession, user_id: uuid.UUID, device_id: uuid.UUID, bytes_delta: int = 0, files_delta: int = 0
+) -> None:
+    """Apply a usage change for one (user, device) in the current transaction."""
+    if not bytes_delta and not files_delta:
+        return
+    await db.execute(
+        insert(StorageUsage)
+        .values(user_id=user_id, device_id=device_id, bytes=bytes_delta, files=files_delta)
+        .on_conflict_do_update(
+            index_elements=[StorageUsage.user_id, StorageUsage.device_id],
+            set_={
+                "bytes": StorageUsage.bytes + bytes_delta,
+                "files": StorageUsage.files + files_delta,
+                "updated_at": func.now(),
+            },
+        )
+    )
+
+
+async def totals(db: AsyncSession, user_id: uuid.UUID) -> tuple[int, int]:
+    """(bytes, files) stored by the user across all devices."""
+    result = await db.execute(
+        select(func.coalesce(func.sum(StorageUsage.bytes), 0), func.coalesce(func.sum(StorageUsage.files), 0))
+        .where(StorageUsage.user_id == user_id)
+    )
+    stored, files = result.one()
+    return int(stored), int(files)
+
+
+async def check_quota(db: AsyncSession, user_id: uuid.UUID, incoming: int) -> None:
+    """
+    Raise 507 if storing [incoming] more bytes would exceed USER_QUOTA_BYTES.
+
+    A soft limit: uploads initialized at the same moment all see the same usage.
+    """
+    if settings.USER_QUOTA_BYTES <= 0 or incoming <= 0:
+        return
+    stored, _ = await totals(db, user_id)
+    if stored + incoming > settings.USER_QUOTA_BYTES:
+        raise HTTPException(
+            status_code=status.HTTP_507_INSUFFICIENT_STORAGE,
+            detail={"message": "Storage quota exceeded", "used": stored, "quota": settings.USER_QUOTA_BYTES},
+        )
+
+
+# ── Reconciliation ─────────────────────────────────────────────
+
+async def reconcile_user(db: AsyncSession, user_id: uuid.UUID) -> bool:
+    """Recompute one user's counters from the chunks and files tables. Returns True if they drifted."""
+    result = await db.execute(
+        select(StorageUsage.device_id, StorageUsage.bytes, StorageUsage.files)
+        .where(StorageUsage.user_id == user_id)
+        .with_for_update()
+    )
+    current = {device_id: (stored, files) for device_id, stored, files in result.all()}
+
+    result = await db.execute(
+        select(
+            BackupFile.device_id,
+            func.coalesce(func.sum(Chunk.size), 0),
+            func.count(distinct(BackupFile.id)).filter(BackupFile.status == "complete"),
+        )
+        .outerjoin(Chunk, Chunk.file_id == BackupFile.id)
+        .where(BackupFile.user_id == user_id)
+        .group_by(BackupFile.device_id)
+    )
+    actual = {device_id: (int(stored), files) for device_id, stored, files in result.all()}
+
+    drifted = False
+    for device_id in current.keys() | actual.keys():
+        want = actual.get(device_id, (0, 0))
+        if current.get(device_id) == want:
+            continue
+        drifted = True
+        if device_id in current:
+            await db.execute(
+                update(StorageUsage)
+                .where(StorageUsage.user_id == user_id, StorageUsage.device_id == device_id)
+                .values(bytes=want[0], files=want[1], updated_at=func.now())
+            )
+        else:
+            await db.execute(
+                insert(StorageUsage)
+                .values(user_id=user_id, device_id=device_id, bytes=want[0], files=want[1])
+                .on_conflict_do_nothing()
+            )
+    return drifted
+
+
+async def reconcile_once() -> int:
+    """Reconcile every user with files. Returns how many users had drifted."""
+    async with async_session() as db:
+        user_ids = list((await db.execute(select(distinct(BackupFile.user_id)))).scalars())
+    fixed = 0
+    for user_id in user_ids:
+        async with async_session() as db:
+            if await reconcile_user(db, user_id):
+                fixed += 1
+            await db.commit()
+    return fixed
+
+
+async def run_reconciler() -> None:
+    """Reconcile forever, every USAGE_RECONCILE_INTERVAL_SECONDS. Started from the app lifespan."""
+    while True:
+        await asyncio.sleep(settings.USAGE_RECONCILE_INTERVAL_SECONDS)
+        try:
+            fixed = await reconcile_once()
+            if fixed:
+                logger.warning("Corrected drifted storage usage for %d user(s)", fixed)
+        except Exception:
+            logger.exception("Storage usage reconciliation failed")
@@ -0,0 +1,149 @@
+"""
+Benchmark: chunk metadata commits, one transaction per chunk vs. group commit.
+
+Records --files x --chunks chunk rows from --concurrency concurrent writers, the
+way upload_chunk does after the chunk's bytes are stored: insert the row, fold it
+into the file's counter and manifest digest, add it to the usage counters, commit.
+"single" runs that in its own transaction per chunk (CHUNK_GROUP_COMMIT=false),
+"group" hands each row to app.chunk_writer (CHUNK_GROUP_COMMIT=true). No blob
+I/O, so the difference is the database round trips and WAL flushes.
+
+Reports rows/s, p50/p99 latency per row and the mean group-commit batch size.
+Rows are written under a throwaway user, deleted afterwards.
+
+Usage (from server/, with DATABASE_URL pointing at a scratch Postgres):
+    python -m bench.chunk_commit --concurrency 256
+    CHUNK_GROUP_COMMIT_WAIT_MS=5 python -m bench.chunk_commit --mode group
+"""
+
+import argparse
+import asyncio
+import hashlib
+import time
+import uuid
+from decimal import Decimal
+
+from sqlalchemy import delete, func, update
+from sqlalchemy.dialects.postgresql import insert
+
+from app import manifest, usage
+from app.chunk_writer import ChunkRecord, chunk_writer
+from app.database import Base, async_session, engine
+from app.metrics import chunk_batch_rows
+from app.models import BackupFile, Chunk, Device, StorageUsage, User
+
+CHUNK_SIZE = 4 * 1024 * 1024  # only recorded, never written
+
+
+async def _single(record: ChunkRecord) -> None:
+    async with async_session() as db:
+        await db.execute(
+            insert(Chunk)
+            .values(
+                file_id=record.file_id, chunk_index=record.chunk_index,
+                chunk_hash=record.chunk_hash, size=record.size,
+            )
+            .on_conflict_do_nothing(index_elements=[Chunk.file_id, Chunk.chunk_index])
+        )
+        await db.execute(
+            update(BackupFile)
+            .where(BackupFile.id == record.file_id)
+            .values(
+                chunks_received=BackupFile.chunks_received + 1,
+                manifest_acc=func.mod(
+                    BackupFile.manifest_acc + Decimal(manifest.leaf(record.chunk_index, record.chunk_hash)),
+                    Decimal(manifest.MODULUS),
+                ),
+            )
+        )
+        await usage.add(db, record.user_id, record.device_id, record.size)
+        await db.commit()
+
+
+async def _group(record: ChunkRecord) -> None:
+    await chunk_writer.insert(record)
+
+
+async def _setup(files: int, chunks: int) -> tuple[uuid.UUID, uuid.UUID, list[uuid.UUID]]:
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with async_session() as db:
+        user = User(email=f"bench-{uuid.uuid4().hex}@example.com", password_hash="-")
+        db.add(user)
+        await db.flush()
+        device = Device(user_id=user.id, name="bench")
+        db.add(device)
+        await db.flush()
+        file_ids = [uuid.uuid4() for _ in range(files)]
+        await db.execute(insert(BackupFile), [
+            {
+                "id": file_id, "user_id": user.id, "device_id": device.id, "file_hash": file_id.hex * 2,
+                "encrypted_size": CHUNK_SIZE * chunks, "chunk_count": chunks,
+            }
+            for file_id in file_ids
+        ])
+        await db.commit()
+        return user.id, device.id, file_ids
+
+
+async def _teardown(user_id: uuid.UUID, file_ids: list[uuid.UUID]) -> None:
+    async with async_session() as db:
+        await db.execute(delete(Chunk).where(Chunk.file_id.in_(file_ids)))
+        await db.execute(delete(BackupFile).where(BackupFile.id.in_(file_ids)))
+        await db.execute(delete(StorageUsage).where(StorageUsage.user_id == user_id))
+        await db.execute(delete(Device).where(Device.user_id == user_id))
+        await db.execute(delete(User).where(User.id == user_id))
+        await db.commit()
+
+
+async def _run(mode: str, args: argparse.Namespace) -> None:
+    user_id, device_id, file_ids = await _setup(args.files, args.chunks)
+    records = [
+        ChunkRecord(user_id, device_id, file_id, i, hashlib.sha256(file_id.bytes + bytes([i % 256])).hexdigest(), CHUNK_SIZE)
+        for file_id in file_ids
+        for i in range(args.chunks)
+    ]
+    write = _single if mode == "single" else _group
+    latencies: list[float] = []
+    batches = chunk_batch_rows.sum, sum(chunk_batch_rows.counts)
+
+    queue = iter(records)
+
+    async def writer() -> None:
+        for record in queue:
+            t0 = time.perf_counter()
+            await write(record)
+            latencies.append(time.perf_counter() - t0)
+
+    try:
+        t0 = time.perf_counter()
+        await asyncio.gather(*(writer() for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - t0
+    finally:
+        await _teardown(user_id, file_ids)
+
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2] * 1000
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000
+    line = f"{mode:<7} {len(records) / elapsed:9.1f} rows/s   p50 {p50:8.2f} ms   p99 {p99:8.2f} ms"
+    flushed = sum(chunk_batch_rows.counts) - batches[1]
+    if flushed:
+        line += f"   mean batch {(chunk_batch_rows.sum - batches[0]) / flushed:6.1f} rows"
+    print(line)
+
+
+async def main(args: argparse.Namespace) -> None:
+    try:
+        for mode in ("single", "group") if args.mode == "both" else (args.mode,):
+            await _run(mode, args)
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=("single", "group", "both"), default="both")
+    parser.add_argument("--files", type=int, default=500)
+    parser.add_argument("--chunks", type=int, default=8, help="chunks per file")
+    parser.add_argument("--concurrency", type=int, default=256, help="chunk rows recorded at once")
+    asyncio.run(main(parser.parse_args()))
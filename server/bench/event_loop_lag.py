@@ -0,0 +1,75 @@
+"""
+Benchmark: event-loop lag during a login storm, bcrypt inline vs. on the CPU pool.
+
+Fires --logins concurrent bcrypt.checkpw calls (what /auth/login does per request,
+at the server's default cost factor) while a ticker sleeps --tick ms in a loop and
+records how late it wakes up. That lateness is what every in-flight chunk upload
+in the same worker sees. Each storm is run twice: checks called directly in the
+coroutine (the old handlers) and through app.cpu (the current ones).
+
+Reports logins/s and p50/p99/max loop lag for both.
+
+Usage (from server/):
+    python -m bench.event_loop_lag --logins 64
+    CPU_WORKERS=2 python -m bench.event_loop_lag --logins 64   # smaller pool
+"""
+
+import argparse
+import asyncio
+import time
+
+import bcrypt
+
+from app.cpu import cpu
+
+
+async def _ticker(interval: float, lags: list[float], stop: asyncio.Event) -> None:
+    while not stop.is_set():
+        t0 = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - t0 - interval)
+
+
+async def _storm(name: str, check, args: argparse.Namespace, password: bytes, pw_hash: bytes) -> None:
+    lags: list[float] = []
+    stop = asyncio.Event()
+    ticker = asyncio.create_task(_ticker(args.tick / 1000, lags, stop))
+    await asyncio.sleep(args.tick / 1000 * 5)  # let the ticker settle
+
+    t0 = time.perf_counter()
+    results = await asyncio.gather(*(check(password, pw_hash) for _ in range(args.logins)))
+    elapsed = time.perf_counter() - t0
+    stop.set()
+    await ticker
+    assert all(results)
+
+    lags.sort()
+    p50 = lags[len(lags) // 2] * 1000
+    p99 = lags[min(len(lags) - 1, int(len(lags) * 0.99))] * 1000
+    print(
+        f"{name:<8} {args.logins / elapsed:8.1f} logins/s   "
+        f"loop lag p50 {p50:8.2f} ms   p99 {p99:8.2f} ms   max {lags[-1] * 1000:8.2f} ms"
+    )
+
+
+async def main(args: argparse.Namespace) -> None:
+    password = b"correct horse battery staple"
+    pw_hash = bcrypt.hashpw(password, bcrypt.gensalt())
+
+    async def inline(pw: bytes, hashed: bytes) -> bool:
+        return bcrypt.checkpw(pw, hashed)
+
+    async def pooled(pw: bytes, hashed: bytes) -> bool:
+        return await cpu.run("bcrypt", bcrypt.checkpw, pw, hashed)
+
+    print(f"{args.logins} concurrent logins, ticker every {args.tick} ms")
+    await _storm("inline", inline, args, password, pw_hash)
+    await _storm("pool", pooled, args, password, pw_hash)
+    cpu.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=64)
+    parser.add_argument("--tick", type=float, default=5.0, help="ticker interval, ms")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,83 @@
+"""
+Benchmark: PackStorage vs. LocalStorage for chunk-sized writes and reads.
+
+Writes --blobs blobs of --size bytes through write_stream (64 KiB pieces, as an
+upload arrives) with --concurrency writers, reads them all back, and reports
+throughput, blobs per second and how many files/directories each backend created.
+
+Usage (from server/):
+    python -m bench.pack_storage --blobs 20000 --size 65536 --concurrency 32
+    python -m bench.pack_storage --dir /mnt/ssd/bench   # benchmark a specific disk
+"""
+
+import argparse
+import asyncio
+import os
+import shutil
+import tempfile
+import time
+import uuid
+
+from app.storage.local import LocalStorage
+from app.storage.pack import PackStorage
+
+_PIECE = 64 * 1024
+
+
+async def _pieces(data: bytes):
+    for start in range(0, len(data), _PIECE):
+        yield data[start:start + _PIECE]
+
+
+def _count_inodes(root: str) -> int:
+    return sum(len(dirs) + len(files) for _, dirs, files in os.walk(root))
+
+
+async def _run(name: str, storage, root: str, args: argparse.Namespace) -> None:
+    payload = os.urandom(args.size)
+    user, upload = str(uuid.uuid4()), str(uuid.uuid4())
+    paths = [storage.chunk_path(user, upload if i % 100 else str(uuid.uuid4()), i) for i in range(args.blobs)]
+    gate = asyncio.Semaphore(args.concurrency)
+
+    async def put(path: str) -> None:
+        async with gate:
+            await storage.write_stream(path, _pieces(payload))
+
+    async def get(path: str) -> None:
+        async with gate:
+            await storage.read(path)
+
+    await storage.start()
+    t0 = time.perf_counter()
+    await asyncio.gather(*(put(p) for p in paths))
+    write_s = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    await asyncio.gather(*(get(p) for p in paths))
+    read_s = time.perf_counter() - t0
+    await storage.close()
+
+    total_mb = args.blobs * args.size / 1e6
+    print(
+        f"{name:<6} write {total_mb / write_s:8.1f} MB/s {args.blobs / write_s:9.0f} blobs/s   "
+        f"read {total_mb / read_s:8.1f} MB/s {args.blobs / read_s:9.0f} blobs/s   "
+        f"files+dirs created {_count_inodes(root):>7}"
+    )
+
+
+async def main(args: argparse.Namespace) -> None:
+    print(f"{args.blobs} blobs x {args.size} bytes, concurrency {args.concurrency}")
+    for name, factory in (("local", LocalStorage), ("pack", PackStorage)):
+        root = tempfile.mkdtemp(prefix=f"zkbench-{name}-", dir=args.dir)
+        try:
+            await _run(name, factory(root), root, args)
+        finally:
+            shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--blobs", type=int, default=20000)
+    parser.add_argument("--size", type=int, default=64 * 1024)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--dir", default=None, help="parent directory for the temporary stores")
+    asyncio.run(main(parser.parse_args()))
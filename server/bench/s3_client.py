@@ -0,0 +1,95 @@
+"""
+Benchmark: shared pooled S3 client vs. one client per operation.
+
+Runs chunk-sized PUTs against an in-process moto S3 server (no network, no
+credentials) and reports per-PUT latency and throughput for both patterns.
+
+Usage (from server/):
+    pip install -r bench/requirements.txt
+    python -m bench.s3_client --puts 400 --concurrency 16 --size 262144
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import time
+
+import aioboto3
+from moto.server import ThreadedMotoServer
+
+from app.config import settings
+
+
+def _summary(name: str, latencies: list[float], elapsed: float) -> None:
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2] * 1000
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000
+    print(
+        f"{name:<22} {len(latencies) / elapsed:8.1f} puts/s   "
+        f"p50 {p50:7.2f} ms   p99 {p99:7.2f} ms   mean {statistics.mean(latencies) * 1000:7.2f} ms"
+    )
+
+
+async def _run(put, n: int, concurrency: int) -> tuple[list[float], float]:
+    latencies: list[float] = []
+    gate = asyncio.Semaphore(concurrency)
+
+    async def one(i: int) -> None:
+        async with gate:
+            t0 = time.perf_counter()
+            await put(i)
+            latencies.append(time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(n)))
+    return latencies, time.perf_counter() - t0
+
+
+async def main(args: argparse.Namespace) -> None:
+    from app.storage.s3 import S3Storage
+
+    payload = os.urandom(args.size)
+    storage = S3Storage()
+    await storage.start()
+    async with storage._client() as s3:
+        await s3.create_bucket(Bucket=storage.bucket)
+
+    session = aioboto3.Session()
+    kwargs = {k: v for k, v in storage._client_kwargs.items() if k != "config"}
+
+    async def per_op_put(i: int) -> None:
+        # The pre-pooling pattern: build a client (and connection) per call
+        async with session.client("s3", **kwargs) as s3:
+            await s3.put_object(Bucket=storage.bucket, Key=f"bench/per-op/{i}", Body=payload)
+
+    async def pooled_put(i: int) -> None:
+        await storage.write(f"bench/pooled/{i}", payload)
+
+    print(f"{args.puts} PUTs x {args.size} bytes, concurrency {args.concurrency}")
+    for name, put in (("client per operation", per_op_put), ("shared pooled client", pooled_put)):
+        latencies, elapsed = await _run(put, args.puts, args.concurrency)
+        _summary(name, latencies, elapsed)
+
+    await storage.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--puts", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--size", type=int, default=256 * 1024)
+    parser.add_argument("--port", type=int, default=5055)
+    args = parser.parse_args()
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    server = ThreadedMotoServer(port=args.port, verbose=False)
+    server.start()
+    settings.S3_ENDPOINT = f"http://127.0.0.1:{args.port}"
+    settings.S3_ACCESS_KEY = settings.S3_ACCESS_KEY or "bench"
+    settings.S3_SECRET_KEY = settings.S3_SECRET_KEY or "bench"
+    try:
+        asyncio.run(main(args))
+    finally:
+        server.stop()
@@ -0,0 +1,205 @@
+"""
+Benchmark: the full upload protocol, end to end, against the in-process app.
+
+Simulates --devices phones, each with its own account, uploading --files files of
+--chunks chunks through init → chunk PUTs → complete → status, all concurrently
+over an in-process ASGI transport (no network). Storage is a temp LocalStorage
+directory or an in-process moto S3 server.
+
+Reports chunks/s and MB/s for the upload phase (account setup is excluded), p50/p99
+latency per endpoint and peak RSS, and writes the numbers to --out as JSON
+(tagged with the git commit) so runs can be compared.
+
+Usage (from server/, with DATABASE_URL pointing at a scratch Postgres):
+    pip install -r bench/requirements.txt
+    python -m bench.upload_protocol --backend local --devices 32 --files 8 --chunks 4
+    python -m bench.upload_protocol --backend s3 --out bench-s3.json
+    python -m bench.upload_protocol --compare bench-local.json   # show deltas vs. an older run
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import resource
+import shutil
+import subprocess
+import tempfile
+import time
+import uuid
+from collections import defaultdict
+
+import httpx
+
+from app.config import settings
+
+
+class _Recorder:
+    def __init__(self):
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+
+    async def call(self, endpoint: str, request) -> httpx.Response:
+        t0 = time.perf_counter()
+        response = await request
+        self.latencies[endpoint].append(time.perf_counter() - t0)
+        response.raise_for_status()
+        return response
+
+
+def _percentile(values: list[float], q: float) -> float:
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+async def _enroll(client: httpx.AsyncClient, rec: _Recorder) -> tuple[dict, str]:
+    """Register an account and a device. Not part of the timed upload phase."""
+    r = await rec.call("register", client.post(
+        "/auth/register", json={"email": f"bench-{uuid.uuid4().hex}@example.com", "password": "bench"}
+    ))
+    headers = {"Authorization": f"Bearer {r.json()['access_token']}"}
+    r = await rec.call("devices", client.post("/auth/devices", json={"name": "bench"}, headers=headers))
+    return headers, r.json()["device_id"]
+
+
+async def _device(
+    client: httpx.AsyncClient, rec: _Recorder, args: argparse.Namespace, headers: dict, device_id: str
+) -> None:
+    base = os.urandom(args.chunk_size)
+    gate = asyncio.Semaphore(args.chunk_concurrency)
+
+    async def put_chunk(upload_id: str, index: int, data: bytes) -> None:
+        async with gate:
+            await rec.call("chunk", client.put(f"/upload/{upload_id}/chunk/{index}", content=data, headers=headers))
+
+    for n in range(args.files):
+        # Distinct bytes per chunk without generating fresh randomness each time
+        chunks = [n.to_bytes(4, "big") + i.to_bytes(4, "big") + base[8:] for i in range(args.chunks)]
+        r = await rec.call("init", client.post("/upload/init", json={
+            "file_hash": uuid.uuid4().hex * 2,
+            "encrypted_size": args.chunk_size * args.chunks,
+            "chunk_count": args.chunks,
+            "device_id": device_id,
+        }, headers=headers))
+        upload_id = r.json()["upload_id"]
+        await asyncio.gather(*(put_chunk(upload_id, i, data) for i, data in enumerate(chunks)))
+        await rec.call("complete", client.post(f"/upload/{upload_id}/complete", headers=headers))
+        await rec.call("status", client.get(f"/upload/{upload_id}/status", headers=headers))
+
+
+async def _run(args: argparse.Namespace) -> dict:
+    from app.main import app, lifespan
+    from app.routers.auth import limiter
+
+    limiter.enabled = False  # every simulated device registers from the same address
+    rec = _Recorder()
+    async with lifespan(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url=f"http://bench{settings.API_V1_PREFIX}", timeout=None
+        ) as client:
+            enrolled = await asyncio.gather(*(_enroll(client, rec) for _ in range(args.devices)))
+            t0 = time.perf_counter()
+            await asyncio.gather(*(_device(client, rec, args, *device) for device in enrolled))
+            elapsed = time.perf_counter() - t0
+
+    chunks = args.devices * args.files * args.chunks
+    endpoints = {}
+    for endpoint, values in rec.latencies.items():
+        values.sort()
+        endpoints[endpoint] = {
+            "count": len(values),
+            "p50_ms": round(_percentile(values, 0.50) * 1000, 3),
+            "p99_ms": round(_percentile(values, 0.99) * 1000, 3),
+        }
+    return {
+        "elapsed_s": round(elapsed, 3),
+        "chunks_per_s": round(chunks / elapsed, 1),
+        "mb_per_s": round(chunks * args.chunk_size / elapsed / 1e6, 2),
+        "endpoints": endpoints,
+        # Linux reports KiB. Includes the moto server thread for --backend s3.
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def _commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _print(result: dict, baseline: dict | None) -> None:
+    def delta(key: str) -> str:
+        if not baseline:
+            return ""
+        old = baseline["results"][key]
+        return f"  ({(result[key] - old) / old * 100:+.1f}% vs {baseline.get('commit') or 'baseline'})"
+
+    print(f"chunks/s   {result['chunks_per_s']:10.1f}{delta('chunks_per_s')}")
+    print(f"MB/s       {result['mb_per_s']:10.2f}{delta('mb_per_s')}")
+    print(f"peak RSS   {result['peak_rss_mb']:10.1f} MB")
+    for endpoint, stats in result["endpoints"].items():
+        print(f"  {endpoint:<10} n={stats['count']:<6} p50 {stats['p50_ms']:8.2f} ms   p99 {stats['p99_ms']:8.2f} ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=("local", "s3"), default="local")
+    parser.add_argument("--devices", type=int, default=32)
+    parser.add_argument("--files", type=int, default=8, help="files per device")
+    parser.add_argument("--chunks", type=int, default=4, help="chunks per file")
+    parser.add_argument("--chunk-size", type=int, default=256 * 1024)
+    parser.add_argument("--chunk-concurrency", type=int, default=4, help="parallel chunk PUTs per device")
+    parser.add_argument("--port", type=int, default=5056, help="moto port (--backend s3)")
+    parser.add_argument("--out", help="write results as JSON to this file")
+    parser.add_argument("--compare", help="JSON from an earlier run to diff against")
+    args = parser.parse_args()
+
+    storage_dir = tempfile.mkdtemp(prefix="zkbench-")
+    settings.STORAGE_BACKEND = args.backend
+    settings.STORAGE_PATH = storage_dir
+    settings.GC_INTERVAL_SECONDS = 0
+
+    server = None
+    if args.backend == "s3":
+        import boto3
+        from moto.server import ThreadedMotoServer
+
+        logging.getLogger("werkzeug").setLevel(logging.ERROR)
+        server = ThreadedMotoServer(port=args.port, verbose=False)
+        server.start()
+        settings.S3_ENDPOINT = f"http://127.0.0.1:{args.port}"
+        settings.S3_ACCESS_KEY = settings.S3_ACCESS_KEY or "bench"
+        settings.S3_SECRET_KEY = settings.S3_SECRET_KEY or "bench"
+        boto3.client(
+            "s3",
+            endpoint_url=settings.S3_ENDPOINT,
+            aws_access_key_id=settings.S3_ACCESS_KEY,
+            aws_secret_access_key=settings.S3_SECRET_KEY,
+            region_name=settings.S3_REGION,
+        ).create_bucket(Bucket=settings.S3_BUCKET)
+
+    try:
+        result = asyncio.run(_run(args))
+    finally:
+        if server is not None:
+            server.stop()
+        shutil.rmtree(storage_dir, ignore_errors=True)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    _print(result, baseline)
+
+    if args.out:
+        params = {k: v for k, v in vars(args).items() if k not in ("out", "compare", "port")}
+        with open(args.out, "w") as f:
+            json.dump({"commit": _commit(), "timestamp": int(time.time()), "params": params, "results": result}, f, indent=2)
+        print(f"wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
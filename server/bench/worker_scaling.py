@@ -0,0 +1,161 @@
+"""
+Benchmark: chunk PUT throughput vs. number of uvicorn worker processes.
+
+Starts the real server (uvicorn app.main:app) with WEB_CONCURRENCY=1, 2, 4, ...
+up to --max-workers, and for each drives it for --seconds from --clients client
+processes, each keeping --concurrency chunk PUTs of --chunk-size bytes in flight
+(hashing, a local-storage write and the metadata commit per request). Local
+fsync and admission control are turned off so the server's CPU is what's
+measured, not the disk or the queueing policy.
+
+Reports PUTs/s per worker count and the speedup over one worker; with enough
+cores (server workers + client processes), it should grow about linearly.
+
+Usage (from server/, with DATABASE_URL pointing at a scratch Postgres):
+    pip install -r bench/requirements.txt
+    python -m bench.worker_scaling --max-workers 8 --clients 8
+"""
+
+import argparse
+import asyncio
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+import httpx
+
+from app.config import settings
+
+
+def _base_url(port: int) -> str:
+    return f"http://127.0.0.1:{port}{settings.API_V1_PREFIX}"
+
+
+def _start_server(workers: int, port: int, storage_dir: str) -> subprocess.Popen:
+    env = dict(
+        os.environ,
+        WEB_CONCURRENCY=str(workers),
+        STORAGE_BACKEND="local",
+        STORAGE_PATH=storage_dir,
+        SHARED_STATE_PATH=os.path.join(storage_dir, "state.sqlite3"),
+        LOCAL_FSYNC="false",
+        ADMISSION_ENABLED="false",
+        GC_INTERVAL_SECONDS="0",
+    )
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        env=env,
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"{_base_url(port)}/health", timeout=1).status_code == 200:
+                time.sleep(1)  # every worker, not just the first, should be up
+                return server
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    server.kill()
+    raise RuntimeError("server did not come up")
+
+
+def _stop_server(server: subprocess.Popen) -> None:
+    server.send_signal(signal.SIGINT)
+    try:
+        server.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        server.kill()
+
+
+def _enroll(port: int) -> tuple[dict, str]:
+    """One account and device for the whole run (registration is rate limited)."""
+    with httpx.Client(base_url=_base_url(port)) as client:
+        r = client.post("/auth/register", json={"email": f"bench-{uuid.uuid4().hex}@example.com", "password": "bench"})
+        r.raise_for_status()
+        headers = {"Authorization": f"Bearer {r.json()['access_token']}"}
+        r = client.post("/auth/devices", json={"name": "bench"}, headers=headers)
+        r.raise_for_status()
+        return headers, r.json()["device_id"]
+
+
+async def _client(port: int, headers: dict, device_id: str, args: argparse.Namespace) -> int:
+    body = os.urandom(args.chunk_size)
+    puts = 0
+    limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=_base_url(port), headers=headers, limits=limits, timeout=60) as client:
+        deadline = time.monotonic() + args.seconds
+
+        async def stream() -> None:
+            nonlocal puts
+            # One long upload per stream; its chunks are never completed
+            r = await client.post("/upload/init", json={
+                "file_hash": uuid.uuid4().hex * 2,
+                "encrypted_size": args.chunk_size * 1_000_000,
+                "chunk_count": 1_000_000,
+                "device_id": device_id,
+            })
+            r.raise_for_status()
+            upload_id = r.json()["upload_id"]
+            index = 0
+            while time.monotonic() < deadline:
+                r = await client.put(f"/upload/{upload_id}/chunk/{index}", content=body)
+                r.raise_for_status()
+                puts += 1
+                index += 1
+
+        await asyncio.gather(*(stream() for _ in range(args.concurrency)))
+    return puts
+
+
+def _client_process(port: int, headers: dict, device_id: str, args: argparse.Namespace) -> int:
+    return asyncio.run(_client(port, headers, device_id, args))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--clients", type=int, default=4, help="load generator processes")
+    parser.add_argument("--concurrency", type=int, default=32, help="PUTs in flight per client process")
+    parser.add_argument("--chunk-size", type=int, default=64 * 1024)
+    parser.add_argument("--seconds", type=float, default=15)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    counts = []
+    n = 1
+    while n < args.max_workers:
+        counts.append(n)
+        n *= 2
+    counts.append(args.max_workers)
+
+    storage_dir = tempfile.mkdtemp(prefix="zkbench-")
+    enrolled = None
+    baseline = None
+    try:
+        for workers in counts:
+            server = _start_server(workers, args.port, storage_dir)
+            try:
+                enrolled = enrolled or _enroll(args.port)
+                with ProcessPoolExecutor(args.clients) as pool:
+                    t0 = time.perf_counter()
+                    puts = sum(pool.map(
+                        _client_process, *zip(*[(args.port, *enrolled, args)] * args.clients)
+                    ))
+                    elapsed = time.perf_counter() - t0
+            finally:
+                _stop_server(server)
+            rate = puts / elapsed
+            baseline = baseline or rate
+            print(f"workers {workers:>3}   {rate:9.1f} PUTs/s   speedup {rate / baseline:5.2f}x")
+    finally:
+        shutil.rmtree(storage_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()